@@ -1,5 +1,6 @@
 # flake8: noqa
 from .adapters.output.h5store import H5FileOutput
+from .adapters.output.shared_memory import SharedMemoryOutput
 
 from .core import (
     AbstractTask,
@@ -16,6 +17,8 @@ from .core import (
     JSONOutput,
     SerializableOutput,
     InOut,
+    Interner,
+    interning,
 )
 
 # Also imports no_default vars, as it is primary representation of Task.
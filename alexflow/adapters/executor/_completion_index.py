@@ -0,0 +1,57 @@
+from typing import Dict, Optional
+
+from alexflow.core import AbstractTask, Storage, Output
+from alexflow.helper import flatten, is_completed, exists_output
+
+from ._metrics import Metrics
+
+
+class CompletionIndex:
+    """Index of the output existence owned by an executor run.
+
+    Each output is checked against the storage at most once, and then the index is updated from the
+    completion and the purge of outputs by the executor instead of checking the storage again.
+
+    Attrs:
+        hits: Number of lookups answered by the index.
+        misses: Number of lookups which needed to call `Storage.exists`, also counted as
+            "storage_exists_calls" of the metrics if given.
+    """
+
+    def __init__(self, storage: Storage, metrics: Optional[Metrics] = None):
+        self._storage: Storage = storage
+        self._metrics: Optional[Metrics] = metrics
+
+        # key = Output.key, value = whether the output exists in the storage.
+        self._exists: Dict[str, bool] = {}
+
+        self.hits: int = 0
+        self.misses: int = 0
+
+    def exists(self, output: Output) -> bool:
+        if output.key in self._exists:
+            self.hits += 1
+            return self._exists[output.key]
+
+        self.misses += 1
+
+        if self._metrics is not None:
+            self._metrics.inc("storage_exists_calls")
+
+        value = exists_output(output, self._storage)
+
+        self._exists[output.key] = value
+
+        return value
+
+    def is_completed(self, task: AbstractTask) -> bool:
+        return is_completed(task, self._storage, exists=self.exists)
+
+    def add(self, task: AbstractTask) -> None:
+        """Mark all the outputs of the task exist, once the task is done."""
+        for output in flatten(task.output()):
+            self._exists[output.key] = True
+
+    def remove(self, output: Output) -> None:
+        """Mark the output does not exist, once the output is purged."""
+        self._exists[output.key] = False
@@ -0,0 +1,344 @@
+from typing import Dict, Set, List, Iterable, Optional, Callable, Tuple
+from collections import defaultdict, deque
+
+import heapq
+import itertools
+import time
+
+from alexflow.core import AbstractTask, Storage
+from alexflow.helper import flatten
+
+from ._completion_index import CompletionIndex
+
+from logging import getLogger
+
+
+logger = getLogger(__name__)
+
+
+class DependencyGraph:
+    """Dependency graph of the incomplete tasks, with the count of remaining dependencies per task.
+
+    The graph is built once from the given tasks, and only updated when a task is completed or a
+    DynamicTask generates tasks. Tasks whose dependencies are all resolved are kept in ready queue
+    until they are dispatched.
+
+    Ready tasks are ordered by `AbstractTask.priority` first, and then by the length of the critical
+    path, the sum of the cost of the task and the most costly chain of its dependents, when `cost`
+    is given. Otherwise, tasks of the same priority are ordered as they become ready.
+    """
+
+    def __init__(
+        self,
+        tasks: Dict[str, AbstractTask],
+        storage: Storage,
+        completion_index: Optional[CompletionIndex] = None,
+        cost: Optional[Callable[[AbstractTask], float]] = None,
+    ):
+        if completion_index is None:
+            completion_index = CompletionIndex(storage)
+
+        self._completion_index: CompletionIndex = completion_index
+
+        self._cost: Optional[Callable[[AbstractTask], float]] = cost
+
+        # key = task_id, value = task which is not completed yet.
+        self._tasks: Dict[str, AbstractTask] = {}
+
+        # key = task_id, value = set of task_ids who waits for the task.
+        self._dependents: Dict[str, Set[str]] = defaultdict(set)
+
+        # key = task_id, value = set of task_ids the task waits for.
+        self._dependencies: Dict[str, Set[str]] = defaultdict(set)
+
+        # key = task_id, value = number of unresolved dependencies.
+        self._remaining: Dict[str, int] = {}
+
+        # key = task_id, value = length of the critical path from the task.
+        self._rank: Dict[str, float] = {}
+
+        # Heap of (-priority, -rank, sequence, task_id)
+        self._ready: List[Tuple[int, float, int, str]] = []
+        self._sequence = itertools.count()
+
+        # DynamicTask which already generated tasks, and waits for them.
+        self._expanded: Set[str] = set()
+
+        self._completed: Set[str] = set()
+
+        # Tasks dispatched along with their dependencies, which are not put to ready queue.
+        self._claimed: Set[str] = set()
+
+        # key = task_id, value = time the task became ready, until it is taken by the executor.
+        self._ready_at: Dict[str, float] = {}
+
+        # key = task_id, value = sequence number the task became ready with, kept while the task is
+        # put back to ready queue not to lose its order.
+        self._ready_seq: Dict[str, int] = {}
+
+        added = self._explore(tasks.values())
+        self._update_rank(added)
+        self._push_ready(added)
+
+    def __len__(self) -> int:
+        """Number of tasks not completed yet."""
+        return len(self._tasks)
+
+    def __contains__(self, task_id: str) -> bool:
+        return task_id in self._tasks
+
+    def get(self, task_id: str) -> AbstractTask:
+        return self._tasks[task_id]
+
+    def tasks(self) -> Dict[str, AbstractTask]:
+        """Tasks not completed yet, keyed by task_id."""
+        return dict(self._tasks)
+
+    def rank(self, task_id: str) -> float:
+        """Length of the critical path from the task."""
+        return self._rank[task_id]
+
+    def ready_tasks(self) -> List[AbstractTask]:
+        """List of tasks whose dependencies are resolved and not dispatched yet, in dispatch order."""
+        return [self._tasks[item[-1]] for item in sorted(self._ready)]
+
+    def iter_ready(self) -> Iterable[AbstractTask]:
+        """Tasks whose dependencies are resolved and not dispatched yet, in no particular order."""
+        return (self._tasks[item[-1]] for item in self._ready)
+
+    def dependents(self, task_id: str) -> Set[str]:
+        """task_ids of the tasks waiting for the task."""
+        return set(self._dependents.get(task_id, set()))
+
+    def remaining(self, task_id: str) -> int:
+        """Number of the unresolved dependencies of the task."""
+        return self._remaining[task_id]
+
+    def claim(self, task_id: str) -> None:
+        """Mark the task dispatched before its dependencies are completed.
+
+        The task is not put to ready queue when its dependencies are completed, but it still has to
+        be completed or failed as the other tasks.
+        """
+        self._claimed.add(task_id)
+
+    def unclaim(self, task_id: str) -> None:
+        """Cancel the claim of the task, which has to be put to ready queue by the caller if ready."""
+        self._claimed.discard(task_id)
+
+    def has_ready(self) -> bool:
+        return len(self._ready) > 0
+
+    def pop_ready(self) -> Optional[AbstractTask]:
+        """Remove the first task from ready queue, as it is handed to the executor."""
+        if len(self._ready) == 0:
+            return None
+        return self._tasks[heapq.heappop(self._ready)[-1]]
+
+    def take_ready_time(self, task_id: str) -> Optional[float]:
+        """Time the task became ready, forgotten once taken to be measured again by the retry."""
+        self._ready_seq.pop(task_id, None)
+        return self._ready_at.pop(task_id, None)
+
+    def order(self, task: AbstractTask) -> Tuple[int, float, int]:
+        """Key of the ready task in dispatch order, which is kept while the task is put back."""
+        task_id = task.task_id
+        return (-task.priority, -self._rank[task_id], self._ready_seq[task_id])
+
+    def push_ready(self, task: AbstractTask) -> None:
+        """Put back the task to ready queue, which could not be handed to the executor."""
+        task_id = task.task_id
+        self._ready_at.setdefault(task_id, time.time())
+        self._ready_seq.setdefault(task_id, next(self._sequence))
+        heapq.heappush(self._ready, self.order(task) + (task_id,))
+
+    def complete(self, task_id: str) -> None:
+        """Mark the task completed and resolve the dependencies of its dependents."""
+        to_complete = deque([task_id])
+
+        while len(to_complete) > 0:
+            completed_id = to_complete.popleft()
+
+            self._tasks.pop(completed_id)
+            self._remaining.pop(completed_id)
+            self._rank.pop(completed_id)
+            self._dependencies.pop(completed_id, None)
+            self._expanded.discard(completed_id)
+            self._claimed.discard(completed_id)
+            self._ready_at.pop(completed_id, None)
+            self._ready_seq.pop(completed_id, None)
+            self._completed.add(completed_id)
+
+            for dependent_id in self._dependents.pop(completed_id, set()):
+                self._remaining[dependent_id] -= 1
+
+                if self._remaining[dependent_id] > 0:
+                    continue
+
+                if dependent_id in self._expanded:
+                    # All the generated tasks are done, so as the DynamicTask.
+                    to_complete.append(dependent_id)
+                elif dependent_id not in self._claimed:
+                    self.push_ready(self._tasks[dependent_id])
+
+    def fail(self, task_id: str) -> List[AbstractTask]:
+        """Remove the failed task and the tasks depending on it, which never become ready.
+
+        Returns:
+            Tasks depending on the failed task.
+        """
+        blocked: List[AbstractTask] = []
+
+        to_remove = deque([task_id])
+        removed: Set[str] = set()
+
+        while len(to_remove) > 0:
+            removed_id = to_remove.popleft()
+
+            if removed_id in removed:
+                continue
+            removed.add(removed_id)
+
+            task = self._tasks.pop(removed_id)
+            if removed_id != task_id:
+                blocked.append(task)
+
+            self._remaining.pop(removed_id)
+            self._rank.pop(removed_id)
+            self._expanded.discard(removed_id)
+            self._claimed.discard(removed_id)
+            self._ready_at.pop(removed_id, None)
+            self._ready_seq.pop(removed_id, None)
+
+            # Other dependencies are not to resolve the removed task anymore.
+            for dependency_id in self._dependencies.pop(removed_id, set()):
+                if dependency_id in self._dependents:
+                    self._dependents[dependency_id].discard(removed_id)
+
+            to_remove.extend(self._dependents.pop(removed_id, set()))
+
+        return blocked
+
+    def expand(self, task_id: str, tasks: Iterable[AbstractTask]) -> List[AbstractTask]:
+        """Replace the DynamicTask with the tasks generated from it.
+
+        The tasks depending on the DynamicTask wait until all the generated tasks are completed.
+
+        Returns:
+            Generated tasks newly added to the graph.
+        """
+        tasks = list(tasks)
+
+        added = self._explore(tasks)
+
+        self._expanded.add(task_id)
+
+        for task in tasks:
+            if task.task_id in self._tasks:
+                self._add_edge(task.task_id, task_id)
+
+        self._update_rank(added)
+        self._push_ready(added)
+
+        if self._remaining[task_id] == 0:
+            self.complete(task_id)
+
+        added_ids = set(added)
+        return [task for task in tasks if task.task_id in added_ids]
+
+    def _add_edge(self, src_id: str, dst_id: str) -> None:
+        if dst_id in self._dependents[src_id]:
+            return
+        self._dependents[src_id].add(dst_id)
+        self._dependencies[dst_id].add(src_id)
+        self._remaining[dst_id] += 1
+
+    def _push_ready(self, task_ids: List[str]) -> None:
+        for task_id in task_ids:
+            if self._remaining[task_id] == 0:
+                self.push_ready(self._tasks[task_id])
+
+    def _update_rank(self, task_ids: List[str]) -> None:
+        """Calculate the rank of newly added tasks, from the downstream to the upstream.
+
+        Dependents of the tasks must be ranked already, or be one of the tasks.
+        """
+        targets = set(task_ids)
+
+        # key = task_id, value = number of dependents not ranked yet.
+        waiting = {
+            task_id: len(self._dependents.get(task_id, set()) & targets)
+            for task_id in task_ids
+        }
+
+        to_rank = [task_id for task_id, count in waiting.items() if count == 0]
+
+        while len(to_rank) > 0:
+            task_id = to_rank.pop()
+
+            cost = 0.0 if self._cost is None else self._cost(self._tasks[task_id])
+
+            self._rank[task_id] = cost + max(
+                [self._rank[d] for d in self._dependents.get(task_id, set())],
+                default=0.0,
+            )
+
+            for dependency_id in self._dependencies.get(task_id, set()) & targets:
+                waiting[dependency_id] -= 1
+                if waiting[dependency_id] == 0:
+                    to_rank.append(dependency_id)
+
+    def _visit(self, task: AbstractTask, pending: deque) -> bool:
+        """Register the task to the graph if incomplete, and returns if the task is in the graph."""
+        task_id = task.task_id
+
+        if task_id in self._tasks:
+            return True
+
+        if task_id in self._completed:
+            # Outputs of the completed task can be purged afterwards, and are produced again for the
+            # tasks generated by DynamicTask later.
+            if all(
+                self._completion_index.exists(output)
+                for output in flatten(task.output())
+            ):
+                return False
+
+            self._completed.discard(task_id)
+
+        elif self._completion_index.is_completed(task):
+            self._completed.add(task_id)
+            return False
+
+        self._tasks[task_id] = task
+        self._remaining[task_id] = 0
+        pending.append(task)
+        return True
+
+    def _explore(self, tasks: Iterable[AbstractTask]) -> List[str]:
+        """Add the incomplete tasks and their incomplete upstream tasks to the graph.
+
+        Returns:
+            task_ids newly added to the graph.
+        """
+        pending: deque = deque()
+
+        for task in tasks:
+            self._visit(task, pending)
+
+        added: List[str] = []
+
+        while len(pending) > 0:
+            task = pending.popleft()
+            added.append(task.task_id)
+
+            for inp in flatten(task.input()):
+                if self._completion_index.exists(inp):
+                    continue
+
+                if self._visit(inp.src_task, pending):
+                    self._add_edge(inp.src_task.task_id, task.task_id)
+
+        logger.debug(f"{len(added)} tasks are added to dependency graph")
+
+        return added
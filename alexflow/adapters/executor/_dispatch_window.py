@@ -0,0 +1,64 @@
+from collections import deque
+from typing import Deque, Optional
+
+import math
+
+
+class DispatchWindow:
+    """Number of tasks the scheduler keeps dispatched to workers and not completed yet.
+
+    Every worker is given a task, and workers are prefetched extra tasks as many as they complete
+    while a message makes a round trip between the scheduler and a worker. Short tasks are
+    prefetched so that workers do not starve waiting for the scheduler, and long tasks are not
+    prefetched so that queued tasks do not hold resources early.
+
+    Attrs:
+        workers: Number of workers executing tasks.
+        max_prefetch: Upper bound of the prefetched tasks.
+        alpha: Weight of the latest duration in the exponential moving average.
+    """
+
+    def __init__(
+        self, workers: int, max_prefetch: Optional[int] = None, alpha: float = 0.3
+    ):
+        self.workers: int = workers
+        self.max_prefetch: int = max_prefetch if max_prefetch is not None else 8 * workers
+        self.alpha: float = alpha
+
+        self._duration: Optional[float] = None
+        # Recent overheads of the round trips, the lowest one is taken as the latency since the
+        # others include the time waiting in the queue.
+        self._overheads: Deque[float] = deque(maxlen=100)
+
+    def record(self, duration: float, elapsed: float) -> None:
+        """Record a completed task.
+
+        Args:
+            duration: Seconds the task took on the worker.
+            elapsed: Seconds from the dispatch to the completion seen by the scheduler.
+        """
+        if self._duration is None:
+            self._duration = duration
+        else:
+            self._duration = self.alpha * duration + (1 - self.alpha) * self._duration
+
+        self._overheads.append(max(elapsed - duration, 0.0))
+
+    @property
+    def prefetch(self) -> int:
+        if self._duration is None or len(self._overheads) == 0:
+            # Nothing is known before the first completion, a task per worker is prefetched.
+            return min(self.workers, self.max_prefetch)
+
+        latency = min(self._overheads)
+
+        if latency <= 0.0:
+            return 0
+
+        per_worker = latency / max(self._duration, 1e-6)
+
+        return min(math.ceil(self.workers * per_worker), self.max_prefetch)
+
+    @property
+    def size(self) -> int:
+        return self.workers + self.prefetch
@@ -0,0 +1,66 @@
+from typing import Dict, Optional
+
+import json
+
+from alexflow.core import AbstractTask
+
+
+class DurationHistory:
+    """Recorded durations of the tasks per task class, used to estimate the cost of tasks.
+
+    The history can be saved after a run and loaded for the next run, so that the executor can find
+    the critical path of the workflow from the durations of the previous runs.
+
+    Attrs:
+        alpha: Weight of the latest duration in the exponential moving average.
+    """
+
+    def __init__(
+        self, durations: Optional[Dict[str, float]] = None, alpha: float = 0.3
+    ):
+        # key = module and name of the task class, value = moving average of seconds.
+        self._durations: Dict[str, float] = dict(durations or {})
+        self.alpha: float = alpha
+
+    def record(self, task: AbstractTask, seconds: float) -> None:
+        key = _task_class_key(task)
+
+        if key in self._durations:
+            seconds = self.alpha * seconds + (1 - self.alpha) * self._durations[key]
+
+        self._durations[key] = seconds
+
+    def estimate(self, task: AbstractTask) -> float:
+        """Expected seconds to complete the task.
+
+        `AbstractTask.cost_hint` is used if given, otherwise the recorded duration of the task class.
+        Tasks of unknown classes are expected to take the average of the known classes, or 1 second.
+        """
+        if task.cost_hint is not None:
+            return task.cost_hint
+
+        key = _task_class_key(task)
+
+        if key in self._durations:
+            return self._durations[key]
+
+        if len(self._durations) == 0:
+            return 1.0
+
+        return sum(self._durations.values()) / len(self._durations)
+
+    def to_dict(self) -> Dict[str, float]:
+        return dict(self._durations)
+
+    def save(self, path: str) -> None:
+        with open(path, "w") as f:
+            json.dump(self._durations, f, indent=2, sort_keys=True)
+
+    @classmethod
+    def load(cls, path: str) -> "DurationHistory":
+        with open(path) as f:
+            return cls(json.load(f))
+
+
+def _task_class_key(task: AbstractTask) -> str:
+    return f"{task.__class__.__module__}.{task.__class__.__qualname__}"
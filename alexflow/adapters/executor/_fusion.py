@@ -0,0 +1,154 @@
+from typing import Any, Callable, Dict, List, Set, Tuple
+
+from ...core import AbstractTask, DynamicTask, Output
+from ...helper import flatten
+
+from ._dependency_graph import DependencyGraph
+from ._output_cache import _extend, _is_cacheable
+
+
+def fusable_chain(
+    task: AbstractTask,
+    graph: DependencyGraph,
+    targets: Set[str],
+    eligible: Callable[[AbstractTask], bool],
+) -> List[AbstractTask]:
+    """Tasks to run back-to-back after the task, each handed the outputs of the previous in memory.
+
+    A task is fused to the previous one when it is the only task waiting for the previous one, the
+    previous one is its only unresolved dependency, and it refers to all the outputs of the previous
+    one as ephemeral. Otherwise the outputs have to be materialized for the other consumers, or
+    for the user when the previous one is a target of the workflow.
+
+    Args:
+        task: Ready task to dispatch.
+        graph: Dependency graph of the run.
+        targets: task_ids of the tasks given to the workflow, whose outputs are kept.
+        eligible: Whether the task can be fused, e.g. not executed with timeout.
+
+    Returns:
+        Tasks following the task in the order to run, empty if nothing is fused.
+    """
+    chain: List[AbstractTask] = []
+
+    current = task
+
+    while eligible(current) and _is_fusable_producer(current, targets):
+        dependents = graph.dependents(current.task_id)
+
+        if len(dependents) != 1:
+            break
+
+        (dependent_id,) = dependents
+
+        if graph.remaining(dependent_id) != 1:
+            break
+
+        dependent = graph.get(dependent_id)
+
+        if not (
+            _is_handed_off(current, dependent)
+            and _is_compatible(task, dependent)
+            and eligible(dependent)
+        ):
+            break
+
+        chain.append(dependent)
+        current = dependent
+
+    return chain
+
+
+def _is_fusable_producer(task: AbstractTask, targets: Set[str]) -> bool:
+    if isinstance(task, DynamicTask) or task.task_id in targets:
+        return False
+
+    outputs = flatten(task.output())
+
+    return len(outputs) > 0 and all(_is_cacheable(type(item)) for item in outputs)
+
+
+def _is_handed_off(producer: AbstractTask, consumer: AbstractTask) -> bool:
+    """Whether the consumer refers to all the outputs of the producer, and only as ephemeral."""
+    if isinstance(consumer, DynamicTask):
+        return False
+
+    references = [
+        item
+        for item in flatten(consumer.input())
+        if item.src_task.task_id == producer.task_id
+    ]
+
+    if not all(item.ephemeral for item in references):
+        return False
+
+    return {item.key for item in references} == {
+        item.key for item in flatten(producer.output())
+    }
+
+
+def _is_compatible(head: AbstractTask, task: AbstractTask) -> bool:
+    """Fused tasks run on the resources admitted for the head, so they must require the same."""
+    return task.resource_usage == head.resource_usage and getattr(
+        task, "resource_spec", None
+    ) == getattr(head, "resource_spec", None)
+
+
+class HandOff:
+    """Objects of the outputs handed from a task to the next task of a fused chain in memory."""
+
+    def __init__(self):
+        # key = Output.key, value = object stored by the previous task.
+        self._objects: Dict[str, Any] = {}
+        # key = Output.key, value = Output with storage, to materialize the object.
+        self._outputs: Dict[str, Output] = {}
+        self._classes: Dict[Tuple, type] = {}
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._objects
+
+    def hold(self, output: Output) -> Output:
+        """Output which keeps the stored object in memory instead of the storage."""
+        self._outputs[output.key] = output
+        return _extend(output, _HandedOutput, self._classes, "Handed", _hand_off=self)
+
+    def take(self, output: Output) -> Output:
+        """Output which loads the object kept in memory, or the output as is if not kept."""
+        if output.key not in self._objects:
+            return output
+        return _extend(output, _HandedOutput, self._classes, "Handed", _hand_off=self)
+
+    def release(self, outputs: List[Output]) -> None:
+        """Drop the objects consumed by the next task."""
+        for output in outputs:
+            self._objects.pop(output.key, None)
+            self._outputs.pop(output.key, None)
+
+    def materialize(self) -> bool:
+        """Store the objects kept in memory to the storage, when the next task could not take them.
+
+        Returns:
+            Whether any object is stored.
+        """
+        for key, value in self._objects.items():
+            self._outputs[key].store(value)
+
+        materialized = len(self._objects) > 0
+
+        self._objects.clear()
+        self._outputs.clear()
+
+        return materialized
+
+
+class _HandedOutput:
+    _hand_off: HandOff
+
+    def store(self, data):
+        self._hand_off._objects[self.key] = data  # type: ignore
+
+    def load(self):
+        return self._hand_off._objects[self.key]  # type: ignore
+
+    def exists(self) -> bool:
+        return self.key in self._hand_off  # type: ignore
@@ -0,0 +1,66 @@
+from collections import Counter
+from typing import Dict, List, Optional
+
+from ...core import AbstractTask
+from ...helper import flatten
+
+
+class Locality:
+    """Routes tasks to the workers which hold their inputs in the cache.
+
+    The worker which completed a task is taken as the holder of its outputs. The cache of the
+    worker may have evicted them, or lost them by the recycle of the process, in which case the
+    task only loads the inputs from the storage as usual.
+
+    Attrs:
+        workers: Identifiers of workers, pid of the processes in alexflow executor.
+    """
+
+    def __init__(self, workers: List[int]):
+        self.workers: List[int] = workers
+
+        # key = worker, value = number of tasks dispatched to the worker and not completed yet.
+        self._load: Dict[int, int] = {worker: 0 for worker in workers}
+        # key = task_id, value = worker the task is dispatched to.
+        self._assigned: Dict[str, int] = {}
+        # key = task_id, value = worker which completed the task.
+        self._holders: Dict[str, int] = {}
+
+    def preferred(self, task: AbstractTask) -> List[int]:
+        """Workers holding any inputs of the task, in descending order of the number of them."""
+        counts = Counter(
+            self._holders[output.src_task.task_id]
+            for output in flatten(task.input())
+            if output.src_task.task_id in self._holders
+        )
+        return [worker for worker, _ in counts.most_common()]
+
+    def choose(self, task: AbstractTask, limit: int) -> Optional[int]:
+        """Preferred worker with less than limit tasks, or None if no such worker.
+
+        Args:
+            task: Task to dispatch.
+            limit: Max number of tasks queued to a worker, including the running one.
+        """
+        for worker in self.preferred(task):
+            if self._load[worker] < limit:
+                return worker
+
+        return None
+
+    def least_loaded(self) -> int:
+        return min(self.workers, key=lambda worker: self._load[worker])
+
+    def assign(self, task_id: str, worker: int) -> None:
+        self._assigned[task_id] = worker
+        self._load[worker] += 1
+
+    def release(self, task_id: str, worker: Optional[int] = None) -> None:
+        """Mark the dispatched task as finished, and record the worker completed it if given."""
+        assigned = self._assigned.pop(task_id, None)
+
+        if assigned is not None:
+            self._load[assigned] -= 1
+
+        if worker is not None:
+            self._holders[task_id] = worker
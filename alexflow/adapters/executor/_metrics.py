@@ -0,0 +1,249 @@
+from typing import Dict, List, Tuple, Sequence
+from collections import defaultdict
+from dataclasses import dataclass, field
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+
+import bisect
+import threading
+
+
+Labels = Tuple[Tuple[str, str], ...]
+
+# Upper bounds of the histogram buckets in seconds, from the scheduling overheads to long tasks.
+DEFAULT_BUCKETS: Tuple[float, ...] = (
+    0.001,
+    0.005,
+    0.01,
+    0.05,
+    0.1,
+    0.5,
+    1.0,
+    5.0,
+    10.0,
+    30.0,
+    60.0,
+    300.0,
+    1800.0,
+    3600.0,
+)
+
+
+@dataclass
+class Histogram:
+    """Observations counted by the upper bounds of the buckets.
+
+    Attrs:
+        buckets: Upper bounds of the buckets, in ascending order.
+        counts: Number of observations per bucket, not cumulative, with the last one for +Inf.
+        sum: Sum of the observations.
+        count: Number of the observations.
+    """
+
+    buckets: Tuple[float, ...] = DEFAULT_BUCKETS
+    counts: List[int] = field(default_factory=list)
+    sum: float = 0.0
+    count: int = 0
+
+    def __post_init__(self):
+        if len(self.counts) == 0:
+            self.counts = [0] * (len(self.buckets) + 1)
+
+    def observe(self, value: float) -> None:
+        self.counts[bisect.bisect_left(self.buckets, value)] += 1
+        self.sum += value
+        self.count += 1
+
+
+class Metrics:
+    """Counters, gauges and histograms collected by an executor run.
+
+    Give an instance to the executor to read them while running, or after the run. They are also
+    exposed in Prometheus text format by `to_prometheus`, or `serve_metrics` over HTTP.
+
+    Examples:
+        >>> metrics = Metrics()
+        >>> metrics.inc("worker_recycles", reason="max_tasks")
+        >>> metrics.get("worker_recycles", reason="max_tasks")
+        1.0
+        >>> metrics.set("in_flight", 4)
+        >>> metrics.get("in_flight")
+        4.0
+        >>> metrics.observe("task_duration_seconds", 0.5, task="Task1")
+        >>> metrics.histogram("task_duration_seconds", task="Task1").count
+        1
+    """
+
+    def __init__(self, buckets: Sequence[float] = DEFAULT_BUCKETS):
+        self._lock = threading.Lock()
+        self._counters: Dict[Tuple[str, Labels], float] = defaultdict(float)
+        self._histograms: Dict[Tuple[str, Labels], Histogram] = {}
+        # key = name, value = "counter", "gauge" or "histogram" by the first update.
+        self._types: Dict[str, str] = {}
+        self._buckets: Tuple[float, ...] = tuple(sorted(buckets))
+
+    def inc(self, name: str, value: float = 1, **labels: str) -> None:
+        with self._lock:
+            self._types.setdefault(name, "counter")
+            self._counters[(name, _to_labels(labels))] += value
+
+    def set(self, name: str, value: float, **labels: str) -> None:
+        """Set the current value of the gauge."""
+        with self._lock:
+            self._types.setdefault(name, "gauge")
+            self._counters[(name, _to_labels(labels))] = float(value)
+
+    def observe(self, name: str, value: float, **labels: str) -> None:
+        """Add the observation to the histogram."""
+        key = (name, _to_labels(labels))
+
+        with self._lock:
+            self._types.setdefault(name, "histogram")
+
+            if key not in self._histograms:
+                self._histograms[key] = Histogram(buckets=self._buckets)
+
+            self._histograms[key].observe(value)
+
+    def get(self, name: str, **labels: str) -> float:
+        """Value of the metric, or the sum over all the labels if no labels are given.
+
+        The sum of the observations is given for histograms.
+        """
+        with self._lock:
+            if self._types.get(name) == "histogram":
+                values = {
+                    key: histogram.sum for key, histogram in self._histograms.items()
+                }
+            else:
+                values = self._counters
+
+            if len(labels) > 0:
+                return values.get((name, _to_labels(labels)), 0.0)
+
+            return sum(value for (key, _), value in values.items() if key == name)
+
+    def histogram(self, name: str, **labels: str) -> Histogram:
+        """Copy of the histogram, merged over all the labels if no labels are given."""
+        out = Histogram(buckets=self._buckets)
+
+        with self._lock:
+            for (key, key_labels), histogram in self._histograms.items():
+                if key != name or (
+                    len(labels) > 0 and key_labels != _to_labels(labels)
+                ):
+                    continue
+
+                out.counts = [a + b for a, b in zip(out.counts, histogram.counts)]
+                out.sum += histogram.sum
+                out.count += histogram.count
+
+        return out
+
+    def snapshot(self) -> Dict[str, Dict[Labels, float]]:
+        """Copy of all the counters and gauges, keyed by name and then labels."""
+        out: Dict[str, Dict[Labels, float]] = defaultdict(dict)
+
+        with self._lock:
+            for (name, labels), value in self._counters.items():
+                out[name][labels] = value
+
+        return dict(out)
+
+    def to_prometheus(self, prefix: str = "alexflow_") -> str:
+        """Metrics in Prometheus text exposition format."""
+        lines: List[str] = []
+
+        with self._lock:
+            for name, kind in sorted(self._types.items()):
+                metric = prefix + name
+
+                lines.append(f"# TYPE {metric} {kind}")
+
+                if kind == "histogram":
+                    for (key, labels), histogram in sorted(self._histograms.items()):
+                        if key == name:
+                            lines.extend(_histogram_lines(metric, labels, histogram))
+                    continue
+
+                suffix = "_total" if kind == "counter" else ""
+
+                for (key, labels), value in sorted(self._counters.items()):
+                    if key == name:
+                        lines.append(f"{metric}{suffix}{_format(labels)} {value}")
+
+        return "\n".join(lines) + "\n"
+
+
+def serve_metrics(
+    metrics: Metrics, port: int = 0, address: str = "127.0.0.1"
+) -> ThreadingHTTPServer:
+    """Serve the metrics in Prometheus text format at /metrics, on a daemon thread.
+
+    Args:
+        metrics: Metrics to serve.
+        port: Port to listen, chosen by the OS if 0, see `server.server_address`.
+        address: Address to listen, only the local machine by default.
+
+    Returns:
+        Running server, stopped by `shutdown`.
+    """
+
+    class Handler(BaseHTTPRequestHandler):
+        def do_GET(self):
+            if self.path.split("?")[0] != "/metrics":
+                self.send_error(404)
+                return
+
+            body = metrics.to_prometheus().encode()
+
+            self.send_response(200)
+            self.send_header("Content-Type", "text/plain; version=0.0.4")
+            self.send_header("Content-Length", str(len(body)))
+            self.end_headers()
+            self.wfile.write(body)
+
+        def log_message(self, format, *args):
+            pass
+
+    server = ThreadingHTTPServer((address, port), Handler)
+    server.daemon_threads = True
+
+    threading.Thread(target=server.serve_forever, daemon=True).start()
+
+    return server
+
+
+def _histogram_lines(metric: str, labels: Labels, histogram: Histogram) -> List[str]:
+    lines = []
+
+    cumulative = 0
+    for bound, count in zip(list(histogram.buckets) + [float("inf")], histogram.counts):
+        cumulative += count
+        le = "+Inf" if bound == float("inf") else repr(float(bound))
+        lines.append(f"{metric}_bucket{_format(labels + (('le', le),))} {cumulative}")
+
+    lines.append(f"{metric}_sum{_format(labels)} {histogram.sum}")
+    lines.append(f"{metric}_count{_format(labels)} {histogram.count}")
+
+    return lines
+
+
+def _format(labels: Labels) -> str:
+    if len(labels) == 0:
+        return ""
+
+    return (
+        "{"
+        + ",".join(
+            '{}="{}"'.format(
+                key,
+                value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"'),
+            )
+            for key, value in labels
+        )
+        + "}"
+    )
+
+
+def _to_labels(labels: Dict[str, str]) -> Labels:
+    return tuple(sorted((key, str(value)) for key, value in labels.items()))
@@ -0,0 +1,245 @@
+from collections import OrderedDict
+from typing import Any, Dict, Iterable, List, Optional, Tuple, TypeVar
+
+import itertools
+import sys
+
+from ...core import Output, BinaryOutput
+
+
+T = TypeVar("T")
+
+_MISSING = object()
+
+
+class OutputCache:
+    """Byte-bounded LRU of the objects of outputs, kept by a worker process.
+
+    Objects stored to or loaded from `BinaryOutput` by the tasks of the worker are kept, so that
+    downstream tasks running on the same worker skip the load from the storage. The objects are
+    still written to the storage, for the tasks on the other workers and for the later runs.
+
+    Only `BinaryOutput` which does not override `store` nor `load` is cached, since the round trip
+    of the other outputs can return an object different from the stored one, e.g. tuples stored
+    to `JSONOutput` are loaded as lists. Objects whose size is not estimated without serializing
+    them, e.g. instances of user classes, are not cached either.
+
+    Attrs:
+        max_bytes: Upper bound of the estimated size of the cached objects.
+        hits: Number of loads served from the cache.
+        misses: Number of loads from the storage.
+    """
+
+    def __init__(self, max_bytes: int):
+        self.max_bytes: int = max_bytes
+        self.hits: int = 0
+        self.misses: int = 0
+
+        self._entries: "OrderedDict[str, Tuple[Any, int]]" = OrderedDict()
+        self._nbytes: int = 0
+        self._classes: Dict[Tuple, type] = {}
+
+    @property
+    def nbytes(self) -> int:
+        return self._nbytes
+
+    def __len__(self) -> int:
+        return len(self._entries)
+
+    def __contains__(self, key: str) -> bool:
+        return key in self._entries
+
+    def get(self, key: str) -> Any:
+        """Cached object of the key, or `_MISSING`."""
+        if key not in self._entries:
+            return _MISSING
+
+        self._entries.move_to_end(key)
+        return self._entries[key][0]
+
+    def put(self, key: str, value: Any) -> None:
+        self.discard(key)
+
+        size = _sizeof(value)
+
+        if size is None or size > self.max_bytes:
+            return
+
+        self._entries[key] = (value, size)
+        self._nbytes += size
+
+        while self._nbytes > self.max_bytes:
+            _, (_, evicted) = self._entries.popitem(last=False)
+            self._nbytes -= evicted
+
+    def discard(self, key: str) -> None:
+        if key in self._entries:
+            _, size = self._entries.pop(key)
+            self._nbytes -= size
+
+    def wrap(self, output: Output) -> Output:
+        """Output which stores to and loads from the cache, or the output as is if not cacheable."""
+        cls = type(output)
+
+        if not _is_cacheable(cls):
+            return output
+
+        return _extend(output, _CachedOutput, self._classes, "Cached", _cache=self)
+
+
+class _CachedOutput:
+    _cache: OutputCache
+
+    def store(self, data):
+        super().store(data)  # type: ignore
+        self._cache.put(self.key, data)  # type: ignore
+
+    def load(self):
+        data = self._cache.get(self.key)  # type: ignore
+
+        if data is not _MISSING:
+            self._cache.hits += 1
+            return data
+
+        self._cache.misses += 1
+
+        data = super().load()  # type: ignore
+        self._cache.put(self.key, data)  # type: ignore
+        return data
+
+
+def _extend(
+    obj: T,
+    mixin: type,
+    classes: Dict[Tuple, type],
+    prefix: str,
+    state: Optional[Dict[str, Any]] = None,
+    **attrs,
+) -> T:
+    """Copy of the object as an instance of the subclass of its class with the mixin.
+
+    The copy is equal to, hashed, printed and pickled as the object, so that it can be handed to
+    the tasks in place of the object.
+
+    Args:
+        obj: Output or storage to copy.
+        mixin: Class overriding the methods of the object.
+        classes: Subclasses already created, keyed by the class of the object and the attrs.
+        prefix: Prefix of the name of the subclass.
+        state: Attributes of the copy, which are neither compared nor pickled, so that the
+            subclass is shared by the copies with different states, e.g. the meter of each job.
+        attrs: Attributes of the subclass, which are kept by `dataclasses.replace` of the copy.
+    """
+    state = state or {}
+
+    cls = type(obj)
+    key = (cls,) + tuple(attrs.items()) + (tuple(state),)
+
+    if key not in classes:
+        # Extended again, e.g. a storage both metered and recorded, on the original class.
+        bases = (
+            (mixin, cls) if issubclass(cls, _Extension) else (mixin, _Extension, cls)
+        )
+        classes[key] = type(
+            f"{prefix}{cls.__name__}",
+            bases,
+            dict(
+                attrs,
+                _base=getattr(cls, "_base", cls),
+                _state=getattr(cls, "_state", ()) + tuple(state),
+            ),
+        )
+
+    extended: T = object.__new__(classes[key])
+    extended.__dict__.update(obj.__dict__)
+    extended.__dict__.update(state)
+    return extended
+
+
+class _Extension:
+    """Base of the subclasses made by `_extend`, which behave as the original class."""
+
+    _base: type
+    _state: Tuple[str, ...] = ()
+
+    def __reduce__(self):
+        return _restore, (self._base, _fields(self))
+
+    def __eq__(self, other):
+        return _original(self) == _original(other)
+
+    def __hash__(self):
+        return hash(_original(self))
+
+    def __repr__(self):
+        return repr(_original(self))
+
+
+def _restore(cls: type, state: Dict[str, Any]) -> Any:
+    obj: Any = object.__new__(cls)
+    obj.__dict__.update(state)
+    return obj
+
+
+def _original(obj: Any) -> Any:
+    if isinstance(obj, _Extension):
+        return _restore(obj._base, _fields(obj))
+    return obj
+
+
+def _fields(obj: "_Extension") -> Dict[str, Any]:
+    return {k: v for k, v in obj.__dict__.items() if k not in obj._state}
+
+
+def _is_cacheable(cls: type) -> bool:
+    return (
+        issubclass(cls, BinaryOutput)
+        and cls.store is BinaryOutput.store
+        and cls.load is BinaryOutput.load
+    )
+
+
+def _sizeof(value: Any) -> Optional[int]:
+    """Estimated bytes the object holds in memory, or None if it can not be estimated cheaply."""
+    if hasattr(value, "memory_usage"):
+        # pandas.DataFrame gives the usage per column, and pandas.Series gives the total.
+        usage = value.memory_usage(deep=True)
+        return int(usage.sum() if hasattr(usage, "sum") else usage)
+
+    if hasattr(value, "nbytes"):
+        return int(value.nbytes)
+
+    return _sizeof_builtin(value, [_MAX_VISITS])
+
+
+# Objects visited to estimate the size of containers, not to spend more than serializing them.
+_MAX_VISITS = 10000
+
+_SCALARS = (bytes, bytearray, str, int, float, complex, bool, type(None))
+
+
+def _sizeof_builtin(value: Any, budget: List[int]) -> Optional[int]:
+    budget[0] -= 1
+
+    if budget[0] < 0:
+        return None
+
+    if isinstance(value, _SCALARS):
+        return sys.getsizeof(value)
+
+    if isinstance(value, dict):
+        items: Iterable[Any] = itertools.chain.from_iterable(value.items())
+    elif isinstance(value, (list, tuple, set, frozenset)):
+        items = value
+    else:
+        return None
+
+    size = sys.getsizeof(value)
+
+    for item in items:
+        item_size = _sizeof_builtin(item, budget)
+        if item_size is None:
+            return None
+        size += item_size
+
+    return size
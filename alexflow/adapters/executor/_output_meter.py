@@ -0,0 +1,76 @@
+from collections import defaultdict
+from contextlib import contextmanager
+from typing import Dict, Iterator, Tuple
+
+import os
+
+from ...core import Output
+
+from ._output_cache import _extend
+
+
+# Subclasses of the storages, keyed by the class of the storage and the class name of the output.
+# Shared by the meters of all the jobs, which are set on the copies of the storage instead.
+_CLASSES: Dict[Tuple, type] = {}
+
+
+class OutputMeter:
+    """Counts the bytes loaded and stored through the outputs, by the class of the outputs.
+
+    The size of the files given by `Storage.path` is counted, so the objects handed in memory or
+    loaded from the cache are not.
+
+    Attrs:
+        bytes: Bytes keyed by the operation, "load" or "store", and the class name of the output.
+    """
+
+    def __init__(self):
+        self.bytes: Dict[Tuple[str, str], int] = defaultdict(int)
+
+    def wrap(self, output: Output) -> Output:
+        """Output whose storage counts the bytes, which must be applied before the other wraps."""
+        if output.storage is None:
+            return output
+
+        return output.assign_storage(
+            _extend(
+                output.storage,
+                _MeteredStorage,
+                _CLASSES,
+                "Metered",
+                state={"_meter": self},
+                _output_class=type(output).__name__,
+            )
+        )
+
+
+class _MeteredStorage:
+    """Counts the size of the files of the paths, mixed into the class of the storage."""
+
+    _meter: OutputMeter
+    _output_class: str
+
+    @contextmanager
+    def path(self, path: str, mode: str = "r") -> Iterator[str]:
+        with super().path(path, mode=mode) as local_path:  # type: ignore
+            if mode == "r":
+                self._count("load", local_path)
+
+            yield local_path
+
+            if mode != "r":
+                self._count("store", local_path)
+
+    def _count(self, operation: str, path: str) -> None:
+        self._meter.bytes[(operation, self._output_class)] += _size(path)
+
+
+def _size(path: str) -> int:
+    if os.path.isfile(path):
+        return os.path.getsize(path)
+
+    return sum(
+        os.path.getsize(os.path.join(root, name))
+        for root, _, names in os.walk(path)
+        for name in names
+    )
@@ -4,6 +4,9 @@ from collections import defaultdict, OrderedDict
 from alexflow.core import AbstractTask, Storage, Output
 from alexflow.helper import flatten, is_completed
 
+from ._completion_index import CompletionIndex
+from ._metrics import Metrics
+
 from logging import getLogger
 
 
@@ -14,9 +17,21 @@ class ReferenceManager:
     """Manages reference count of Output object and purge once all referenced tasks are resolved.
     """
 
-    def __init__(self, tasks: Dict[str, AbstractTask], storage: Storage):
+    def __init__(
+        self,
+        tasks: Dict[str, AbstractTask],
+        storage: Storage,
+        completion_index: Optional[CompletionIndex] = None,
+        metrics: Optional[Metrics] = None,
+    ):
         self._refcount, self._ephemeral_map = _to_ref_map(tasks)
         self._storage: Storage = storage
+        self._metrics: Optional[Metrics] = metrics
+
+        if completion_index is None:
+            completion_index = CompletionIndex(storage)
+
+        self._completion_index: CompletionIndex = completion_index
 
     def add(self, task: AbstractTask) -> None:
         """Add new task to reference manager in case you have additional task with DynamicTask"""
@@ -50,6 +65,8 @@ class ReferenceManager:
                 storage=self._storage,
                 refcount=self._refcount,
                 ephemeral_map=self._ephemeral_map,
+                completion_index=self._completion_index,
+                metrics=self._metrics,
             )
 
 
@@ -58,6 +75,8 @@ def _recursive_purge_if_ephemeral(
     storage: Storage,
     refcount: Dict[str, Set[str]],
     ephemeral_map: Dict[str, bool],
+    completion_index: CompletionIndex,
+    metrics: Optional[Metrics] = None,
 ):
     """Recursively purge the output who marked as ephemeral.
     """
@@ -73,16 +92,29 @@ def _recursive_purge_if_ephemeral(
     output = output.assign_storage(storage)
 
     # Case when sub-graph is already purged.
-    if not output.exists():
+    if not completion_index.exists(output):
+        return
+
+    if not all([ephemeral_map[key] for key in output.physical_key_list()]):
         return
 
-    if all([ephemeral_map[key] for key in output.physical_key_list()]):
-        logger.debug(f"Purging Output(key={output.key})")
-        output.remove()
+    logger.debug(f"Purging Output(key={output.key})")
+    output.remove()
+    completion_index.remove(output)
 
+    if metrics is not None:
+        metrics.inc("purged_outputs", output=type(output).__name__)
+
+    # Upstream outputs are visited only when this output is purged, since the others are already
+    # handled when their last reference was removed. Otherwise every completion walks the whole ancestry.
     for item in flatten(output.src_task.input()):
         _recursive_purge_if_ephemeral(
-            item, storage=storage, refcount=refcount, ephemeral_map=ephemeral_map
+            item,
+            storage=storage,
+            refcount=refcount,
+            ephemeral_map=ephemeral_map,
+            completion_index=completion_index,
+            metrics=metrics,
         )
 
 
@@ -108,12 +140,19 @@ def _to_ref_map(
     # key = Output.key, value where an output is all ephemeral or not.
     ephemeral_map: Dict[str, bool] = defaultdict(lambda: True)
 
+    visited: Set[str] = set()
+
     while len(tasks) > 0:
 
         next_tasks: Dict[str, AbstractTask] = {}
 
         for task_id, task in tasks.items():
 
+            if task_id in visited:
+                continue
+
+            visited.add(task_id)
+
             if only_incomplete:
                 assert isinstance(storage, Storage)
 
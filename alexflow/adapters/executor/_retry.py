@@ -0,0 +1,120 @@
+from dataclasses import dataclass
+from typing import Dict, List, Optional, Tuple, Type, Union
+
+import heapq
+import itertools
+
+from alexflow.core import AbstractTask
+
+
+@dataclass(frozen=True)
+class RetryPolicy:
+    """Defines whether and when a failed task is executed again.
+
+    Attrs:
+        max_attempts: Number of executions of a task, including the first one.
+        backoff: Seconds to wait before the first retry, multiplied by `multiplier` for each retry.
+        multiplier: Growth of the backoff per retry.
+        max_backoff: Upper bound of the seconds to wait.
+        retry_on: Exception classes to retry, the other errors fail the task at once.
+    """
+
+    max_attempts: int = 3
+    backoff: float = 1.0
+    multiplier: float = 2.0
+    max_backoff: float = 60.0
+    retry_on: Tuple[Type[BaseException], ...] = (Exception,)
+
+    def delay(self, attempts: int, error_types: List[str]) -> Optional[float]:
+        """Seconds to wait before the next attempt, or None if the task is not retried.
+
+        Args:
+            attempts: Number of executions of the task so far.
+            error_types: Qualified names of the class of the error and its base classes, since the
+                error raised on a worker process is not sent to the scheduler as is.
+        """
+        if attempts >= self.max_attempts:
+            return None
+
+        if not {_qualname(cls) for cls in self.retry_on} & set(error_types):
+            return None
+
+        return min(self.backoff * self.multiplier ** (attempts - 1), self.max_backoff)
+
+
+class RetryQueue:
+    """Failed tasks waiting for the backoff, until they are put back to the ready queue.
+
+    The policy is looked up by the class of the task and its base classes first, then by the tags
+    of the task, otherwise the default policy is used.
+    """
+
+    def __init__(
+        self,
+        default: Optional[RetryPolicy] = None,
+        policies: Optional[Dict[Union[type, str], RetryPolicy]] = None,
+    ):
+        self._default: RetryPolicy = default or RetryPolicy(max_attempts=1)
+        self._policies: Dict[Union[type, str], RetryPolicy] = dict(policies or {})
+
+        # key = task_id, value = number of executions so far.
+        self._attempts: Dict[str, int] = {}
+
+        # Heap of (time to retry, sequence, task_id)
+        self._delayed: List[Tuple[float, int, str]] = []
+        self._sequence = itertools.count()
+
+    def __len__(self) -> int:
+        return len(self._delayed)
+
+    def policy(self, task: AbstractTask) -> RetryPolicy:
+        for cls in task.__class__.__mro__:
+            if cls in self._policies:
+                return self._policies[cls]
+
+        for tag in sorted(task.tags):
+            if tag in self._policies:
+                return self._policies[tag]
+
+        return self._default
+
+    def schedule(
+        self, task: AbstractTask, error_types: List[str], now: float
+    ) -> Optional[float]:
+        """Schedule the failed task to retry.
+
+        Returns:
+            Seconds until the retry, or None if the task is not retried.
+        """
+        attempts = self._attempts.get(task.task_id, 0) + 1
+        self._attempts[task.task_id] = attempts
+
+        delay = self.policy(task).delay(attempts, error_types)
+
+        if delay is not None:
+            heapq.heappush(
+                self._delayed, (now + delay, next(self._sequence), task.task_id)
+            )
+
+        return delay
+
+    def pop_due(self, now: float) -> List[str]:
+        """Remove the task_ids whose backoff has elapsed."""
+        out = []
+        while len(self._delayed) > 0 and self._delayed[0][0] <= now:
+            out.append(heapq.heappop(self._delayed)[-1])
+        return out
+
+    def wait_time(self, now: float) -> float:
+        """Seconds until the next retry."""
+        if len(self._delayed) == 0:
+            return 0.0
+        return max(self._delayed[0][0] - now, 0.0)
+
+
+def error_types(e: BaseException) -> List[str]:
+    return [_qualname(cls) for cls in e.__class__.__mro__]
+
+
+def _qualname(cls: type) -> str:
+    return f"{cls.__module__}.{cls.__qualname__}"
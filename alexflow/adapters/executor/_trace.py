@@ -0,0 +1,244 @@
+from contextlib import contextmanager
+from typing import Any, Dict, Iterator, List, Optional, Set, Tuple
+
+import itertools
+import json
+import os
+import threading
+import time
+
+from ...core import AbstractTask, Output
+
+from ._output_cache import _extend
+
+
+# (operation, class of the output, key, begin, end)
+IOSpan = Tuple[str, str, str, float, float]
+
+
+class Trace:
+    """Timeline of the tasks executed by an executor run, in Chrome trace event format.
+
+    Each attempt of a task is recorded as a "run" slice on the track of the thread which executed
+    it, with "load" and "store" slices of its outputs nested in it. The waits of the task are
+    recorded as async slices of the scheduler, "ready" from the resolution of its dependencies to
+    the dispatch, "queued" from the dispatch to the start on a worker, and "ack" from the finish to
+    the receipt by the scheduler.
+
+    Examples:
+        >>> trace = Trace()
+        >>> run_workflow(workflow, n_jobs=4, trace=trace)
+        >>> trace.dump("trace.json")  # Open in https://ui.perfetto.dev
+    """
+
+    def __init__(self):
+        self._lock = threading.Lock()
+        self._events: List[Dict[str, Any]] = []
+        self._ids = itertools.count()
+        self._named_processes: Set[int] = set()
+        self._named_threads: Set[Tuple[int, int]] = set()
+
+    def add(
+        self,
+        task: AbstractTask,
+        outcome: str,
+        acked: float,
+        ready: Optional[float] = None,
+        dispatched: Optional[float] = None,
+        worker: Optional[Dict[str, Any]] = None,
+    ) -> None:
+        """Record an attempt of the task.
+
+        Args:
+            task: Executed task.
+            outcome: "done", "generated" or "failed".
+            acked: Time the scheduler received the result.
+            ready: Time the task became ready.
+            dispatched: Time the task was handed to the worker.
+            worker: Timestamps reported by the worker, see `_worker_trace`, or None if the task is
+                not executed by a worker, e.g. cancelled by the timeout.
+        """
+        name = type(task).__name__
+        args = {"task_id": task.task_id, "outcome": outcome}
+
+        scheduler = (os.getpid(), 0)
+
+        with self._lock:
+            self._name(scheduler, "scheduler", "scheduler")
+
+            started = worker["started"] if worker is not None else None
+            finished = worker["finished"] if worker is not None else acked
+
+            self._async("ready", name, scheduler, ready, dispatched, args)
+            self._async("queued", name, scheduler, dispatched, started, args)
+            self._async("ack", name, scheduler, finished, acked, args)
+
+            if worker is None:
+                return
+
+            track = (worker["pid"], worker["tid"])
+            self._name(track, f"worker {worker['pid']}", f"thread {worker['tid']}")
+
+            self._slice(name, "run", track, worker["started"], worker["finished"], args)
+
+            for operation, output_class, key, begin, end in worker["io"]:
+                self._slice(
+                    f"{operation} {output_class}",
+                    operation,
+                    track,
+                    begin,
+                    end,
+                    {"key": key},
+                )
+
+    def events(self) -> List[Dict[str, Any]]:
+        with self._lock:
+            return list(self._events)
+
+    def dump(self, path: str) -> None:
+        """Write the trace as JSON file, to open in Perfetto or chrome://tracing."""
+        with open(path, "w") as f:
+            json.dump({"traceEvents": self.events(), "displayTimeUnit": "ms"}, f)
+
+    def _slice(
+        self,
+        name: str,
+        category: str,
+        track: Tuple[int, int],
+        begin: float,
+        end: float,
+        args: Dict[str, Any],
+    ) -> None:
+        self._events.append(
+            {
+                "name": name,
+                "cat": category,
+                "ph": "X",
+                "pid": track[0],
+                "tid": track[1],
+                "ts": _us(begin),
+                "dur": _us(end - begin),
+                "args": args,
+            }
+        )
+
+    def _async(
+        self,
+        category: str,
+        name: str,
+        track: Tuple[int, int],
+        begin: Optional[float],
+        end: Optional[float],
+        args: Dict[str, Any],
+    ) -> None:
+        if begin is None or end is None:
+            return
+
+        event_id = next(self._ids)
+
+        for phase, ts in (("b", begin), ("e", end)):
+            self._events.append(
+                {
+                    "name": f"{category} {name}",
+                    "cat": category,
+                    "ph": phase,
+                    "id": event_id,
+                    "pid": track[0],
+                    "tid": track[1],
+                    "ts": _us(ts),
+                    "args": args,
+                }
+            )
+
+    def _name(self, track: Tuple[int, int], process: str, thread: str) -> None:
+        names = []
+
+        if track[0] not in self._named_processes:
+            self._named_processes.add(track[0])
+            names.append(("process_name", process))
+
+        if track not in self._named_threads:
+            self._named_threads.add(track)
+            names.append(("thread_name", thread))
+
+        for kind, name in names:
+            self._events.append(
+                {
+                    "name": kind,
+                    "ph": "M",
+                    "pid": track[0],
+                    "tid": track[1],
+                    "args": {"name": name},
+                }
+            )
+
+
+# Subclasses of the storages, keyed by the class of the storage and the class name of the output.
+# Shared by the recorders of all the jobs, which are set on the copies of the storage instead.
+_CLASSES: Dict[Tuple, type] = {}
+
+
+class IORecorder:
+    """Records the time spent by the storage to load and store the outputs within a task.
+
+    `Storage.path` of the outputs is timed, so the outputs keep their class, and the objects handed
+    in memory or loaded from the cache are not recorded.
+    """
+
+    def __init__(self):
+        self.spans: List[IOSpan] = []
+
+    def wrap(self, output: Output) -> Output:
+        """Output whose storage records the time, which must be applied before the other wraps."""
+        if output.storage is None:
+            return output
+
+        return output.assign_storage(
+            _extend(
+                output.storage,
+                _RecordedStorage,
+                _CLASSES,
+                "Recorded",
+                state={"_recorder": self},
+                _output_class=type(output).__name__,
+            )
+        )
+
+
+class _RecordedStorage:
+    _recorder: IORecorder
+    _output_class: str
+
+    @contextmanager
+    def path(self, path: str, mode: str = "r") -> Iterator[str]:
+        begin = time.time()
+        try:
+            with super().path(path, mode=mode) as local_path:  # type: ignore
+                yield local_path
+        finally:
+            self._recorder.spans.append(
+                (
+                    "load" if mode == "r" else "store",
+                    self._output_class,
+                    path,
+                    begin,
+                    time.time(),
+                )
+            )
+
+
+def _worker_trace(
+    started: float, finished: float, io: Optional[List[IOSpan]] = None
+) -> Dict[str, Any]:
+    """Timestamps of a task reported by the worker."""
+    return {
+        "started": started,
+        "finished": finished,
+        "pid": os.getpid(),
+        "tid": threading.get_ident(),
+        "io": io if io is not None else [],
+    }
+
+
+def _us(seconds: float) -> float:
+    return round(seconds * 1e6, 3)
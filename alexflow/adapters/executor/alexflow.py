@@ -1,24 +1,39 @@
-from dataclasses import dataclass
-from typing import Union, List, Dict, Optional
-from collections import OrderedDict
+from dataclasses import dataclass, field
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import Union, List, Dict, Optional, Callable, Iterable, Iterator, Set, Tuple
 
 import enum
+import heapq
+import inspect
+import itertools
+import math
 import os
+import resource
 import signal
 
 import multiprocess as mp
 from multiprocess.context import BaseContext
+from multiprocess.reduction import ForkingPickler
 
 import queue
 import traceback
 import time
 
 from ...core import Task, DynamicTask, Workflow, AbstractTask, Storage
-from ...helper import is_completed, run_task, generate_task, exists_output
-
-from ...helper import flatten
+from ...helper import generate_task, assign_storage_to_output, map_output, flatten
 
 from ._reference_manager import ReferenceManager
+from ._dependency_graph import DependencyGraph
+from ._completion_index import CompletionIndex
+from ._metrics import Metrics, serve_metrics
+from ._duration_history import DurationHistory, _task_class_key
+from ._dispatch_window import DispatchWindow
+from ._retry import RetryPolicy, RetryQueue, error_types
+from ._output_cache import OutputCache
+from ._locality import Locality
+from ._fusion import HandOff, fusable_chain
+from ._trace import Trace, IORecorder, _worker_trace
+from ._output_meter import OutputMeter
 
 from logging import getLogger
 
@@ -38,15 +53,94 @@ class Termination(Exception):
     pass
 
 
+class TaskTimeout(Exception):
+    """Reported as the error of the task which exceeded its timeout."""
+
+
+class TaskCancelled(BaseException):
+    """Raised in the task execution process to cancel the running task.
+
+    Derived from BaseException, so that `except Exception` in tasks does not catch it, while
+    `finally` clauses and context managers of the task are executed.
+    """
+
+
+# Interval of procgen to check the cancellation of the running task.
+_CANCEL_INTERVAL = 0.1
+
+# Seconds to wait for the cancelled task to exit, before it is killed.
+_CANCEL_GRACE = 5.0
+
+
+@dataclass
+class TaskFailure:
+    task: AbstractTask
+    error: str
+    trace: str
+
+
+@dataclass
+class FailureReport:
+    """Failures of a run in keep_going mode.
+
+    Attrs:
+        failures: Tasks which raised errors.
+        blocked: Tasks not executed since they depend on the failed task, keyed by its task_id.
+    """
+
+    failures: List[TaskFailure] = field(default_factory=list)
+    blocked: Dict[str, List[AbstractTask]] = field(default_factory=dict)
+
+    @property
+    def succeeded(self) -> bool:
+        return len(self.failures) == 0
+
+    def add(
+        self, task: AbstractTask, content: Dict[str, str], blocked: List[AbstractTask]
+    ) -> None:
+        logger.error(
+            "failed[task_id={}], blocked {} tasks".format(task.task_id, len(blocked))
+        )
+        self.failures.append(
+            TaskFailure(task=task, error=content["error"], trace=content["trace"])
+        )
+        self.blocked[task.task_id] = blocked
+
+
+# Interval to check the liveness of workers while the scheduler is waiting for the events.
+_EVENT_TIMEOUT = 1.0
+
+# Min interval to update the gauges of the tasks per tag, which iterates over the ready tasks.
+_GAUGE_INTERVAL = 1.0
+
+
 class QueueSet:
+    """Queues between the scheduler and workers.
+
+    Queues are created by either `Manager`, as proxies to the queues in a manager server process,
+    `BaseContext`, as direct pipes between the processes, or `queue` module, between threads.
+
+    Attrs:
+        q_in: Queue of RUN messages, consumed by workers.
+        q_out: Queue of STARTED, DONE, GENERATED, RAISE and RECYCLED messages, consumed by the
+            scheduler. Shared with the other QueueSet if given, for the workers with their own q_in.
+    """
+
     q_in: mp.Queue
     q_out: mp.Queue
-    q_err: mp.Queue
 
-    def __init__(self, manager: mp.Manager):
+    def __init__(
+        self, manager: Union[mp.Manager, BaseContext], q_out: Optional[mp.Queue] = None
+    ):
         self.q_in = manager.Queue()
-        self.q_out = manager.Queue()
-        self.q_err = manager.Queue()
+        self.q_out = q_out if q_out is not None else manager.Queue()
+
+    def close(self):
+        """Release the direct queues without waiting for the messages nobody consumes anymore."""
+        for q in (self.q_in, self.q_out):
+            if hasattr(q, "cancel_join_thread"):
+                q.cancel_join_thread()
+                q.close()
 
 
 class Kind(enum.Enum):
@@ -54,6 +148,8 @@ class Kind(enum.Enum):
     GENERATED = 2
     RUN = 3
     RAISE = 4
+    RECYCLED = 5
+    STARTED = 6
 
 
 @dataclass
@@ -63,221 +159,1209 @@ class Message:
     content: Dict
 
 
+@dataclass(frozen=True)
+class RecyclePolicy:
+    """Defines when a worker process is replaced with a new one, to avoid memory leaks.
+
+    The process is replaced once any of the limits is reached, checked before taking the next task.
+
+    Attrs:
+        max_tasks: Number of tasks a process runs.
+        max_rss_growth: Growth of resident set size in bytes, from the start of the process.
+        max_age: Seconds since the start of the process.
+    """
+
+    max_tasks: Optional[int] = 30
+    max_rss_growth: Optional[int] = None
+    max_age: Optional[float] = None
+
+    def reason(self, n_tasks: int, rss_growth: int, age: float) -> Optional[str]:
+        """Name of the limit reached, or None if the process can keep running."""
+        if self.max_tasks is not None and n_tasks >= self.max_tasks:
+            return "max_tasks"
+        if self.max_rss_growth is not None and rss_growth >= self.max_rss_growth:
+            return "max_rss_growth"
+        if self.max_age is not None and age >= self.max_age:
+            return "max_age"
+        return None
+
+
 class ResourceManager:
-    def __init__(self, resources: Dict[str, int]):
+    """Admits tasks to run by the usage of resources per tag and by the capacity of the machine.
+
+    Resources limit the sum of `AbstractTask.resource_usage` of running tasks per tag. Capacity is
+    given for "cpu", "memory" and "gpu" in the quantities of `ResourceSpec`, and a task is admitted
+    only when its requests fit into the capacity left by the running tasks. A task which uses more
+    than the whole limit or capacity is admitted when it runs alone, so that it is not blocked
+    forever.
+    """
+
+    def __init__(
+        self,
+        resources: Dict[str, int],
+        capacity: Optional[Dict[str, Union[str, int, float]]] = None,
+    ):
         self._resources: Dict[str, int] = resources
-        self._running: Dict[str, int] = {}
+        self._running: Dict[str, float] = {}
+        self._capacity: Dict[str, float] = _parse_capacity(capacity or {})
+        self._allocated: Dict[str, float] = {}
 
     def add(self, task: Task):
-        for tag in task.tags:
-            self._running[tag] = self._running.get(tag, 0) + 1
+        for tag, amount in task.resource_usage.items():
+            self._running[tag] = self._running.get(tag, 0) + amount
+
+        for key, value in _requests(task).items():
+            self._allocated[key] = self._allocated.get(key, 0.0) + value
 
     def remove(self, task: Task):
-        for tag in task.tags:
-            self._running[tag] = self._running.get(tag, 0) - 1
-            assert self._running[tag] >= 0
+        for tag, amount in task.resource_usage.items():
+            self._running[tag] = self._running.get(tag, 0) - amount
+            assert self._running[tag] >= -_EPSILON
+
+        for key, value in _requests(task).items():
+            self._allocated[key] = self._allocated.get(key, 0.0) - value
+            assert self._allocated[key] >= -_EPSILON
 
     def is_runnable(self, task: Task):
-        out = []
+        return self.blocked_by(task) is None
+
+    def blocked_by(self, task: Task) -> Optional[str]:
+        """Tag whose limit the task exceeds, or `CAPACITY` when it does not fit into the capacity.
 
-        for tag in task.tags:
+        Returns:
+            None if the task can run.
+        """
+        for tag, amount in task.resource_usage.items():
 
             if tag not in self._resources:
-                out.append(True)
                 continue
 
             max_concurrency = self._resources[tag]
 
-            next_concurrency = self._running.get(tag, 0) + 1
+            running = self._running.get(tag, 0)
 
-            out.append(next_concurrency <= max_concurrency)
+            if running <= _EPSILON and 0 < max_concurrency < amount:
+                continue
 
-        return all(out)
+            if running + amount > max_concurrency + _EPSILON:
+                return tag
 
+        if not self._fits(task):
+            return CAPACITY
 
-def _execute(  # noqa
-    workflow: Workflow,
-    workers: int,
-    resources: Dict[str, int],
-    context: Optional[BaseContext] = None,
-):
+        return None
 
-    if context is None:
-        context = mp.get_context()
+    def freed_by(self, task: Task) -> List[str]:
+        """Tags and `CAPACITY` whose usage is freed when the task finishes."""
+        freed = [tag for tag in task.resource_usage if tag in self._resources]
 
-    buffer = 10
+        if len(_requests(task)) > 0 and len(self._capacity) > 0:
+            freed.append(CAPACITY)
 
-    manager = context.Manager()
+        return freed
 
-    q_set = QueueSet(manager)
+    def _fits(self, task: Task) -> bool:
+        requests = _requests(task)
 
-    tasks = {task.task_id: task for task in workflow.to_task_list()}
+        for key, capacity in self._capacity.items():
+            request = requests.get(key, 0.0)
+            if request <= 0:
+                continue
 
-    resource_manager = ResourceManager(resources)
+            allocated = self._allocated.get(key, 0.0)
+            if allocated <= _EPSILON:
+                continue
 
-    ref_manager = ReferenceManager(tasks=tasks, storage=workflow.storage)
+            if allocated + request > capacity + _EPSILON:
+                return False
 
-    running: List[str] = []
+        return True
 
-    try:
 
-        # started workers
-        ws: List[Worker] = []
-        for _ in range(workers):
-            w = Worker(q_set, workflow.storage, context)
-            w.run()
-            ws.append(w)
+# Key of the tasks blocked by the capacity in `ResourceManager`, which is not a valid tag.
+CAPACITY = ""
 
-        try:
 
-            while len(tasks) > 0 or len(running) > 0:
+class BlockedTasks:
+    """Ready tasks held back by `ResourceManager`, queued per tag they wait for.
 
-                for worker in ws:
-                    if not worker.is_alive():
-                        raise Termination("Detected unexpectedly dead worker ")
+    A held task is put back to ready queue only when the tag or the capacity it waits for is freed
+    by a finished task, so that blocked tasks are not checked again on every dispatch. Tasks are
+    released in the order of `DependencyGraph.order`, which is kept while they are held.
+    """
 
-                try:
-                    while True:
-                        msg: Message = q_set.q_out.get_nowait()
+    def __init__(self, graph: DependencyGraph, resource_manager: ResourceManager):
+        self._graph = graph
+        self._resource_manager = resource_manager
 
-                        assert msg.kind in (Kind.DONE, Kind.GENERATED)
+        # key = tag or CAPACITY, value = heap of (*order, task_id) of the tasks waiting for it.
+        self._queues: Dict[str, List[Tuple]] = {}
+        self._tasks: Dict[str, AbstractTask] = {}
 
-                        if msg.kind == Kind.DONE:
-                            running.remove(msg.content["task"].task_id)
-                            resource_manager.remove(msg.content["task"])
-                            ref_manager.remove(msg.content["task"])
-                        elif msg.kind == Kind.GENERATED:
-                            running.remove(msg.content["task"].task_id)
-                            resource_manager.remove(msg.content["task"])
+    def __len__(self) -> int:
+        return len(self._tasks)
 
-                            new_tasks: Dict[str, Task] = msg.content["tasks"]
-                            for task_id, task in new_tasks.items():
-                                if task_id not in running:
-                                    tasks[task_id] = task
-                                    ref_manager.add(task)
+    def __iter__(self) -> Iterator[AbstractTask]:
+        return iter(list(self._tasks.values()))
 
-                            ref_manager.remove(msg.content["task"])
+    def admit(self, task: AbstractTask) -> bool:
+        """Returns True if the task can run, otherwise holds it until it may."""
+        key = self._resource_manager.blocked_by(task)
 
-                except queue.Empty:
-                    pass
+        if key is None:
+            return True
 
-                try:
-                    msg = q_set.q_err.get_nowait()
-                    logger.error("raise[task_id={}]".format(msg.content["task_id"]))
-                    print(msg.content["trace"])
-                    raise Termination(
-                        "Raised error on task_id={}".format(msg.content["task_id"])
-                        + "trace:\n"
-                        + msg.content["trace"]
-                    )
-                except queue.Empty:
-                    pass
+        self._hold(key, task)
+        return False
+
+    def release(self, task: AbstractTask) -> None:
+        """Put back the held tasks which can run, after the task is removed from `ResourceManager`."""
+        released: List[AbstractTask] = []
+
+        for key in self._resource_manager.freed_by(task):
+            held = self._queues.get(key, [])
 
-                if q_set.q_in.qsize() >= buffer:
-                    time.sleep(0.2)
+            while len(held) > 0:
+                task_id = held[0][-1]
+                head = self._tasks[task_id]
+
+                if task_id not in self._graph:
+                    heapq.heappop(held)
+                    self._tasks.pop(task_id)
                     continue
 
-                next_tasks = OrderedDict()
+                blocked_by = self._resource_manager.blocked_by(head)
+
+                if blocked_by == key:
+                    break
+
+                heapq.heappop(held)
+                self._tasks.pop(task_id)
+
+                if blocked_by is None:
+                    # Counted as running until all the released tasks are decided, not to release
+                    # more tasks than the freed resources.
+                    self._resource_manager.add(head)
+                    released.append(head)
+                else:
+                    self._hold(blocked_by, head)
+
+        for head in released:
+            self._resource_manager.remove(head)
+            self._graph.push_ready(head)
+
+    def _hold(self, key: str, task: AbstractTask) -> None:
+        self._tasks[task.task_id] = task
+        heapq.heappush(
+            self._queues.setdefault(key, []), self._graph.order(task) + (task.task_id,),
+        )
+
+
+_EPSILON = 1e-9
 
-                for task in tasks.values():
-                    if task.task_id in running:
-                        continue
+_CPU_SUFFIXES: Dict[str, float] = {"m": 1e-3}
 
-                    if is_completed(task, workflow.storage):
-                        continue
+_MEMORY_SUFFIXES: Dict[str, float] = {
+    "Ki": 2 ** 10,
+    "Mi": 2 ** 20,
+    "Gi": 2 ** 30,
+    "Ti": 2 ** 40,
+    "Pi": 2 ** 50,
+    "Ei": 2 ** 60,
+    "k": 10 ** 3,
+    "K": 10 ** 3,
+    "M": 10 ** 6,
+    "G": 10 ** 9,
+    "T": 10 ** 12,
+    "P": 10 ** 15,
+    "E": 10 ** 18,
+}
 
-                    if q_set.q_in.qsize() >= buffer:
-                        next_tasks[task.task_id] = task
-                        continue
 
-                    inputs = flatten(task.input())
+def _parse_quantity(value: Union[str, int, float], suffixes: Dict[str, float]) -> float:
+    """Parses a quantity in the notation of Kubernetes, e.g. "500m" cpu or "4Gi" memory."""
+    if isinstance(value, (int, float)):
+        return float(value)
 
-                    dependent_tasks_to_execute = OrderedDict()
+    value = value.strip()
 
-                    for inp in inputs:
+    # Longer suffixes first, so that "Mi" is not taken as "M".
+    for suffix in sorted(suffixes, key=len, reverse=True):
+        if value.endswith(suffix):
+            return float(value[: -len(suffix)]) * suffixes[suffix]
 
-                        if exists_output(inp, workflow.storage):
-                            continue
+    return float(value)
 
-                        dependent_tasks_to_execute[inp.src_task.task_id] = inp.src_task
 
-                    # Case if there is any in-complete task
-                    if len(dependent_tasks_to_execute) > 0:
-                        for key, value in dependent_tasks_to_execute.items():
-                            next_tasks[key] = value
-                        next_tasks[task.task_id] = task
-                        continue
+def _parse_capacity(capacity: Dict[str, Union[str, int, float]]) -> Dict[str, float]:
+    out = {}
 
-                    if not resource_manager.is_runnable(task):
-                        continue
+    for key, value in capacity.items():
+        if key == "cpu":
+            out[key] = _parse_quantity(value, _CPU_SUFFIXES)
+        elif key == "memory":
+            out[key] = _parse_quantity(value, _MEMORY_SUFFIXES)
+        elif key == "gpu":
+            out[key] = float(value)
+        else:
+            raise ValueError(f"unknown capacity: {key}")
 
-                    q_set.q_in.put(Message(kind=Kind.RUN, content={"task": task}))
+    return out
+
+
+def _requests(task: AbstractTask) -> Dict[str, float]:
+    """Requests of the task by its `ResourceSpec`, tasks without the spec request nothing."""
+    spec = getattr(task, "resource_spec", None)
+
+    if spec is None:
+        return {}
+
+    requests = {}
+
+    if spec.cpu_requests is not None:
+        requests["cpu"] = _parse_quantity(spec.cpu_requests, _CPU_SUFFIXES)
+    if spec.memory_requests is not None:
+        requests["memory"] = _parse_quantity(spec.memory_requests, _MEMORY_SUFFIXES)
+    if spec.gpu is not None:
+        requests["gpu"] = float(spec.gpu)
+
+    return requests
+
+
+class _Scheduler:
+    """Dispatches ready tasks of `_execute` to workers, and handles the messages from them."""
+
+    def __init__(
+        self,
+        *,
+        workflow: Workflow,
+        graph: DependencyGraph,
+        q_set: QueueSet,
+        registry: Dict[str, AbstractTask],
+        resource_manager: ResourceManager,
+        completion_index: CompletionIndex,
+        ref_manager: ReferenceManager,
+        duration_history: DurationHistory,
+        retries: RetryQueue,
+        metrics: Metrics,
+        observed: bool,
+        window: DispatchWindow,
+        workers: int,
+        backend: str,
+        thread_tags: Set[str],
+        pool: Optional[ThreadPoolExecutor],
+        futures: List[Future],
+        workers_by_pid: Dict[int, "Worker"],
+        locality: Optional[Locality],
+        keep_going: bool,
+        default_timeout: Optional[float],
+        fuse_ephemeral: bool,
+        trace: Optional[Trace],
+    ):
+        self.workflow = workflow
+        self.graph = graph
+        self.q_set = q_set
+        self.registry = registry
+        self.resource_manager = resource_manager
+        self.completion_index = completion_index
+        self.ref_manager = ref_manager
+        self.duration_history = duration_history
+        self.retries = retries
+        self.metrics = metrics
+        self.observed = observed
+        self.window = window
+        self.workers = workers
+        self.backend = backend
+        self.thread_tags = thread_tags
+        self.pool = pool
+        self.futures = futures
+        self.workers_by_pid = workers_by_pid
+        self.locality = locality
+        self.keep_going = keep_going
+        self.default_timeout = default_timeout
+        self.fuse_ephemeral = fuse_ephemeral
+        self.trace = trace
+
+        self.blocked = BlockedTasks(graph, resource_manager)
+        self.report = FailureReport()
+
+        # key = task_id, value = sequence number of the dispatch, to ignore the messages of the
+        # attempts which are already timed out.
+        self.running: Dict[str, int] = {}
+        self.sequence = itertools.count()
+        self.dispatched_at: Dict[str, float] = {}
+
+        # key = task_id, value = time the worker started the task and the worker, None for threads.
+        self.started: Dict[str, Tuple[float, Optional[Worker]]] = {}
+
+        # key = task_id, value = time the dispatched task became ready, recorded only with trace.
+        self.ready_at: Dict[str, Optional[float]] = {}
+
+        # Tags of the tasks counted by the gauges, to reset the counts of the tags gone.
+        self.tags: Set[str] = set()
+        self.gauges_at = 0.0
+
+        # key = task_id, value = task_ids of the fused chain the task belongs to, from the head.
+        self.fused: Dict[str, List[str]] = {}
+        self.targets = {task.task_id for task in workflow.to_task_list()}
+
+    def run(self, ws: List["Worker"]) -> None:
+        """Run until all the tasks are completed, or failed with keep_going."""
+        while len(self.graph) > 0:
+
+            for worker in ws:
+                if not worker.is_alive():
+                    raise Termination("Detected unexpectedly dead worker ")
+
+            self.dispatch()
+
+            if len(self.running) == 0 and len(self.retries) == 0:
+                raise Termination(
+                    f"{len(self.graph)} tasks could not be resolved by the dependency"
+                )
+
+            for msg in self.receive():
+                self.handle(msg)
+
+        if self.observed:
+            self.set_gauges([], [])
+
+    def dispatch(self) -> None:
+        """Hand the ready tasks to workers, as many as the dispatch window allows."""
+        graph = self.graph
+
+        for task_id in self.retries.pop_due(time.time()):
+            graph.push_ready(graph.get(task_id))
+
+        # Counted on the scheduler side, rather than asking the queue its size.
+        while len(self.running) < self.window.size:
+            task = graph.pop_ready()
+
+            if task is None:
+                break
 
-                    running.append(task.task_id)
+            if not self.blocked.admit(task):
+                continue
+
+            self._send(task, next(self.sequence))
+        else:
+            if graph.has_ready():
+                # Ready tasks are held back by the window.
+                self.metrics.inc("dispatch_window_full")
+
+        self.metrics.set("dispatch_window", self.window.size)
+        self.metrics.set("in_flight", len(self.running))
+        self.metrics.set("idle_workers", max(self.workers - len(self.running), 0))
+
+        if self.observed and time.time() - self.gauges_at >= _GAUGE_INTERVAL:
+            self.set_gauges(
+                [graph.get(t) for t in self.running if t not in self.started],
+                [graph.get(t) for t in self.started],
+            )
+            self.gauges_at = time.time()
+
+    def set_gauges(
+        self, queued: List[AbstractTask], running: List[AbstractTask]
+    ) -> None:
+        _set_task_gauges(
+            self.metrics,
+            itertools.chain(self.graph.iter_ready(), self.blocked),
+            queued,
+            running,
+            self.tags,
+        )
 
-                    resource_manager.add(task)
+    def receive(self) -> List[Message]:
+        """Messages from workers, with the ones of the tasks cancelled by timeout."""
+        timeout = _EVENT_TIMEOUT
+        if len(self.retries) > 0:
+            timeout = min(timeout, self.retries.wait_time(time.time()))
 
-                tasks = next_tasks
+        messages: List[Message] = _cancel_expired(
+            self.graph, self.running, self.started, self.default_timeout, self.metrics
+        )
+
+        try:
+            # Block until any of workers responds, to dispatch the tasks which become ready by the
+            # completion without delay.
+            if len(messages) == 0:
+                messages.append(self.q_set.q_out.get(timeout=timeout))
+        except queue.Empty:
+            return messages
+
+        while True:
+            try:
+                messages.append(self.q_set.q_out.get_nowait())
+            except queue.Empty:
+                break
 
-                time.sleep(0.2)
+        return messages
 
+    def handle(self, msg: Message) -> None:
+        if msg.kind == Kind.RECYCLED:
+            logger.debug(f"recycled worker, reason = {msg.content['reason']}")
+            self.metrics.inc("worker_recycles", reason=msg.content["reason"])
+            return
+
+        task_id = msg.content["task_id"]
+
+        if self.running.get(task_id) != msg.content["seq"]:
+            # The attempt is already timed out.
+            return
+
+        if msg.kind == Kind.STARTED:
+            self.metrics.observe(
+                "queue_latency_seconds",
+                max(msg.content["time"] - self.dispatched_at[task_id], 0.0),
+            )
+            self.started[task_id] = (
+                msg.content["time"],
+                self.workers_by_pid.get(msg.content["worker"]),
+            )
+            return
+
+        task = self.graph.get(task_id)
+
+        self.running.pop(task_id)
+        self.started.pop(task_id, None)
+        chain_ids = self.fused.pop(task_id, None)
+        _record_attempt(self.metrics, task, msg)
+
+        if self.trace is not None:
+            self.trace.add(
+                task,
+                _OUTCOMES[msg.kind],
+                time.time(),
+                ready=self.ready_at.pop(task_id, None),
+                dispatched=self.dispatched_at.get(task_id),
+                worker=msg.content.get("trace"),
+            )
+
+        if chain_ids is None or chain_ids[0] == task_id:
+            # Fused tasks run on the resources of the head of the chain.
+            self.resource_manager.remove(task)
+            self.blocked.release(task)
+
+        if chain_ids is not None and msg.kind == Kind.RAISE:
+            self._unclaim_chain(task_id, chain_ids)
+
+        if self.locality is not None:
+            self.locality.release(
+                task_id, msg.content.get("worker") if msg.kind == Kind.DONE else None
+            )
+
+        if "cache_hits" in msg.content:
+            self.metrics.inc("output_cache_hits", msg.content["cache_hits"])
+            self.metrics.inc("output_cache_misses", msg.content["cache_misses"])
+
+        if msg.kind == Kind.RAISE:
+            self._fail(task, msg)
+        else:
+            self._finish(task, msg)
+
+    def _send(self, task: AbstractTask, seq: int) -> None:
+        ready = _observe_dispatch(self.metrics, self.graph, task)
+
+        if self.trace is not None:
+            self.ready_at[task.task_id] = ready
+
+        if self.pool is not None and (
+            self.backend == "thread" or self.thread_tags & task.tags
+        ):
+            self._submit(task, seq)
+        else:
+            self._put(task, seq)
+
+        self.running[task.task_id] = seq
+        self.dispatched_at[task.task_id] = time.time()
+
+        self.resource_manager.add(task)
+
+    def _submit(self, task: AbstractTask, seq: int) -> None:
+        """Run the task on a thread of the pool."""
+        assert self.pool is not None
+
+        if task.execution_timeout is not None:
+            logger.warning(
+                f"execution_timeout of task_id={task.task_id} is not applied on threads"
+            )
+
+        self.futures.append(
+            self.pool.submit(
+                _thread_job,
+                self.q_set.q_out,
+                self.workflow.storage,
+                task,
+                seq,
+                self.trace is not None,
+                self.observed,
+            )
+        )
+
+    def _put(self, task: AbstractTask, seq: int) -> None:
+        """Send RUN message of the task to the worker processes."""
+        content = {"task_id": task.task_id, "seq": seq}
+
+        if self.trace is not None:
+            content["traced"] = True
+
+        if self.observed:
+            content["observed"] = True
+
+        if task.task_id not in self.registry:
+            content["task"] = task
+
+        if task.execution_timeout is not None or self.default_timeout is not None:
+            # Only the tasks with timeout report the start to be timed.
+            content["timed"] = True
+
+        if self.fuse_ephemeral:
+            chain = fusable_chain(task, self.graph, self.targets, self._is_fusable)
+
+            if len(chain) > 0:
+                content["chain"] = [
+                    _run_content(member, self.registry) for member in chain
+                ]
+                _claim_chain(
+                    task,
+                    chain,
+                    self.graph,
+                    self.fused,
+                    self.running,
+                    self.dispatched_at,
+                    seq,
+                )
+                self.metrics.inc("fused_tasks", len(chain))
+
+        msg = Message(kind=Kind.RUN, content=content)
+
+        if self.locality is None:
+            self.q_set.q_in.put(msg)
+        else:
+            pid = _route(task, self.locality, self.window, self.metrics)
+            self.workers_by_pid[pid].q_set.q_in.put(msg)
+
+    def _unclaim_chain(self, task_id: str, chain_ids: List[str]) -> None:
+        """The tasks following the failed one are not executed, and wait for it again."""
+        for following_id in chain_ids[chain_ids.index(task_id) + 1 :]:
+            self.fused.pop(following_id)
+            self.running.pop(following_id)
+            self.dispatched_at.pop(following_id)
+            self.graph.unclaim(following_id)
+
+        self.graph.unclaim(task_id)
+
+    def _is_fusable(self, task: AbstractTask) -> bool:
+        return (
+            task.execution_timeout is None
+            and self.default_timeout is None
+            and not (self.thread_tags & task.tags)
+        )
+
+    def _fail(self, task: AbstractTask, msg: Message) -> None:
+        self.dispatched_at.pop(task.task_id)
+
+        delay = self.retries.schedule(task, msg.content["error_types"], time.time())
+
+        if delay is not None:
+            _log_retry(task, msg, delay, self.metrics)
+            return
+
+        if self.keep_going:
+            self.report.add(task, msg.content, self.graph.fail(task.task_id))
+            self.metrics.inc("task_failures")
+            return
+
+        logger.error("raise[task_id={}]".format(msg.content["task_id"]))
+        print(msg.content["trace"])
+        raise Termination(
+            "Raised error on task_id={}".format(msg.content["task_id"])
+            + "trace:\n"
+            + msg.content["trace"]
+        )
+
+    def _finish(self, task: AbstractTask, msg: Message) -> None:
+        assert msg.kind in (Kind.DONE, Kind.GENERATED)
+
+        self.duration_history.record(task, msg.content["duration"])
+        self.window.record(
+            msg.content["duration"], time.time() - self.dispatched_at.pop(task.task_id)
+        )
+
+        if msg.kind == Kind.DONE:
+            if not msg.content.get("handed_off", False):
+                # Outputs handed off to the next task are not in the storage.
+                self.completion_index.add(task)
+            self.graph.complete(task.task_id)
+        elif msg.kind == Kind.GENERATED:
+            new_tasks: Dict[str, Task] = msg.content["tasks"]
+            for new_task in self.graph.expand(task.task_id, new_tasks.values()):
+                self.ref_manager.add(new_task)
+
+        self.ref_manager.remove(task)
+
+
+def _queue_set(
+    backend: str, transport: str, context: BaseContext
+) -> Tuple[QueueSet, Optional[mp.Manager]]:
+    """Queues to talk to workers, and the manager serving them which has to be shut down."""
+    if backend not in ("process", "thread"):
+        raise ValueError(f"unknown backend: {backend}")
+    if backend == "thread":
+        # Only the threads of this process report to the scheduler.
+        return QueueSet(queue), None
+    if transport == "manager":
+        manager = context.Manager()
+        return QueueSet(manager), manager
+    if transport == "queue":
+        return QueueSet(context), None
+    raise ValueError(f"unknown transport: {transport}")
+
+
+def _start_workers(
+    n: int,
+    q_set: QueueSet,
+    queue_factory,
+    storage: Storage,
+    context: BaseContext,
+    registry: Dict[str, AbstractTask],
+    recycle_policy: RecyclePolicy,
+    output_cache_bytes: Optional[int],
+) -> List["Worker"]:
+    ws: List[Worker] = []
+
+    if n == 0:
+        return ws
+
+    # Packed once for all the workers, unless they inherit it by fork.
+    shared = _share_registry(registry, context)
+
+    for _ in range(n):
+        w = Worker(
+            # Workers caching outputs are given tasks through their own queues to be routed.
+            q_set
+            if output_cache_bytes is None
+            else QueueSet(queue_factory, q_out=q_set.q_out),
+            storage,
+            context,
+            shared,
+            recycle_policy,
+            output_cache_bytes=output_cache_bytes,
+        )
+        w.run()
+        ws.append(w)
+
+    return ws
+
+
+def _execute(
+    workflow: Workflow,
+    workers: int,
+    resources: Dict[str, int],
+    context: Optional[BaseContext] = None,
+    transport: str = "manager",
+    recycle_policy: Optional[RecyclePolicy] = None,
+    metrics: Optional[Metrics] = None,
+    ordering: str = "critical_path",
+    duration_history: Optional[DurationHistory] = None,
+    capacity: Optional[Dict[str, Union[str, int, float]]] = None,
+    backend: str = "process",
+    thread_tags: Optional[Set[str]] = None,
+    keep_going: bool = False,
+    retry_policy: Optional[RetryPolicy] = None,
+    retry_policies: Optional[Dict[Union[type, str], RetryPolicy]] = None,
+    default_timeout: Optional[float] = None,
+    output_cache_bytes: Optional[int] = None,
+    fuse_ephemeral: bool = False,
+    trace: Optional[Trace] = None,
+) -> FailureReport:
+
+    if thread_tags is None:
+        thread_tags = set()
+
+    if context is None:
+        context = mp.get_context()
+
+    if duration_history is None:
+        duration_history = DurationHistory()
+
+    if recycle_policy is None:
+        recycle_policy = RecyclePolicy()
+
+    # Workers report the start and the bytes of the outputs of tasks only when metrics are read.
+    observed = metrics is not None
+
+    if metrics is None:
+        metrics = Metrics()
+
+    q_set, manager = _queue_set(backend, transport, context)
+
+    tasks = {task.task_id: task for task in workflow.to_task_list()}
+
+    completion_index = CompletionIndex(workflow.storage, metrics=metrics)
+
+    ref_manager = ReferenceManager(
+        tasks=tasks,
+        storage=workflow.storage,
+        completion_index=completion_index,
+        metrics=metrics,
+    )
+
+    graph = DependencyGraph(
+        tasks=tasks,
+        storage=workflow.storage,
+        completion_index=completion_index,
+        cost=_cost_function(ordering, duration_history),
+    )
+
+    pool: Optional[ThreadPoolExecutor] = None
+    futures: List[Future] = []
+
+    if backend == "thread" or thread_tags:
+        pool = ThreadPoolExecutor(max_workers=workers)
+
+    try:
+
+        # Tasks known at the start are handed to workers once when they start, so that RUN messages
+        # carry only the task_id. Tasks generated by DynamicTask are sent within the message.
+        registry = graph.tasks()
+
+        ws = _start_workers(
+            workers if backend == "process" else 0,
+            q_set,
+            manager or context,
+            workflow.storage,
+            context,
+            registry,
+            recycle_policy,
+            output_cache_bytes,
+        )
+
+        workers_by_pid = {w.process.pid: w for w in ws if w.process is not None}
+
+        locality: Optional[Locality] = None
+
+        if output_cache_bytes is not None and len(workers_by_pid) > 0:
+            locality = Locality(list(workers_by_pid.keys()))
+
+        scheduler = _Scheduler(
+            workflow=workflow,
+            graph=graph,
+            q_set=q_set,
+            registry=registry,
+            resource_manager=ResourceManager(resources, capacity=capacity),
+            completion_index=completion_index,
+            ref_manager=ref_manager,
+            duration_history=duration_history,
+            retries=RetryQueue(retry_policy, retry_policies),
+            metrics=metrics,
+            observed=observed,
+            window=DispatchWindow(workers),
+            workers=workers,
+            backend=backend,
+            thread_tags=thread_tags,
+            pool=pool,
+            futures=futures,
+            workers_by_pid=workers_by_pid,
+            locality=locality,
+            keep_going=keep_going,
+            default_timeout=default_timeout,
+            fuse_ephemeral=fuse_ephemeral,
+            trace=trace,
+        )
+
+        try:
+            scheduler.run(ws)
         finally:
+            if pool is not None:
+                # Threads can not be killed, so only the tasks not yet started are cancelled.
+                for future in futures:
+                    future.cancel()
+                pool.shutdown(wait=True)
+
             time.sleep(1)
             shutdown_all(ws)
     finally:
-        manager.shutdown()
+        if manager is not None:
+            manager.shutdown()
+        else:
+            q_set.close()
 
+        _log_completion_index(completion_index)
 
-def _sequential_execute(workflow: Workflow, workers: int):  # noqa
-    tasks = {task.task_id: task for task in workflow.tasks.values()}
+    return scheduler.report
 
-    ref_manager = ReferenceManager(tasks=tasks, storage=workflow.storage)
 
-    while len(tasks) > 0:
+def _sequential_execute(  # noqa
+    workflow: Workflow,
+    workers: int,
+    ordering: str = "critical_path",
+    duration_history: Optional[DurationHistory] = None,
+    keep_going: bool = False,
+    metrics: Optional[Metrics] = None,
+    retry_policy: Optional[RetryPolicy] = None,
+    retry_policies: Optional[Dict[Union[type, str], RetryPolicy]] = None,
+    trace: Optional[Trace] = None,
+) -> FailureReport:
+    if duration_history is None:
+        duration_history = DurationHistory()
 
-        next_tasks = {}
+    observed = metrics is not None
 
-        for task in tasks.values():
-            if is_completed(task, workflow.storage):
-                continue
+    if metrics is None:
+        metrics = Metrics()
 
-            inputs = flatten(task.input())
+    report = FailureReport()
 
-            dependent_tasks_to_execute = OrderedDict()
+    retries = RetryQueue(retry_policy, retry_policies)
 
-            for inp in inputs:
+    tasks = {task.task_id: task for task in workflow.tasks.values()}
 
-                if exists_output(inp, workflow.storage):
-                    continue
+    completion_index = CompletionIndex(workflow.storage, metrics=metrics)
+
+    ref_manager = ReferenceManager(
+        tasks=tasks,
+        storage=workflow.storage,
+        completion_index=completion_index,
+        metrics=metrics,
+    )
+
+    graph = DependencyGraph(
+        tasks=tasks,
+        storage=workflow.storage,
+        completion_index=completion_index,
+        cost=_cost_function(ordering, duration_history),
+    )
+
+    tags: Set[str] = set()
+    gauges_at = 0.0
+
+    while len(graph) > 0:
+
+        for task_id in retries.pop_due(time.time()):
+            graph.push_ready(graph.get(task_id))
 
-                dependent_tasks_to_execute[inp.src_task.task_id] = inp.src_task
+        task = graph.pop_ready()
 
-            # Case if there is any in-complete task
-            if len(dependent_tasks_to_execute) > 0:
-                for key, value in dependent_tasks_to_execute.items():
-                    next_tasks[key] = value
-                next_tasks[task.task_id] = task
+        if task is None:
+            if len(retries) > 0:
+                time.sleep(retries.wait_time(time.time()))
                 continue
 
+            raise Termination(
+                f"{len(graph)} tasks could not be resolved by the dependency"
+            )
+
+        if task.execution_timeout is not None:
+            logger.warning(
+                f"execution_timeout of task_id={task.task_id} is not applied when n_jobs is 1"
+            )
+
+        started_at = time.time()
+        ready = _observe_dispatch(metrics, graph, task)
+
+        if observed and started_at - gauges_at >= _GAUGE_INTERVAL:
+            _set_task_gauges(metrics, graph.iter_ready(), [], [task], tags)
+            gauges_at = started_at
+
+        try:
             msg: Message = _process_a_job(
-                Message(kind=Kind.RUN, content={"task": task}), workflow.storage
+                task, workflow.storage, traced=trace is not None, metered=observed
             )
+        except Exception as e:
+            msg = _raise_message(task, e, time.time() - started_at)
+
+            _record_attempt(metrics, task, msg)
+
+            if trace is not None:
+                worker = _worker_trace(started_at, time.time())
+                trace.add(task, "failed", time.time(), ready, started_at, worker)
 
-            if msg.kind == Kind.DONE:
-                ref_manager.remove(msg.content["task"])
+            delay = retries.schedule(task, msg.content["error_types"], time.time())
+
+            if delay is not None:
+                _log_retry(task, msg, delay, metrics)
                 continue
 
-            if msg.kind == Kind.GENERATED:
-                new_tasks: Dict[str, Task] = msg.content["tasks"]
+            if not keep_going:
+                raise
 
-                for task_id, new_task in new_tasks.items():
-                    if task_id not in tasks:
-                        next_tasks[task_id] = new_task
-                        ref_manager.add(new_task)
+            report.add(task, msg.content, graph.fail(task.task_id))
+            metrics.inc("task_failures")
+            continue
 
-                ref_manager.remove(msg.content["task"])
+        _record_attempt(metrics, task, msg)
 
-        tasks = next_tasks
+        if trace is not None:
+            trace.add(
+                task,
+                _OUTCOMES[msg.kind],
+                time.time(),
+                ready,
+                started_at,
+                msg.content["trace"],
+            )
+
+        duration_history.record(task, msg.content["duration"])
+
+        if msg.kind == Kind.DONE:
+            completion_index.add(task)
+            graph.complete(task.task_id)
+
+        if msg.kind == Kind.GENERATED:
+            new_tasks: Dict[str, Task] = msg.content["tasks"]
+
+            for new_task in graph.expand(task.task_id, new_tasks.values()):
+                ref_manager.add(new_task)
+
+        ref_manager.remove(task)
+
+    if observed:
+        _set_task_gauges(metrics, graph.iter_ready(), [], [], tags)
+
+    _log_completion_index(completion_index)
+
+    return report
+
+
+def _cancel_expired(
+    graph: DependencyGraph,
+    running: Dict[str, int],
+    started: Dict[str, Tuple[float, Optional["Worker"]]],
+    default_timeout: Optional[float],
+    metrics: Metrics,
+) -> List[Message]:
+    """Cancel the tasks running longer than their timeout.
+
+    Returns:
+        RAISE messages of the cancelled tasks, which are handled as the errors of the tasks.
+    """
+    out = []
+
+    now = time.time()
+
+    for task_id, (started_at, worker) in list(started.items()):
+        if worker is None:
+            # Threads can not be terminated, and the task would hold its resources and be retried
+            # while the thread keeps running.
+            continue
+
+        task = graph.get(task_id)
+
+        timeout = (
+            task.execution_timeout
+            if task.execution_timeout is not None
+            else default_timeout
+        )
+
+        if timeout is None or now - started_at < timeout:
+            continue
+
+        logger.warning(f"timeout[task_id={task_id}] after {timeout} seconds")
+        metrics.inc("task_timeouts", task=_task_class_key(task))
+
+        worker.cancel(running[task_id])
+
+        started.pop(task_id)
+
+        try:
+            raise TaskTimeout(f"{task_id} did not complete in {timeout} seconds")
+        except TaskTimeout as e:
+            msg = _raise_message(task, e, now - started_at)
+
+        msg.content["seq"] = running[task_id]
+        out.append(msg)
+
+    return out
+
+
+def _run_content(task: AbstractTask, registry: Dict[str, AbstractTask]) -> Dict:
+    """Content of RUN message, with the task only if the workers do not know it."""
+    content: Dict = {"task_id": task.task_id}
+
+    if task.task_id not in registry:
+        content["task"] = task
+
+    return content
+
+
+Registry = Union[Dict[str, AbstractTask], bytes]
+
+
+def _share_registry(registry: Registry, context: BaseContext) -> Registry:
+    """Registry to give to the workers, packed only when their processes do not inherit it by fork.
+
+    The result is given to all the workers of the run, so that the registry is packed once.
+    """
+    if context.get_start_method() == "fork":
+        return _unpack_registry(registry) if isinstance(registry, bytes) else registry
+
+    return registry if isinstance(registry, bytes) else _pack_registry(registry)
+
+
+def _pack_registry(registry: Dict[str, AbstractTask]) -> bytes:
+    """Pickle the registry once, to be reused by every process started by procgen.
+
+    Tasks are pickled from the most upstream ones, so that each task refers to the ones already
+    pickled, and a deep chain of tasks does not exceed the recursion limit of pickle.
+    """
+    return bytes(ForkingPickler.dumps((_upstream_first(registry.values()), registry)))
+
+
+def _unpack_registry(data: bytes) -> Dict[str, AbstractTask]:
+    _, registry = ForkingPickler.loads(data)
+    return registry
+
+
+def _upstream_first(tasks: Iterable[AbstractTask]) -> List[AbstractTask]:
+    """Tasks and their upstream tasks, ordered from the most upstream ones."""
+    ordered: List[AbstractTask] = []
+    visited: Set[str] = set()
+
+    # (task, whether its upstream tasks are ordered)
+    stack: List[Tuple[AbstractTask, bool]] = [(task, False) for task in tasks]
+
+    while len(stack) > 0:
+        task, expanded = stack.pop()
+
+        if expanded:
+            ordered.append(task)
+            continue
+
+        if task.task_id in visited:
+            continue
+        visited.add(task.task_id)
+
+        stack.append((task, True))
+        stack.extend((inp.src_task, False) for inp in flatten(task.input()))
+
+    return ordered
+
+
+def _claim_chain(
+    head: AbstractTask,
+    chain: List[AbstractTask],
+    graph: DependencyGraph,
+    fused: Dict[str, List[str]],
+    running: Dict[str, int],
+    dispatched_at: Dict[str, float],
+    seq: int,
+) -> None:
+    """Mark the tasks following the head running, as they are dispatched along with the head."""
+    chain_ids = [head.task_id] + [task.task_id for task in chain]
+
+    for task_id in chain_ids:
+        fused[task_id] = chain_ids
+
+    for task in chain:
+        graph.claim(task.task_id)
+        running[task.task_id] = seq
+        dispatched_at[task.task_id] = time.time()
+
+
+def _route(
+    task: AbstractTask, locality: Locality, window: DispatchWindow, metrics: Metrics
+) -> int:
+    """Worker to dispatch the task to, preferring the worker holding its inputs in the cache.
+
+    The number of tasks queued to a worker is limited to its share of the dispatch window, so that
+    the tasks are not queued behind a long task while the other workers are idle.
+    """
+    limit = math.ceil(window.size / len(locality.workers))
+
+    pid = locality.choose(task, limit)
+
+    if pid is not None:
+        metrics.inc("locality_hits")
+    else:
+        if len(locality.preferred(task)) > 0:
+            metrics.inc("locality_misses")
+        pid = locality.least_loaded()
+
+    locality.assign(task.task_id, pid)
+
+    return pid
+
+
+_OUTCOMES = {Kind.DONE: "done", Kind.GENERATED: "generated", Kind.RAISE: "failed"}
+
+
+def _record_attempt(metrics: Metrics, task: AbstractTask, msg: Message) -> None:
+    key = _task_class_key(task)
+
+    metrics.inc("task_attempts", task=key, outcome=_OUTCOMES[msg.kind])
+    metrics.observe("task_duration_seconds", msg.content["duration"], task=key)
+
+    for (operation, output_class), size in msg.content.get("output_bytes", {}).items():
+        metrics.inc("output_bytes", size, output=output_class, operation=operation)
+
+
+def _observe_dispatch(
+    metrics: Metrics, graph: DependencyGraph, task: AbstractTask
+) -> Optional[float]:
+    """Observe the time the task waited in ready queue, and returns the time it became ready."""
+    ready = graph.take_ready_time(task.task_id)
+
+    if ready is not None:
+        metrics.observe("dispatch_latency_seconds", max(time.time() - ready, 0.0))
+
+    return ready
+
+
+def _set_task_gauges(
+    metrics: Metrics,
+    ready: Iterable[AbstractTask],
+    queued: List[AbstractTask],
+    running: List[AbstractTask],
+    tags: Set[str],
+) -> None:
+    """Set the number of the tasks ready, queued to workers and running, per tag.
+
+    Tasks without tags are counted as "untagged", and the tags counted before are reset to 0.
+    """
+    counts: Dict[Tuple[str, str], int] = {}
+
+    for state, state_tasks in (
+        ("ready", ready),
+        ("queued", queued),
+        ("running", running),
+    ):
+        for task in state_tasks:
+            for tag in task.tags or {"untagged"}:
+                counts[(state, tag)] = counts.get((state, tag), 0) + 1
+                tags.add(tag)
+
+    for state in ("ready", "queued", "running"):
+        for tag in tags:
+            metrics.set(f"tasks_{state}", counts.get((state, tag), 0), tag=tag)
+
+
+def _log_retry(
+    task: AbstractTask, msg: Message, delay: float, metrics: Metrics
+) -> None:
+    logger.warning(
+        "retry[task_id={}] in {:.1f} seconds, error = {}".format(
+            task.task_id, delay, msg.content["error"]
+        )
+    )
+    metrics.inc("task_retries", task=_task_class_key(task))
+
+
+def _cost_function(
+    ordering: str, duration_history: DurationHistory
+) -> Optional[Callable[[AbstractTask], float]]:
+    """Cost of tasks to find the critical path by the ordering."""
+    if ordering == "critical_path":
+        return duration_history.estimate
+    if ordering == "fifo":
+        return None
+    raise ValueError(f"unknown ordering: {ordering}")
+
+
+def _log_completion_index(completion_index: CompletionIndex):
+    logger.debug(
+        f"completion index: hits = {completion_index.hits}, misses = {completion_index.misses}"
+    )
 
 
 def shutdown_all(workers):
@@ -288,9 +1372,24 @@ def shutdown_all(workers):
         w.process.join()
 
 
-def _process_a_job(msg: Message, storage: Storage) -> Message:
-    if isinstance(msg.content["task"], DynamicTask):
-        tasks = generate_task(msg.content["task"], storage)
+def _process_a_job(  # noqa
+    task: AbstractTask,
+    storage: Storage,
+    cache: Optional[OutputCache] = None,
+    hand_off: Optional[HandOff] = None,
+    hand_over: bool = False,
+    traced: bool = False,
+    metered: bool = False,
+) -> Message:
+    started_at = time.time()
+
+    recorder = IORecorder() if traced else None
+    meter = OutputMeter() if metered else None
+
+    if isinstance(task, DynamicTask):
+        tasks = generate_task(task, storage)
+
+        _reject_coroutine(task, tasks)
 
         if isinstance(tasks, AbstractTask):
             tasks = [tasks]
@@ -298,70 +1397,340 @@ def _process_a_job(msg: Message, storage: Storage) -> Message:
         out = Message(
             kind=Kind.GENERATED,
             content={
-                "task": msg.content["task"],
+                "task_id": task.task_id,
                 "tasks": {task.task_id: task for task in tasks},
+                "duration": time.time() - started_at,
             },
         )
 
     else:
-        task_id = msg.content["task"].task_id
+        task_id = task.task_id
 
         logger.debug("run[task_id={}]".format(task_id))
 
-        run_task(msg.content["task"], storage)
+        input = assign_storage_to_output(task.input(), storage)
+        output = assign_storage_to_output(task.output(), storage)
+
+        # Storages are wrapped first, as the outputs wrapped by the others are copied with them.
+        if recorder is not None:
+            input = map_output(input, recorder.wrap)
+            output = map_output(output, recorder.wrap)
+
+        if meter is not None:
+            input = map_output(input, meter.wrap)
+            output = map_output(output, meter.wrap)
+
+        if hand_off is not None:
+            input = map_output(input, hand_off.take)
+
+            if hand_over:
+                output = map_output(output, hand_off.hold)
+
+        if cache is not None:
+            # Only the outputs given to `run` are cached, since the outputs given to `generate`
+            # can be passed to the generated tasks, whose task_id depends on the class of them.
+            input = map_output(input, cache.wrap)
+            output = map_output(output, cache.wrap)
+
+        _reject_coroutine(task, task.run(input, output))
 
         logger.debug("ack[task_id={}]".format(task_id))
 
-        out = Message(kind=Kind.DONE, content={"task": msg.content["task"]})
+        out = Message(
+            kind=Kind.DONE,
+            content={"task_id": task_id, "duration": time.time() - started_at},
+        )
+
+        if hand_over:
+            out.content["handed_off"] = True
+
+    if recorder is not None:
+        out.content["trace"] = _worker_trace(started_at, time.time(), recorder.spans)
+
+    if meter is not None:
+        out.content["output_bytes"] = dict(meter.bytes)
 
     return out
 
 
-def jobfunc(q_set: QueueSet, storage: Storage):
+def _reject_coroutine(task: AbstractTask, result) -> None:
+    """Coroutine tasks only run on `alexflow.adapters.executor.async_executor`, and are not awaited."""
+    if inspect.iscoroutine(result):
+        result.close()
+        raise TypeError(
+            f"{type(task).__name__} returned a coroutine, "
+            "run it with alexflow.adapters.executor.async_executor"
+        )
+
+
+def _process_a_chain(
+    tasks: List[AbstractTask],
+    storage: Storage,
+    cache: Optional[OutputCache] = None,
+    traced: bool = False,
+    metered: bool = False,
+) -> List[Message]:
+    """Run the fused tasks in order, handing the outputs of each task to the next in memory.
+
+    The execution stops at the first failure, and the outputs handed to the failed task are stored
+    to the storage, so that it can be executed again.
+    """
+    hand_off = HandOff()
+
+    messages: List[Message] = []
+
+    for i, task in enumerate(tasks):
+        started_at = time.time()
+
+        try:
+            out = _process_a_job(
+                task,
+                storage,
+                cache,
+                hand_off,
+                hand_over=i < len(tasks) - 1,
+                traced=traced,
+                metered=metered,
+            )
+        except Exception as e:
+            messages.append(_raise_message(task, e, time.time() - started_at))
+
+            if traced:
+                messages[-1].content["trace"] = _worker_trace(started_at, time.time())
+
+            if hand_off.materialize() and i > 0:
+                messages[-2].content["handed_off"] = False
+
+            break
+
+        hand_off.release(flatten(task.input()))
+        messages.append(out)
+
+    return messages
+
+
+def _raise_message(task: AbstractTask, e: Exception, duration: float) -> Message:
+    return Message(
+        kind=Kind.RAISE,
+        content={
+            "error": str(e),
+            "error_types": error_types(e),
+            "trace": traceback.format_exc(),
+            "task_id": task.task_id,
+            "duration": duration,
+        },
+    )
+
+
+def _thread_job(
+    q_out: queue.Queue,
+    storage: Storage,
+    task: AbstractTask,
+    seq: int,
+    traced: bool = False,
+    metered: bool = False,
+):
+    """Runs the task on a thread of the scheduler process, and reports it as workers do."""
+    started_at = time.time()
+
+    q_out.put(_started_message(task, seq, started_at, worker=None))
+
+    try:
+        msg = _process_a_job(task, storage, traced=traced, metered=metered)
+    except Exception as e:
+        msg = _raise_message(task, e, time.time() - started_at)
+
+        if traced:
+            msg.content["trace"] = _worker_trace(started_at, time.time())
+
+    msg.content["seq"] = seq
+    q_out.put(msg)
+
+
+def _started_message(
+    task: AbstractTask, seq: int, started_at: float, worker: Optional[int]
+) -> Message:
+    """Message to start timing the task, with the pid of procgen to cancel the task."""
+    return Message(
+        kind=Kind.STARTED,
+        content={
+            "task_id": task.task_id,
+            "seq": seq,
+            "time": started_at,
+            "worker": worker,
+        },
+    )
+
+
+def _raise_cancelled(signum, frame):
+    raise TaskCancelled()
+
+
+def _rss() -> int:
+    """Resident set size of the current process in bytes."""
+    try:
+        with open("/proc/self/statm") as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except OSError:
+        # Peak resident set size instead, which is given in bytes on macOS.
+        return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+
+
+def jobfunc(  # noqa
+    q_set: QueueSet,
+    storage: Storage,
+    registry: Registry,
+    recycle_policy: RecyclePolicy,
+    current: Optional[mp.Value] = None,
+    cache_bytes: Optional[int] = None,
+):
     """Task execution process.
+
+    Args:
+        q_set: Queues to communicate with the scheduler.
+        storage: Storage to run tasks on.
+        registry: Tasks keyed by task_id, to resolve the task of RUN message which only has
+            task_id, or the tasks pickled by `_pack_registry` when the process is not forked.
+        recycle_policy: Policy to exit the process to be replaced with new one.
+        current: Sequence number of the running task, or -1, shared with procgen to cancel it.
+        cache_bytes: Max bytes of the output objects kept in the process, not kept if None.
     """
     setproctitle("alexflow_executor")
 
+    if isinstance(registry, bytes):
+        registry = _unpack_registry(registry)
+
+    # procgen terminates the process to cancel the running task.
+    signal.signal(signal.SIGTERM, _raise_cancelled)
+
+    started_at = time.time()
+    rss_at_start = _rss()
+    n_tasks = 0
+
+    cache = OutputCache(cache_bytes) if cache_bytes is not None else None
+
     try:
-        # Completes every some completes to avoid the memory leaks.
-        for _ in range(30):
+        while True:
+            # Exits at some point to avoid the memory leaks, then procgen starts a new process.
+            reason = recycle_policy.reason(
+                n_tasks=n_tasks,
+                rss_growth=_rss() - rss_at_start,
+                age=time.time() - started_at,
+            )
+
+            if reason is not None:
+                q_set.q_out.put(Message(kind=Kind.RECYCLED, content={"reason": reason}))
+                return
+
+            n_tasks += 1
+
             msg: Message = q_set.q_in.get()
             assert msg.kind == Kind.RUN
 
-            setproctitle(f'alexflow_executor - {msg.content["task"].__repr__()}')
+            if "task" in msg.content:
+                task = msg.content["task"]
+            else:
+                task = registry[msg.content["task_id"]]
 
-            try:
-                q_set.q_out.put(_process_a_job(msg, storage))
-                setproctitle("alexflow_executor")
-            except Exception as e:
-                trace_msg = traceback.format_exc()
-                q_set.q_err.put(
-                    Message(
-                        kind=Kind.RAISE,
-                        content={
-                            "error": str(e),
-                            "trace": trace_msg,
-                            "task_id": msg.content["task"].task_id,
-                        },
-                    )
+            setproctitle(f"alexflow_executor - {task.task_id}")
+
+            seq = msg.content["seq"]
+
+            if current is not None:
+                current.value = seq
+
+            task_started_at = time.time()
+
+            observed = msg.content.get("observed", False)
+
+            if msg.content.get("timed", False) or observed:
+                q_set.q_out.put(
+                    _started_message(task, seq, task_started_at, worker=os.getppid())
                 )
-    except KeyboardInterrupt:
+
+            if cache is not None:
+                hits, misses = cache.hits, cache.misses
+
+            traced = msg.content.get("traced", False)
+
+            if "chain" in msg.content:
+                outs = _process_a_chain(
+                    [task]
+                    + [
+                        item["task"] if "task" in item else registry[item["task_id"]]
+                        for item in msg.content["chain"]
+                    ],
+                    storage,
+                    cache,
+                    traced=traced,
+                    metered=observed,
+                )
+                setproctitle("alexflow_executor")
+            else:
+                try:
+                    outs = [
+                        _process_a_job(
+                            task, storage, cache, traced=traced, metered=observed
+                        )
+                    ]
+                    setproctitle("alexflow_executor")
+                except Exception as e:
+                    outs = [_raise_message(task, e, time.time() - task_started_at)]
+
+                    if traced:
+                        outs[0].content["trace"] = _worker_trace(
+                            task_started_at, time.time()
+                        )
+
+            if cache is not None:
+                for out in outs:
+                    # procgen is the worker known by the scheduler, which outlives this process.
+                    out.content["worker"] = os.getppid()
+                outs[-1].content["cache_hits"] = cache.hits - hits
+                outs[-1].content["cache_misses"] = cache.misses - misses
+
+            if current is not None:
+                current.value = -1
+
+            for out in outs:
+                out.content["seq"] = seq
+                q_set.q_out.put(out)
+    except (KeyboardInterrupt, TaskCancelled):
         return
 
 
-def procgen(q_set: QueueSet, storage: Storage, context: BaseContext):
+def procgen(
+    q_set: QueueSet,
+    storage: Storage,
+    context: BaseContext,
+    registry: Registry,
+    recycle_policy: RecyclePolicy,
+    current: Optional[mp.Value] = None,
+    cancel: Optional[mp.Value] = None,
+    cache_bytes: Optional[int] = None,
+):
     """Task generation process manager.
 
     Keep generate task execution process, with periodic process termination
     to avoid memory leaks.
+
+    When the scheduler sets the sequence number of the running task to `cancel`, the process is
+    terminated, and killed unless it exits in `_CANCEL_GRACE` seconds, then replaced.
     """
     sub_process: Optional[mp.Process] = None
 
     try:
         while True:
-            sub_process = context.Process(target=jobfunc, args=(q_set, storage))
+            sub_process = context.Process(
+                target=jobfunc,
+                args=(q_set, storage, registry, recycle_policy, current, cache_bytes,),
+            )
             sub_process.start()
-            sub_process.join()
+
+            if current is None or cancel is None:
+                sub_process.join()
+            elif _join_or_cancel(sub_process, current, cancel):
+                continue
 
             # Case when subprocess dies unexpectedly, due to the termination signal, OOMs.
             if sub_process.exitcode != 0:
@@ -377,21 +1746,86 @@ def procgen(q_set: QueueSet, storage: Storage, context: BaseContext):
             sub_process.join()
 
 
+def _join_or_cancel(
+    sub_process: mp.Process, current: mp.Value, cancel: mp.Value
+) -> bool:
+    """Wait for the exit of the process, while cancelling the task when requested.
+
+    Returns:
+        Whether the process exited by the cancellation.
+    """
+    cancelled_at: Optional[float] = None
+
+    while sub_process.is_alive():
+        sub_process.join(timeout=_CANCEL_INTERVAL)
+
+        if cancel.value == -1:
+            continue
+
+        if cancelled_at is None and cancel.value != current.value:
+            # The task is already completed.
+            cancel.value = -1
+        elif cancelled_at is None:
+            sub_process.terminate()
+            cancelled_at = time.time()
+        elif time.time() - cancelled_at > _CANCEL_GRACE:
+            sub_process.kill()
+
+    if cancelled_at is None:
+        return False
+
+    cancel.value = -1
+    current.value = -1
+    return True
+
+
 class Worker:
-    def __init__(self, q_set: QueueSet, storage: Storage, context: BaseContext):
+    def __init__(
+        self,
+        q_set: QueueSet,
+        storage: Storage,
+        context: BaseContext,
+        registry: Optional[Registry] = None,
+        recycle_policy: Optional[RecyclePolicy] = None,
+        output_cache_bytes: Optional[int] = None,
+    ):
         self.q_set = q_set
         self.storage = storage
-        self.process = None
+        self.process: Optional[mp.Process] = None
         self.context = context
+        # Given as is to the processes started again by procgen on every recycle.
+        self.registry = _share_registry(
+            registry if registry is not None else {}, context
+        )
+        self.recycle_policy = (
+            recycle_policy if recycle_policy is not None else RecyclePolicy()
+        )
+        self.current = context.Value("q", -1)
+        self.cancel_seq = context.Value("q", -1)
+        self.output_cache_bytes = output_cache_bytes
 
     def run(self):
 
         self.process = self.context.Process(
-            target=procgen, args=(self.q_set, self.storage, self.context)
+            target=procgen,
+            args=(
+                self.q_set,
+                self.storage,
+                self.context,
+                self.registry,
+                self.recycle_policy,
+                self.current,
+                self.cancel_seq,
+                self.output_cache_bytes,
+            ),
         )
 
         self.process.start()
 
+    def cancel(self, seq: int):
+        """Cancel the task of the sequence number, if it is still running on the worker."""
+        self.cancel_seq.value = seq
+
     def kill(self):
         if self.is_alive():
             os.kill(self.process.pid, signal.SIGINT)
@@ -406,8 +1840,11 @@ def run_job(
     n_jobs: int = 1,
     resources: Optional[Dict[str, int]] = None,
     context: Optional[BaseContext] = None,
-):
+    **kwargs,
+) -> FailureReport:
     """Run pipeline task through luigi.
+
+    Additional keyword arguments are passed to `run_workflow`.
     """
     tasks: List[Task]
     if isinstance(task, list):
@@ -415,11 +1852,12 @@ def run_job(
     else:
         tasks = [task]
 
-    run_workflow(
+    return run_workflow(
         Workflow(tasks={task.task_id: task for task in tasks}, storage=storage),
         n_jobs=n_jobs,
         resources=resources,
         context=context,
+        **kwargs,
     )
 
 
@@ -428,12 +1866,130 @@ def run_workflow(
     n_jobs: int = 1,
     resources: Optional[Dict[str, int]] = None,
     context: Optional[BaseContext] = None,
-):
+    transport: str = "manager",
+    recycle_policy: Optional[RecyclePolicy] = None,
+    metrics: Optional[Metrics] = None,
+    ordering: str = "critical_path",
+    duration_history: Optional[DurationHistory] = None,
+    capacity: Optional[Dict[str, Union[str, int, float]]] = None,
+    backend: str = "process",
+    thread_tags: Optional[Set[str]] = None,
+    keep_going: bool = False,
+    retry_policy: Optional[RetryPolicy] = None,
+    retry_policies: Optional[Dict[Union[type, str], RetryPolicy]] = None,
+    default_timeout: Optional[float] = None,
+    output_cache_bytes: Optional[int] = None,
+    fuse_ephemeral: bool = False,
+    trace: Optional[Trace] = None,
+    metrics_port: Optional[int] = None,
+) -> FailureReport:
+    """Run workflow through alexflow executor.
+
+    Args:
+        workflow: Workflow to run.
+        n_jobs: Number of worker processes. Tasks are executed in the current process if 1.
+        resources: Max sum of `AbstractTask.resource_usage` of running tasks per tag, which is the max
+            concurrency of the tasks per tag by default.
+        context: Multiprocessing context used to start workers.
+        transport: How messages are passed between the scheduler and workers, "manager" through
+            queues hosted by `Manager` server process, or "queue" through direct pipes.
+        recycle_policy: When a worker process is replaced, after 30 tasks by default.
+        metrics: Metrics to collect the counters, gauges and histograms of the run into. The
+            number of tasks dispatched and not completed, "in_flight", is kept within
+            "dispatch_window", which is sized by the number of workers and the durations of recent
+            tasks. When given, the workers also report the start of tasks and the bytes loaded and
+            stored per output class, "output_bytes", and the number of tasks ready, queued and
+            running per tag are updated every second.
+        ordering: Order of the ready tasks with the same `AbstractTask.priority`, "critical_path" to
+            run the tasks on the longest path of the remaining graph first, or "fifo" to run them as
+            they become ready.
+        duration_history: Durations of the previous runs to estimate the cost of tasks, which is also
+            updated with the durations of this run.
+        capacity: Total "cpu", "memory" and "gpu" of the machine, e.g. {"cpu": 8, "memory": "32Gi"}.
+            Tasks are admitted only while the requests of their `ResourceSpec` fit into it, so that
+            n_jobs can be set to the max number of concurrent light tasks.
+        backend: Where tasks are executed, "process" on worker processes, or "thread" on a pool of
+            n_jobs threads in the current process, which avoids the overhead of processes for I/O
+            bound tasks.
+        thread_tags: Tags of tasks executed on the pool of threads with "process" backend.
+        keep_going: Continue running the tasks independent of failed tasks, instead of terminating
+            the run by the first error. The tasks depending on failed tasks are not executed, and
+            ephemeral outputs they depend on are kept.
+        retry_policy: When failed tasks are executed again, not retried by default. Tasks waiting
+            for the backoff do not block the other tasks.
+        retry_policies: Retry policies per task class or tag, preferred over retry_policy.
+        default_timeout: Seconds a task can run, for tasks without `AbstractTask.execution_timeout`. The
+            process of the task exceeding the timeout is terminated and replaced, and the task fails
+            by `TaskTimeout`, which can be retried. Not applied to the tasks running on threads,
+            which can not be terminated, nor when n_jobs is 1.
+        output_cache_bytes: Max bytes of the output objects each worker process keeps in memory,
+            not kept if None. Objects stored to or loaded from `BinaryOutput` are kept, and the
+            tasks are preferably dispatched to the worker which completed their upstream tasks, to
+            skip loading the inputs from the storage. Tasks must not modify the loaded objects in
+            place, since the same object is given to the downstream tasks on the worker.
+        fuse_ephemeral: Run a chain of tasks back-to-back on a worker, handing the objects of the
+            outputs from a task to the next in memory, when the next task is the only task
+            depending on the task and refers to all its outputs as ephemeral. The outputs are stored
+            to the storage only if the next task fails. Only the tasks with plain `BinaryOutput`, the
+            same resource requirements and without timeout are fused. Not applied when n_jobs is 1.
+        trace: Trace to record the timeline of the tasks into, when they become ready, are
+            dispatched, started, and completed, with the time spent by `Output.load` and
+            `Output.store`. Write it by `Trace.dump` to open in Perfetto.
+        metrics_port: Port to serve the metrics in Prometheus text format at /metrics of localhost
+            while running, not served if None.
+
+    Returns:
+        Report of the failed tasks and the tasks blocked by them, which is empty unless keep_going.
+    """
     logger.debug(f"start running alexflow_executor with workers = {n_jobs}")
 
-    if n_jobs == 1:
-        _sequential_execute(workflow, workers=1)
-    else:
-        if resources is None:
-            resources = {}
-        _execute(workflow, workers=n_jobs, resources=resources, context=context)
+    server = None
+
+    if metrics_port is not None:
+        if metrics is None:
+            metrics = Metrics()
+
+        server = serve_metrics(metrics, port=metrics_port)
+        logger.info(f"serving metrics at http://127.0.0.1:{server.server_port}/metrics")
+
+    try:
+        if n_jobs == 1:
+            return _sequential_execute(
+                workflow,
+                workers=1,
+                ordering=ordering,
+                duration_history=duration_history,
+                keep_going=keep_going,
+                metrics=metrics,
+                retry_policy=retry_policy,
+                retry_policies=retry_policies,
+                trace=trace,
+            )
+        else:
+            if resources is None:
+                resources = {}
+            return _execute(
+                workflow,
+                workers=n_jobs,
+                resources=resources,
+                context=context,
+                transport=transport,
+                recycle_policy=recycle_policy,
+                metrics=metrics,
+                ordering=ordering,
+                duration_history=duration_history,
+                capacity=capacity,
+                backend=backend,
+                thread_tags=thread_tags,
+                keep_going=keep_going,
+                retry_policy=retry_policy,
+                retry_policies=retry_policies,
+                default_timeout=default_timeout,
+                output_cache_bytes=output_cache_bytes,
+                fuse_ephemeral=fuse_ephemeral,
+                trace=trace,
+            )
+    finally:
+        if server is not None:
+            server.shutdown()
+            server.server_close()
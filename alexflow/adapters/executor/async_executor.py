@@ -0,0 +1,282 @@
+import asyncio
+import functools
+import inspect
+import time
+from concurrent.futures import Executor, ThreadPoolExecutor
+from typing import Union, List, Dict, Optional
+
+from ...core import Task, DynamicTask, Workflow, AbstractTask, Storage
+from ...helper import assign_storage_to_output
+
+from ._reference_manager import ReferenceManager
+from ._dependency_graph import DependencyGraph
+from ._completion_index import CompletionIndex
+from ._duration_history import DurationHistory
+from .alexflow import (
+    BlockedTasks,
+    Kind,
+    Message,
+    ResourceManager,
+    Termination,
+    _cost_function,
+    _log_completion_index,
+    _process_a_job,
+)
+
+from logging import getLogger
+
+
+logger = getLogger(__name__)
+
+
+def is_coroutine_task(task: AbstractTask) -> bool:
+    """Whether the task defines `run` or `generate` as a coroutine function."""
+    if isinstance(task, DynamicTask):
+        return inspect.iscoroutinefunction(task.generate)
+    return inspect.iscoroutinefunction(task.run)
+
+
+async def _process_a_coroutine(task: AbstractTask, storage: Storage) -> Message:
+    started_at = time.time()
+
+    input = assign_storage_to_output(task.input(), storage)
+    output = assign_storage_to_output(task.output(), storage)
+
+    if isinstance(task, DynamicTask):
+        tasks = await task.generate(input, output)  # type: ignore
+
+        if isinstance(tasks, AbstractTask):
+            tasks = [tasks]
+
+        return Message(
+            kind=Kind.GENERATED,
+            content={
+                "task_id": task.task_id,
+                "tasks": {task.task_id: task for task in tasks},
+                "duration": time.time() - started_at,
+            },
+        )
+
+    logger.debug("run[task_id={}]".format(task.task_id))
+
+    await task.run(input, output)
+
+    logger.debug("ack[task_id={}]".format(task.task_id))
+
+    return Message(
+        kind=Kind.DONE,
+        content={"task_id": task.task_id, "duration": time.time() - started_at},
+    )
+
+
+async def _process(task: AbstractTask, storage: Storage, executor: Executor) -> Message:
+    if is_coroutine_task(task):
+        return await _process_a_coroutine(task, storage)
+
+    loop = asyncio.get_running_loop()
+
+    return await loop.run_in_executor(executor, _process_a_job, task, storage)
+
+
+def _finish(
+    task: AbstractTask,
+    msg: Message,
+    graph: DependencyGraph,
+    completion_index: CompletionIndex,
+    ref_manager: ReferenceManager,
+) -> None:
+    if msg.kind == Kind.DONE:
+        completion_index.add(task)
+        graph.complete(task.task_id)
+    elif msg.kind == Kind.GENERATED:
+        new_tasks: Dict[str, Task] = msg.content["tasks"]
+        for new_task in graph.expand(task.task_id, new_tasks.values()):
+            ref_manager.add(new_task)
+
+    ref_manager.remove(task)
+
+
+async def execute_workflow(  # noqa
+    workflow: Workflow,
+    max_concurrency: int = 100,
+    resources: Optional[Dict[str, int]] = None,
+    executor: Optional[Executor] = None,
+    ordering: str = "critical_path",
+    duration_history: Optional[DurationHistory] = None,
+    capacity: Optional[Dict[str, Union[str, int, float]]] = None,
+):
+    """Run workflow on the running event loop.
+
+    Coroutine tasks are awaited on the event loop, and the other tasks are offloaded to the executor.
+    See `run_workflow` for the arguments.
+    """
+    if duration_history is None:
+        duration_history = DurationHistory()
+
+    own_executor = executor is None
+
+    if executor is None:
+        executor = ThreadPoolExecutor()
+
+    loop = asyncio.get_running_loop()
+
+    # Runs the calls of the storage by the scheduler one by one, apart from the tasks on executor.
+    bookkeeper = ThreadPoolExecutor(max_workers=1)
+
+    tasks = {task.task_id: task for task in workflow.to_task_list()}
+
+    resource_manager = ResourceManager(resources or {}, capacity=capacity)
+
+    completion_index = CompletionIndex(workflow.storage)
+
+    ref_manager = ReferenceManager(
+        tasks=tasks, storage=workflow.storage, completion_index=completion_index
+    )
+
+    running: Dict[asyncio.Future, AbstractTask] = {}
+
+    try:
+        graph = await loop.run_in_executor(
+            bookkeeper,
+            functools.partial(
+                DependencyGraph,
+                tasks=tasks,
+                storage=workflow.storage,
+                completion_index=completion_index,
+                cost=_cost_function(ordering, duration_history),
+            ),
+        )
+
+        blocked = BlockedTasks(graph, resource_manager)
+
+        while len(graph) > 0:
+
+            while len(running) < max_concurrency:
+                task = graph.pop_ready()
+
+                if task is None:
+                    break
+
+                if not blocked.admit(task):
+                    continue
+
+                running[
+                    asyncio.ensure_future(_process(task, workflow.storage, executor))
+                ] = task
+
+                resource_manager.add(task)
+
+            if len(running) == 0:
+                raise Termination(
+                    f"{len(graph)} tasks could not be resolved by the dependency"
+                )
+
+            done, _ = await asyncio.wait(
+                running.keys(), return_when=asyncio.FIRST_COMPLETED
+            )
+
+            for future in done:
+                task = running.pop(future)
+
+                resource_manager.remove(task)
+                blocked.release(task)
+
+                try:
+                    msg: Message = future.result()
+                except Exception as e:
+                    logger.error("raise[task_id={}]".format(task.task_id))
+                    raise Termination(
+                        "Raised error on task_id={}".format(task.task_id)
+                    ) from e
+
+                duration_history.record(task, msg.content["duration"])
+
+                # Checks and removes the outputs in the storage, which is not to block the loop.
+                await loop.run_in_executor(
+                    bookkeeper,
+                    _finish,
+                    task,
+                    msg,
+                    graph,
+                    completion_index,
+                    ref_manager,
+                )
+    finally:
+        for pending in running:
+            pending.cancel()
+
+        # Tasks already running on the executor can not be cancelled, they are waited instead.
+        await asyncio.gather(*running.keys(), return_exceptions=True)
+
+        if own_executor:
+            executor.shutdown(wait=True)
+
+        bookkeeper.shutdown(wait=True)
+
+        _log_completion_index(completion_index)
+
+
+def run_workflow(
+    workflow: Workflow,
+    max_concurrency: int = 100,
+    resources: Optional[Dict[str, int]] = None,
+    executor: Optional[Executor] = None,
+    ordering: str = "critical_path",
+    duration_history: Optional[DurationHistory] = None,
+    capacity: Optional[Dict[str, Union[str, int, float]]] = None,
+):
+    """Run workflow through asyncio executor.
+
+    Tasks whose `run`, or `generate` of DynamicTask, is a coroutine function are awaited on the event
+    loop, so that thousands of high latency tasks overlap in a single process. The other tasks are
+    offloaded to the executor.
+
+    Args:
+        workflow: Workflow to run.
+        max_concurrency: Max number of tasks running at the same time.
+        resources: Max sum of `AbstractTask.resource_usage` of running tasks per tag.
+        executor: Executor to run the tasks which are not coroutines, `ThreadPoolExecutor` if None.
+            Give `ProcessPoolExecutor` for CPU bound tasks.
+        ordering: Order of the ready tasks, see `alexflow.adapters.executor.alexflow.run_workflow`.
+        duration_history: Durations of the previous runs to estimate the cost of tasks.
+        capacity: Total "cpu", "memory" and "gpu" to admit the tasks by their `ResourceSpec`.
+
+    Notes:
+        DynamicTask with coroutine `generate` must define `output`, since the completion of
+        DynamicTask without output is checked by calling `generate` synchronously.
+    """
+    logger.debug(
+        f"start running asyncio_executor with max_concurrency = {max_concurrency}"
+    )
+
+    asyncio.run(
+        execute_workflow(
+            workflow,
+            max_concurrency=max_concurrency,
+            resources=resources,
+            executor=executor,
+            ordering=ordering,
+            duration_history=duration_history,
+            capacity=capacity,
+        )
+    )
+
+
+def run_job(
+    task: Union[Task, List[Task]], storage: Storage, **kwargs,
+):
+    """Run pipeline task through asyncio executor.
+
+    Additional keyword arguments are passed to `run_workflow`.
+    """
+    tasks: List[Task]
+
+    if isinstance(task, list):
+        tasks = task
+    else:
+        tasks = [task]
+
+    run_workflow(
+        Workflow(storage=storage, tasks={task.task_id: task for task in tasks}),
+        **kwargs,
+    )
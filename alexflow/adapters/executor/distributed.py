@@ -0,0 +1,621 @@
+from dataclasses import dataclass, field
+from typing import Union, List, Dict, Optional, Set, Tuple
+
+import ipaddress
+import itertools
+import os
+import queue
+import socket
+import threading
+import time
+
+import multiprocess as mp
+from multiprocess.connection import (
+    Listener,
+    Client,
+    Connection,
+    answer_challenge,
+    deliver_challenge,
+    wait,
+)
+from multiprocess.context import AuthenticationError, BaseContext
+
+from ...core import Task, Workflow, AbstractTask, Storage
+
+from ._reference_manager import ReferenceManager
+from ._dependency_graph import DependencyGraph
+from ._completion_index import CompletionIndex
+from ._metrics import Metrics
+from ._duration_history import DurationHistory
+from ._retry import RetryPolicy, RetryQueue
+from .alexflow import (
+    FailureReport,
+    Kind,
+    Message,
+    QueueSet,
+    RecyclePolicy,
+    ResourceManager,
+    Termination,
+    Worker,
+    shutdown_all,
+    _EVENT_TIMEOUT,
+    _cost_function,
+    _log_completion_index,
+    _log_retry,
+    _observe_dispatch,
+    _pack_registry,
+    _parse_capacity,
+    _share_registry,
+    _raise_message,
+    _record_attempt,
+)
+
+from logging import getLogger
+
+
+logger = getLogger(__name__)
+
+
+Address = Tuple[str, int]
+
+
+class AgentLost(Exception):
+    """Reported as the error of the tasks running on the agent which disconnected."""
+
+
+@dataclass
+class AgentInfo:
+    """Sent by an agent when it connects to the coordinator.
+
+    Attrs:
+        name: Name of the agent for logs, host name and pid by default.
+        slots: Number of tasks the agent runs at the same time.
+        capacity: Total "cpu", "memory" and "gpu" of the agent, see `ResourceManager`.
+        tags: Tags of the tasks the agent runs, the tags of a task must be a subset of them. The
+            agent runs any tasks if None.
+    """
+
+    name: str
+    slots: int = 1
+    capacity: Dict[str, Union[str, int, float]] = field(default_factory=dict)
+    tags: Optional[Set[str]] = None
+
+
+class _Agent:
+    """Agent connected to the coordinator, with the tasks running on it."""
+
+    def __init__(self, conn: Connection, info: AgentInfo):
+        if not isinstance(info, AgentInfo):
+            raise ValueError(f"expected AgentInfo, got {type(info).__name__}")
+
+        self.conn = conn
+        self.info = info
+        self.resource_manager = ResourceManager({}, capacity=info.capacity)
+        self.running: Set[str] = set()
+
+    def free_slots(self) -> int:
+        return self.info.slots - len(self.running)
+
+    def accepts(self, task: AbstractTask) -> bool:
+        if self.free_slots() <= 0:
+            return False
+
+        if self.info.tags is not None and not task.tags <= self.info.tags:
+            return False
+
+        return self.resource_manager.is_runnable(task)
+
+
+class Coordinator:
+    """Scheduler of a workflow, which listens on a TCP socket for agents to run the tasks.
+
+    Agents on any host connect with `run_agent`, receive the tasks known at the start and the storage
+    once, and then run the tasks handed by task_id. Tasks are placed on the agent with the most free
+    slots among the agents whose tags and capacity fit the task, and the concurrency per tag given
+    by `resources` is limited across all the agents.
+
+    The listener is bound on construction, so that `address` and `authkey` can be given to the
+    agents before `run`, which blocks until the workflow is completed. Messages from agents are
+    unpickled, so the key has to be given explicitly to listen on other than the loopback address,
+    and a random key is used otherwise.
+    """
+
+    def __init__(
+        self,
+        workflow: Workflow,
+        address: Address = ("127.0.0.1", 0),
+        authkey: Optional[bytes] = None,
+        resources: Optional[Dict[str, int]] = None,
+        metrics: Optional[Metrics] = None,
+        ordering: str = "critical_path",
+        duration_history: Optional[DurationHistory] = None,
+        keep_going: bool = False,
+        retry_policy: Optional[RetryPolicy] = None,
+        retry_policies: Optional[Dict[Union[type, str], RetryPolicy]] = None,
+        agent_timeout: float = 60.0,
+        handshake_timeout: float = 10.0,
+    ):
+        if authkey is None:
+            if not _is_loopback(address[0]):
+                raise ValueError(f"authkey must be given to listen on {address[0]}")
+            authkey = os.urandom(32)
+
+        self.workflow = workflow
+        self.metrics = metrics if metrics is not None else Metrics()
+        self.duration_history = (
+            duration_history if duration_history is not None else DurationHistory()
+        )
+        self.keep_going = keep_going
+        self.agent_timeout = agent_timeout
+        self.handshake_timeout = handshake_timeout
+        self.authkey = authkey
+
+        # Agents are authenticated on their own threads, not to block the others by a silent client.
+        self._listener = Listener(address)
+        self.address: Address = self._listener.address
+
+        tasks = {task.task_id: task for task in workflow.to_task_list()}
+
+        self._resource_manager = ResourceManager(resources or {})
+        self._completion_index = CompletionIndex(workflow.storage, self.metrics)
+        self._ref_manager = ReferenceManager(
+            tasks=tasks,
+            storage=workflow.storage,
+            completion_index=self._completion_index,
+            metrics=self.metrics,
+        )
+        self._graph = DependencyGraph(
+            tasks=tasks,
+            storage=workflow.storage,
+            completion_index=self._completion_index,
+            cost=_cost_function(ordering, self.duration_history),
+        )
+        self._retries = RetryQueue(retry_policy, retry_policies)
+        self._report = FailureReport()
+
+        # Tasks known at the start are sent to agents once when they connect.
+        self._registry: Dict[str, AbstractTask] = self._graph.tasks()
+        self._packed_registry = _pack_registry(self._registry)
+
+        # Agents which completed the handshake on the accepting thread.
+        self._connected: "queue.Queue[_Agent]" = queue.Queue()
+        self._agents: List[_Agent] = []
+        self._closed = False
+
+        # key = task_id, value = sequence number of the dispatch.
+        self._running: Dict[str, int] = {}
+        self._sequence = itertools.count()
+
+    def run(self) -> FailureReport:
+        accepting = threading.Thread(target=self._accept, daemon=True)
+        accepting.start()
+
+        idle_since = time.time()
+
+        try:
+            while len(self._graph) > 0:
+                self._add_agents(timeout=0.0)
+
+                for task_id in self._retries.pop_due(time.time()):
+                    self._graph.push_ready(self._graph.get(task_id))
+
+                self._dispatch()
+
+                if len(self._running) > 0 or len(self._retries) > 0:
+                    idle_since = time.time()
+                elif time.time() - idle_since > self.agent_timeout:
+                    raise Termination(
+                        f"{len(self._graph)} tasks could not be placed on "
+                        f"{len(self._agents)} agents"
+                    )
+
+                if len(self._agents) == 0:
+                    # Nothing to do until an agent connects.
+                    self._add_agents(timeout=_EVENT_TIMEOUT)
+                    continue
+
+                self._receive()
+        finally:
+            self._closed = True
+            self._listener.close()
+
+            for agent in self._agents:
+                try:
+                    agent.conn.send(None)
+                    agent.conn.close()
+                except OSError:
+                    pass
+
+            _log_completion_index(self._completion_index)
+
+        return self._report
+
+    def _receive(self):
+        """Handle the messages from agents, waiting for them up to `_EVENT_TIMEOUT`."""
+        timeout = _EVENT_TIMEOUT
+        if len(self._retries) > 0:
+            timeout = min(timeout, self._retries.wait_time(time.time()))
+
+        by_conn = {agent.conn: agent for agent in self._agents}
+
+        for conn in wait(list(by_conn.keys()), timeout=timeout):
+            agent = by_conn[conn]
+            try:
+                msg = conn.recv()
+            except (EOFError, OSError):
+                self._lose(agent)
+                continue
+
+            self._handle(agent, msg)
+
+    def _accept(self):
+        while not self._closed:
+            try:
+                conn = self._listener.accept()
+            except OSError:
+                # The listener is closed on the completion of the run.
+                if self._closed:
+                    return
+                continue
+
+            threading.Thread(target=self._handshake, args=(conn,), daemon=True).start()
+
+    def _handshake(self, conn: Connection):
+        """Authenticate the agent and send the workflow to it, within `handshake_timeout`."""
+        timer = threading.Timer(self.handshake_timeout, _shutdown, args=(conn,))
+        timer.start()
+
+        try:
+            deliver_challenge(conn, self.authkey)
+            answer_challenge(conn, self.authkey)
+            info: AgentInfo = conn.recv()
+            # Validated before the welcome, so that a rejected agent fails on receiving it.
+            agent = _Agent(conn, info)
+            conn.send(
+                {"storage": self.workflow.storage, "registry": self._packed_registry}
+            )
+        except AuthenticationError:
+            logger.warning("rejected an agent by authentication")
+            conn.close()
+            return
+        except ValueError as e:
+            logger.warning(f"rejected an agent by its info: {e}")
+            conn.close()
+            return
+        except (OSError, EOFError):
+            logger.warning("dropped an agent which did not complete the handshake")
+            conn.close()
+            return
+        finally:
+            timer.cancel()
+
+        logger.info(f"connected agent {info.name} with {info.slots} slots")
+        self._connected.put(agent)
+
+    def _add_agents(self, timeout: float):
+        try:
+            agent = self._connected.get(timeout=timeout) if timeout > 0 else None
+            if agent is not None:
+                self._agents.append(agent)
+
+            while True:
+                self._agents.append(self._connected.get_nowait())
+        except queue.Empty:
+            pass
+
+        self.metrics.set("agents", len(self._agents))
+
+    def _dispatch(self):
+        blocked: List[AbstractTask] = []
+
+        while any(agent.free_slots() > 0 for agent in self._agents):
+            task = self._graph.pop_ready()
+
+            if task is None:
+                break
+
+            candidates = [agent for agent in self._agents if agent.accepts(task)]
+
+            if len(candidates) == 0 or not self._resource_manager.is_runnable(task):
+                blocked.append(task)
+                continue
+
+            agent = max(candidates, key=lambda agent: agent.free_slots())
+
+            seq = next(self._sequence)
+
+            _observe_dispatch(self.metrics, self._graph, task)
+
+            content = {"task_id": task.task_id, "seq": seq}
+            if task.task_id not in self._registry:
+                content["task"] = task
+
+            try:
+                agent.conn.send(Message(kind=Kind.RUN, content=content))
+            except OSError:
+                blocked.append(task)
+                self._lose(agent)
+                continue
+
+            self._running[task.task_id] = seq
+            agent.running.add(task.task_id)
+            agent.resource_manager.add(task)
+            self._resource_manager.add(task)
+
+        for task in blocked:
+            self._graph.push_ready(task)
+
+        self.metrics.set("in_flight", len(self._running))
+
+    def _lose(self, agent: _Agent):
+        """Remove the disconnected agent, and fail the tasks running on it."""
+        logger.warning(f"lost agent {agent.info.name}")
+        self.metrics.inc("agents_lost")
+
+        self._agents.remove(agent)
+
+        for task_id in list(agent.running):
+            task = self._graph.get(task_id)
+            try:
+                raise AgentLost(f"lost agent {agent.info.name} running {task_id}")
+            except AgentLost as e:
+                msg = _raise_message(task, e, 0.0)
+            msg.content["seq"] = self._running[task_id]
+            self._handle(agent, msg)
+
+    def _handle(self, agent: _Agent, msg: Message):
+        if msg.kind == Kind.RECYCLED:
+            self.metrics.inc("worker_recycles", reason=msg.content["reason"])
+            return
+
+        task_id = msg.content["task_id"]
+
+        if self._running.get(task_id) != msg.content["seq"] or msg.kind == Kind.STARTED:
+            return
+
+        task = self._graph.get(task_id)
+
+        self._running.pop(task_id)
+        agent.running.discard(task_id)
+        agent.resource_manager.remove(task)
+        self._resource_manager.remove(task)
+        _record_attempt(self.metrics, task, msg)
+
+        if msg.kind == Kind.RAISE:
+            delay = self._retries.schedule(
+                task, msg.content["error_types"], time.time()
+            )
+
+            if delay is not None:
+                _log_retry(task, msg, delay, self.metrics)
+                return
+
+            if self.keep_going:
+                self._report.add(task, msg.content, self._graph.fail(task_id))
+                self.metrics.inc("task_failures")
+                return
+
+            logger.error("raise[task_id={}] on {}".format(task_id, agent.info.name))
+            raise Termination(
+                "Raised error on task_id={}".format(task_id)
+                + "trace:\n"
+                + msg.content["trace"]
+            )
+
+        self.duration_history.record(task, msg.content["duration"])
+
+        if msg.kind == Kind.DONE:
+            self._completion_index.add(task)
+            self._graph.complete(task_id)
+        elif msg.kind == Kind.GENERATED:
+            new_tasks: Dict[str, Task] = msg.content["tasks"]
+            for new_task in self._graph.expand(task_id, new_tasks.values()):
+                self._ref_manager.add(new_task)
+
+        self._ref_manager.remove(task)
+
+
+def _is_loopback(host: str) -> bool:
+    if host == "localhost":
+        return True
+    try:
+        return ipaddress.ip_address(host).is_loopback
+    except ValueError:
+        return False
+
+
+def _shutdown(conn: Connection):
+    """Shut down the socket of the connection, to wake up the thread blocked on it."""
+    try:
+        with socket.socket(fileno=os.dup(conn.fileno())) as sock:
+            sock.shutdown(socket.SHUT_RDWR)
+    except OSError:
+        pass
+
+
+def run_agent(
+    address: Address,
+    authkey: bytes,
+    slots: int = 1,
+    capacity: Optional[Dict[str, Union[str, int, float]]] = None,
+    tags: Optional[Set[str]] = None,
+    storage: Optional[Storage] = None,
+    context: Optional[BaseContext] = None,
+    recycle_policy: Optional[RecyclePolicy] = None,
+    name: Optional[str] = None,
+):
+    """Connect to the coordinator, and run the tasks on worker processes until the run completes.
+
+    Args:
+        address: Host and port the coordinator listens on.
+        authkey: Key of the coordinator to authenticate the connection, see `Coordinator.authkey`.
+        slots: Number of worker processes.
+        capacity: Total "cpu", "memory" and "gpu" of the agent, to place tasks by `ResourceSpec`.
+        tags: Tags of the tasks to run on the agent, or None to run any tasks.
+        storage: Storage to run the tasks on, the storage of the workflow if None. All the agents
+            must share the same storage, e.g. a bucket of the cloud storage.
+        context: Multiprocessing context used to start workers.
+        recycle_policy: When a worker process is replaced.
+        name: Name of the agent for logs.
+    """
+    if context is None:
+        context = mp.get_context()
+
+    if name is None:
+        name = f"{socket.gethostname()}:{os.getpid()}"
+
+    # Fails before connecting, rather than being rejected by the coordinator.
+    _parse_capacity(capacity or {})
+
+    conn = Client(address, authkey=authkey)
+
+    conn.send(
+        AgentInfo(
+            name=name,
+            slots=slots,
+            capacity=dict(capacity or {}),
+            tags=set(tags) if tags is not None else None,
+        )
+    )
+
+    welcome = conn.recv()
+
+    if storage is None:
+        storage = welcome["storage"]
+
+    # Packed once for all the workers, unless they inherit it by fork.
+    registry = _share_registry(welcome["registry"], context)
+
+    q_set = QueueSet(context)
+
+    ws: List[Worker] = []
+
+    stopped = threading.Event()
+    forwarding = threading.Thread(
+        target=_forward, args=(q_set.q_out, conn, stopped), daemon=True
+    )
+    forwarding.start()
+
+    try:
+        for _ in range(slots):
+            w = Worker(q_set, storage, context, registry, recycle_policy)
+            w.run()
+            ws.append(w)
+
+        _serve(conn, q_set, ws)
+    finally:
+        shutdown_all(ws)
+        # Stopped before the queues are closed, not to read from the closed queue. A sentinel is
+        # not put instead, since a terminated worker may hold the lock of the queue.
+        stopped.set()
+        forwarding.join()
+        q_set.close()
+        conn.close()
+
+
+def _serve(conn: Connection, q_set: QueueSet, ws: List[Worker]):
+    """Hand the tasks from the coordinator to workers, until the coordinator closes the connection."""
+    while True:
+        for worker in ws:
+            if not worker.is_alive():
+                raise Termination("Detected unexpectedly dead worker ")
+
+        if not conn.poll(_EVENT_TIMEOUT):
+            continue
+
+        try:
+            msg: Optional[Message] = conn.recv()
+        except EOFError:
+            return
+
+        if msg is None:
+            return
+
+        assert msg.kind == Kind.RUN
+        q_set.q_in.put(msg)
+
+
+def _forward(q_out: "queue.Queue[Message]", conn: Connection, stopped: threading.Event):
+    """Send the messages of workers to the coordinator, until stopped."""
+    while not stopped.is_set():
+        try:
+            msg = q_out.get(timeout=_EVENT_TIMEOUT)
+        except queue.Empty:
+            continue
+
+        try:
+            conn.send(msg)
+        except OSError:
+            return
+
+
+def run_workflow(
+    workflow: Workflow,
+    address: Address = ("127.0.0.1", 0),
+    authkey: Optional[bytes] = None,
+    n_agents: int = 0,
+    slots: int = 1,
+    context: Optional[BaseContext] = None,
+    **kwargs,
+) -> FailureReport:
+    """Run workflow through the coordinator, with agents connecting to the address.
+
+    Args:
+        workflow: Workflow to run.
+        address: Host and port to listen on for agents, port 0 to choose a free port.
+        authkey: Key shared with the agents to authenticate the connections, which must be given
+            to listen on other than the loopback address. A random key is used if None.
+        n_agents: Number of agents started on the local machine, in addition to the agents started
+            by `run_agent` on other hosts.
+        slots: Number of worker processes of each local agent.
+        context: Multiprocessing context used to start local agents.
+
+    Additional keyword arguments are passed to `Coordinator`.
+    """
+    if context is None:
+        context = mp.get_context()
+
+    coordinator = Coordinator(workflow, address=address, authkey=authkey, **kwargs)
+
+    logger.debug(f"start running coordinator on {coordinator.address}")
+
+    agents = []
+    for i in range(n_agents):
+        agent = context.Process(
+            target=run_agent,
+            kwargs=dict(
+                address=coordinator.address,
+                authkey=coordinator.authkey,
+                slots=slots,
+                context=context,
+                name=f"local-{i}",
+            ),
+        )
+        agent.start()
+        agents.append(agent)
+
+    try:
+        return coordinator.run()
+    finally:
+        for agent in agents:
+            agent.join()
+
+
+def run_job(
+    task: Union[Task, List[Task]], storage: Storage, **kwargs,
+) -> FailureReport:
+    """Run pipeline task through the coordinator.
+
+    Additional keyword arguments are passed to `run_workflow`.
+    """
+    tasks: List[Task]
+
+    if isinstance(task, list):
+        tasks = task
+    else:
+        tasks = [task]
+
+    return run_workflow(
+        Workflow(tasks={task.task_id: task for task in tasks}, storage=storage),
+        **kwargs,
+    )
@@ -1,6 +1,6 @@
 import luigi
 from typing import Union, List
-from collections import Mapping
+from collections.abc import Mapping
 
 from dataclass_serializer import deserialize
 
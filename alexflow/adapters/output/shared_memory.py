@@ -0,0 +1,240 @@
+from dataclasses import dataclass
+from typing import Any, Dict, List, Optional, Tuple
+
+import os
+import secrets
+import sys
+
+import joblib
+import numpy as np
+import pandas as pd
+
+from alexflow.core import Output
+
+try:
+    from multiprocessing import resource_tracker
+    from multiprocessing.shared_memory import SharedMemory
+except ImportError:  # Python 3.7
+    SharedMemory = None  # type: ignore
+
+
+# Offsets of the arrays in a segment are aligned for the vectorized operations.
+_ALIGNMENT = 64
+
+
+@dataclass(frozen=True)
+class SharedMemoryOutput(Output):
+    """Output keeping the buffers of ndarray, DataFrame and Series in a shared memory segment.
+
+    The buffers are copied into a segment of `multiprocessing.shared_memory` once by `store`, and
+    `load` maps the segment and returns the arrays viewing it without copying, so that a large
+    matrix is shared by the tasks running on the other processes of the same machine. The storage
+    only keeps a small manifest of the layout. Objects are also accepted within dict, list and
+    tuple, and the other objects, e.g. object dtype columns and indexes, are kept in the manifest.
+
+    Loaded arrays are read-only, since every consumer maps the same memory.
+
+    The segment is freed by `remove`, which is called by alexflow executor once all the tasks
+    referring to the output as ephemeral are completed. Otherwise the segment is kept until removed
+    or the machine restarts, so it is intended to be used as ephemeral output.
+
+    Examples:
+        >>> task.build_output(output_class=SharedMemoryOutput, key="features")
+    """
+
+    def store(self, data):
+        assert self.storage is not None, f"storage must be given for {self.key}"
+        assert (
+            SharedMemory is not None
+        ), "SharedMemoryOutput requires Python 3.8 or later"
+
+        # Segment of the previous data is replaced.
+        self._unlink()
+
+        arrays: List[np.ndarray] = []
+        layout = _to_layout(data, arrays)
+
+        offsets = []
+        size = 0
+        for array in arrays:
+            offsets.append(size)
+            size += -(-array.nbytes // _ALIGNMENT) * _ALIGNMENT
+
+        segment = _open(
+            name=f"af_{secrets.token_hex(8)}", create=True, size=max(size, 1)
+        )
+
+        try:
+            for array, offset in zip(arrays, offsets):
+                view = np.ndarray(
+                    array.shape, dtype=array.dtype, buffer=segment.buf, offset=offset
+                )
+                view[...] = array
+                del view
+        finally:
+            segment.close()
+
+        manifest = {"segment": segment.name, "offsets": offsets, "layout": layout}
+
+        with self.storage.path(self.key, mode="w") as path:
+            joblib.dump(manifest, path)
+
+    def load(self):
+        assert self.storage is not None, f"storage must be given for {self.key}"
+
+        manifest = self._manifest()
+        assert manifest is not None, f"{self.key} is not stored"
+
+        segment = _open(name=manifest["segment"])
+
+        return _from_layout(manifest["layout"], segment.buf, manifest["offsets"])
+
+    def exists(self) -> bool:
+        if not super().exists():
+            return False
+
+        manifest = self._manifest()
+        assert manifest is not None
+
+        try:
+            _open(name=manifest["segment"]).close()
+        except FileNotFoundError:
+            # The segment does not survive the restart of the machine.
+            return False
+
+        return True
+
+    def remove(self):
+        assert self.storage is not None, f"storage must be given for {self.key}"
+        self._unlink()
+        super().remove()
+
+    def _manifest(self) -> Optional[Dict[str, Any]]:
+        assert self.storage is not None, f"storage must be given for {self.key}"
+
+        if not self.storage.exists(self.key):
+            return None
+
+        with self.storage.path(self.key, mode="r") as path:
+            return joblib.load(path)
+
+    def _unlink(self) -> None:
+        manifest = self._manifest()
+
+        if manifest is None:
+            return
+
+        try:
+            segment = _open(name=manifest["segment"])
+        except FileNotFoundError:
+            return
+
+        segment.close()
+
+        if sys.version_info < (3, 13):
+            # Registered again to be unregistered by unlink, as the segments are not tracked.
+            resource_tracker.register(
+                segment._name, "shared_memory"  # type: ignore
+            )
+
+        segment.unlink()
+
+
+if SharedMemory is not None:
+
+    class _Segment(SharedMemory):
+        """Segment whose mapping is not closed by the garbage collection.
+
+        Arrays viewing the segment keep its mapping alive, and it is unmapped when they are freed.
+        """
+
+        def __del__(self):
+            if self._fd >= 0:
+                os.close(self._fd)
+                self._fd = -1
+
+
+def _open(name: str, create: bool = False, size: int = 0) -> "SharedMemory":
+    """Segment which outlives the process, not unlinked by the resource tracker at exit."""
+    if sys.version_info >= (3, 13):
+        return _Segment(name=name, create=create, size=size, track=False)
+
+    segment = _Segment(name=name, create=create, size=size)
+    resource_tracker.unregister(segment._name, "shared_memory")  # type: ignore
+    return segment
+
+
+def _to_layout(data: Any, arrays: List[np.ndarray]) -> Tuple:
+    """Layout of the data, with its arrays appended to the list to be copied into the segment."""
+    if isinstance(data, pd.DataFrame):
+        return (
+            "dataframe",
+            [_to_layout(data.iloc[:, i], arrays)[1] for i in range(data.shape[1])],
+            data.index,
+            data.columns,
+        )
+
+    if isinstance(data, pd.Series):
+        if isinstance(data.dtype, np.dtype) and not data.dtype.hasobject:
+            values = _to_layout(data.to_numpy(), arrays)
+        else:
+            # Extension arrays, e.g. categorical, are kept as they are.
+            values = ("object", data.array)
+        return ("series", values, data.index, data.name)
+
+    if isinstance(data, np.ndarray) and not data.dtype.hasobject and data.size > 0:
+        arrays.append(np.ascontiguousarray(data))
+        return ("ndarray", len(arrays) - 1, data.dtype.str, data.shape)
+
+    if isinstance(data, dict):
+        return ("dict", {key: _to_layout(value, arrays) for key, value in data.items()})
+
+    if isinstance(data, (list, tuple)) and not hasattr(data, "_fields"):
+        return (type(data).__name__, [_to_layout(value, arrays) for value in data])
+
+    return ("object", data)
+
+
+def _from_layout(layout: Tuple, buffer: memoryview, offsets: List[int]) -> Any:
+    kind = layout[0]
+
+    if kind == "dataframe":
+        _, columns, index, names = layout
+        df = pd.DataFrame(
+            {
+                i: _from_layout(column, buffer, offsets)
+                for i, column in enumerate(columns)
+            },
+            index=index,
+            copy=False,
+        )
+        df.columns = names
+        return df
+
+    if kind == "series":
+        _, values, index, name = layout
+        return pd.Series(
+            _from_layout(values, buffer, offsets), index=index, name=name, copy=False
+        )
+
+    if kind == "ndarray":
+        _, i, dtype, shape = layout
+        array = np.ndarray(
+            shape, dtype=np.dtype(dtype), buffer=buffer, offset=offsets[i]
+        )
+        array.flags.writeable = False
+        return array
+
+    if kind == "dict":
+        return {
+            key: _from_layout(value, buffer, offsets)
+            for key, value in layout[1].items()
+        }
+
+    if kind == "list":
+        return [_from_layout(value, buffer, offsets) for value in layout[1]]
+
+    if kind == "tuple":
+        return tuple(_from_layout(value, buffer, offsets) for value in layout[1])
+
+    return layout[1]
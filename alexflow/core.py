@@ -1,4 +1,5 @@
 from abc import abstractmethod
+from contextlib import contextmanager
 from dataclasses import dataclass, field, fields, replace
 from typing import (
     Union,
@@ -11,13 +12,17 @@ from typing import (
     Set,
     ContextManager,
     Any,
+    Iterator,
 )
 
+import contextvars
 import hashlib
 import json
 import shutil
+import struct
 import types
-from datetime import datetime
+from datetime import date, datetime
+from decimal import Decimal
 
 import joblib
 from cached_property import cached_property
@@ -171,6 +176,9 @@ T_out = TypeVar("T_out", bound=Output)
 
 @dataclass(frozen=True)
 class AbstractTask(Serializable):
+    # Version of the calculation of task_id. None for the tasks created before 1.0.0, and "2.0.0"
+    # hashes the canonical binary encoding of the fields, which is faster for large parameters.
+    # Opt in by overriding the default of the field in the task class.
     _task_spec: Optional[str] = field(default="1.0.0", compare=False, repr=False)
 
     def input(self) -> InOut:
@@ -206,6 +214,43 @@ class AbstractTask(Serializable):
         """
         return set()
 
+    @property
+    def resource_usage(self) -> Dict[str, float]:
+        """Amount of the resource used by the task per tag.
+
+        The concurrency of tasks per tag is limited by the sum of the amounts of running tasks, so
+        that a task can hold several slots of the shared resource, e.g. {"db_connection": 4}. Each
+        tag of the task uses one slot by default.
+        """
+        return {tag: 1 for tag in self.tags}
+
+    @property
+    def priority(self) -> int:
+        """Priority of the task on the execution.
+
+        Among the tasks ready to be executed, tasks with the higher priority is executed first. It is
+        supported by alexflow executor.
+        """
+        return 0
+
+    @property
+    def cost_hint(self) -> Optional[float]:
+        """Expected seconds to complete the task.
+
+        Used to find the critical path of the workflow by alexflow executor, which executes the tasks
+        on the longest path first. The duration recorded for the class of the task is used if None.
+        """
+        return None
+
+    @property
+    def execution_timeout(self) -> Optional[float]:
+        """Seconds the task can run, named not to collide with `timeout` fields of tasks.
+
+        The task exceeding the timeout is cancelled and failed by alexflow executor. The default
+        timeout of the executor is applied if None.
+        """
+        return None
+
     def build_output(
         self,
         output_class: Type[T_out],
@@ -214,9 +259,17 @@ class AbstractTask(Serializable):
         **kwargs,
     ) -> T_out:
         """Create the Output class with prefix of task_id.
+
+        Within `interning`, the task and the output are replaced with their canonical instances.
         """
-        key = self.task_id + "." + key
-        return output_class(src_task=self, key=key, storage=storage, **kwargs)  # type: ignore
+        interner = _INTERNER.get()
+
+        task = self if interner is None else interner.intern(self)
+
+        key = task.task_id + "." + key
+        output = output_class(src_task=task, key=key, storage=storage, **kwargs)  # type: ignore
+
+        return output if interner is None else interner.intern(output)
 
 
 @dataclass(frozen=True)
@@ -338,14 +391,323 @@ class Workflow(Serializable):
         return list(tasks.values())
 
 
+class Interner:
+    """Registry of the canonical instances of tasks and outputs.
+
+    Equal tasks constructed many times, e.g. the same upstream task created by each downstream
+    task, are replaced with one instance, so that each distinct task is held in memory and its
+    task_id is calculated only once. Tasks and outputs are equal when they are of the same class
+    and the fields given to the constructor are equal, including the ones not used by task_id,
+    e.g. `Output.ephemeral`. The tasks and outputs in the fields are compared by identity, as
+    they are interned beforehand.
+
+    The canonical instances are kept until the interner is freed, so use one per workflow.
+
+    Examples:
+        >>> with interning() as interner:
+        ...     tasks = [Train(features=Features(day=day).output(), seed=seed) for ...]
+        >>> deduplicated = Interner().intern(deserialize(workflow_json))
+    """
+
+    def __init__(self):
+        # key = class and keys of the field values, value = canonical instance.
+        self._objects: Dict[Tuple, Any] = {}
+        # id of the canonical instances, kept alive by `_objects`.
+        self._canonical: Set[int] = set()
+
+    def __len__(self) -> int:
+        return len(self._objects)
+
+    def intern(self, value: T) -> T:
+        """Canonical instance of the task or output, or the structure of them.
+
+        The upstream tasks and outputs are interned first, and the values referring to them are
+        rebuilt with the canonical ones. Tasks with unhashable fields, and the tasks referring to
+        them, are left as they are.
+        """
+        if id(value) in self._canonical:
+            return value
+
+        if isinstance(value, (AbstractTask, Output)):
+            # Fast path for the fields referring only to the canonical instances, e.g. of the task
+            # built within `interning`.
+            canonical = self._register(value)
+            if id(canonical) in self._canonical:
+                return canonical
+
+        # key = id of the value, value = interned one, for the values visited by this call.
+        interned: Dict[int, Any] = {}
+
+        # (value, whether its items are interned), traversed without recursion for deep chains.
+        stack: List[Tuple[Any, bool]] = [(value, False)]
+
+        while len(stack) > 0:
+            item, expanded = stack.pop()
+
+            if expanded:
+                interned[id(item)] = self._rebuild(item, interned)
+                continue
+
+            if id(item) in interned:
+                continue
+
+            items = self._items(item)
+
+            if items is None:
+                interned[id(item)] = item
+            elif len(items) == 0:
+                interned[id(item)] = self._rebuild(item, interned)
+            else:
+                stack.append((item, True))
+                stack.extend((child, False) for child in items)
+
+        return interned[id(value)]
+
+    def _items(self, value) -> Optional[List[Any]]:
+        """Values to intern before the value, or None if the value is not interned nor rebuilt."""
+        if isinstance(value, _ATOMIC) or id(value) in self._canonical:
+            return None
+
+        if isinstance(value, Serializable):
+            items = [getattr(value, name) for name in _init_fields(type(value))]
+        elif isinstance(value, (list, tuple, dict)):
+            items = list(value.values() if isinstance(value, dict) else value)
+
+            # Items of a primitive type, e.g. a long list of names, do not refer to tasks.
+            if _sortable_type(items) is not None:
+                return None
+        else:
+            return None
+
+        return [
+            item
+            for item in items
+            if not isinstance(item, _ATOMIC) and id(item) not in self._canonical
+        ]
+
+    def _rebuild(self, value, interned: Dict[int, Any]):
+        """Value referring to the interned items, registered if it is a task or output."""
+        if isinstance(value, Serializable):
+            changes = {}
+            for name in _init_fields(type(value)):
+                item = getattr(value, name)
+                if interned.get(id(item), item) is not item:
+                    changes[name] = interned[id(item)]
+
+            if len(changes) > 0:
+                value = replace(value, **changes)
+
+            if isinstance(value, (AbstractTask, Output)):
+                return self._register(value)
+
+            return value
+
+        values = list(value.values()) if isinstance(value, dict) else value
+        items = [interned.get(id(item), item) for item in values]
+
+        if all(a is b for a, b in zip(items, values)):
+            return value
+
+        if isinstance(value, dict):
+            return dict(zip(value.keys(), items))
+
+        if hasattr(value, "_fields"):
+            # Case of namedtuple
+            return value.__class__(*items)
+
+        return value.__class__(items)
+
+    def _register(self, value):
+        """Canonical instance equal to the task or output, which is the value if registered first."""
+        try:
+            key = self._fields_key(value)
+        except (TypeError, LookupError):
+            return value
+
+        canonical = self._objects.setdefault(key, value)
+
+        if canonical is value:
+            self._canonical.add(id(value))
+
+        return canonical
+
+    def _key(self, value) -> Any:  # noqa: C901
+        """Hashable key equal only for the values which make the same task.
+
+        Raises:
+            TypeError: The value is not hashable.
+            LookupError: The value refers to the task or output which is not interned.
+        """
+        cls = value.__class__
+
+        # Type is kept as 1 == 1.0 == True.
+        if cls in _HASHABLE_TYPES:
+            return (cls, value)
+
+        if id(value) in self._canonical:
+            return id(value)
+
+        if isinstance(value, (AbstractTask, Output)):
+            raise LookupError(f"{cls.__name__} is not interned")
+
+        if isinstance(value, float):
+            # hex distinguishes -0.0 from 0.0.
+            return (cls, value.hex())
+
+        if isinstance(value, datetime):
+            # Aware datetimes in the different timezones are equal, but not their offsets.
+            return (cls, value, value.utcoffset())
+
+        if isinstance(value, date):
+            return (cls, value)
+
+        if isinstance(value, Serializable):
+            return self._fields_key(value)
+
+        if isinstance(value, (list, tuple)):
+            return (cls, self._sequence_key(value))
+
+        if isinstance(value, dict):
+            return (
+                dict,
+                self._sequence_key(list(value)),
+                self._sequence_key(list(value.values())),
+            )
+
+        if isinstance(value, (set, frozenset)):
+            return (cls, frozenset(map(self._key, value)))
+
+        hash(value)
+
+        return (cls, value)
+
+    def _sequence_key(self, values) -> Tuple:
+        item_type = _sortable_type(values)
+
+        if item_type is None:
+            return tuple(map(self._key, values))
+
+        # Items of the same primitive type, e.g. a long list of names, are converted at once.
+        if item_type is float:
+            return (float, struct.pack(f">{len(values)}d", *values))
+
+        if item_type is datetime:
+            return (datetime, tuple(values), tuple(map(datetime.utcoffset, values)))
+
+        return (item_type, tuple(values))
+
+    def _fields_key(self, value: Serializable) -> Tuple:
+        return (
+            value.__class__,
+            tuple(
+                self._key(getattr(value, name)) for name in _init_fields(type(value))
+            ),
+        )
+
+
+# Types of the values used as they are by the key of `Interner`.
+_HASHABLE_TYPES = (str, int, bool, bytes, type(None))
+
+_INTERNER: contextvars.ContextVar[Optional[Interner]] = contextvars.ContextVar(
+    "alexflow_interner", default=None
+)
+
+
+@contextmanager
+def interning(interner: Optional[Interner] = None) -> Iterator[Interner]:
+    """Intern the tasks and outputs created by `AbstractTask.build_output` within the context.
+
+    Args:
+        interner: Interner to register the instances, a new one if None.
+
+    Returns:
+        Context of the interner.
+    """
+    if interner is None:
+        interner = Interner()
+
+    token = _INTERNER.set(interner)
+
+    try:
+        yield interner
+    finally:
+        _INTERNER.reset(token)
+
+
+# key = class, value = names of the fields given to the constructor.
+_INIT_FIELDS: Dict[type, List[str]] = {}
+
+
+def _init_fields(cls: type) -> List[str]:
+    names = _INIT_FIELDS.get(cls)
+
+    if names is None:
+        names = [_field.name for _field in fields(cls) if _field.init]
+        _INIT_FIELDS[cls] = names
+
+    return names
+
+
 def _create_task_id(obj, spec: Optional[str]) -> str:
 
+    _resolve_upstream_task_ids(obj)
+
     if spec is None:
         return _create_task_id_spec_v0(obj)
 
+    if spec == "2.0.0":
+        return _create_task_id_spec_v2(obj)
+
     return _create_task_id_spec_v1(obj)
 
 
+def _resolve_upstream_task_ids(obj) -> None:  # noqa: C901
+    """Calculates task_id of the upstream tasks of the object, from the most upstream one.
+
+    task_id depends on task_id of the tasks referred by the fields, which is cached by each task.
+    The uncached ones are calculated here without recursion, so that a deep chain of tasks, e.g.
+    deserialized one, does not exceed the recursion limit, and the upstream of the cached ones are
+    never visited.
+    """
+    # (value, whether the upstream of the task is resolved)
+    stack: List[Tuple[Any, bool]] = [(obj, False)]
+    visited: Set[int] = set()
+
+    while len(stack) > 0:
+        value, resolved = stack.pop()
+
+        if resolved:
+            value.task_id
+            continue
+
+        if id(value) in visited:
+            continue
+        visited.add(id(value))
+
+        if isinstance(value, Output):
+            if "output_id" not in value.__dict__:
+                stack.append((value.src_task, False))
+            continue
+
+        if isinstance(value, AbstractTask) and value is not obj:
+            if "task_id" in value.__dict__:
+                continue
+            stack.append((value, True))
+
+        if isinstance(value, Serializable):
+            items: Any = [getattr(value, name) for name, _ in _id_fields(type(value))]
+        elif isinstance(value, (list, tuple, dict)):
+            items = value.values() if isinstance(value, dict) else value
+
+            # Items of a primitive type, e.g. a long list of names, do not refer to tasks.
+            if _sortable_type(items) is not None:
+                continue
+        else:
+            continue
+
+        stack.extend((item, False) for item in items if not isinstance(item, _ATOMIC))
+
+
 def _create_task_id_spec_v1(obj):
     """Calculates the unique_id for the Task.
 
@@ -371,7 +733,8 @@ def _create_task_id_spec_v1(obj):
 
     o = {}
 
-    value_map = obj.to_dict()
+    # Values are taken field by field, rather than `to_dict` which can copy the nested objects.
+    value_map = {_field.name: getattr(obj, _field.name) for _field in fields(obj)}
 
     for _field in fields(obj):
         if _field.name == "_task_spec":
@@ -432,7 +795,8 @@ def _create_task_id_spec_v0(obj):  # noqa: C901
 
     o = {}
 
-    value_map = obj.to_dict()
+    # Values are taken field by field, rather than `to_dict` which can copy the nested objects.
+    value_map = {_field.name: getattr(obj, _field.name) for _field in fields(obj)}
 
     for _field in fields(obj):
         # This field introduced from version 1.0 task spec, so ignore it for ver0 task_id calculation.
@@ -476,6 +840,186 @@ def _create_task_id_spec_v0(obj):  # noqa: C901
     )
 
 
+def _create_task_id_spec_v2(obj) -> str:
+    """Calculates the unique_id for the Task, by BLAKE2b of the canonical binary encoding.
+
+    Fields are selected as the spec v1 does, but encoded with the tags of the types in place of
+    JSON, so that large lists and dicts are neither converted to nested objects nor sorted as text.
+    """
+    parts: List[bytes] = []
+
+    _encode_fields(obj, parts)
+
+    basename = f"{obj.__class__.__module__}.{obj.__class__.__name__}"
+
+    return basename + "." + hashlib.blake2b(b"".join(parts), digest_size=20).hexdigest()
+
+
+def _encode_fields(obj, parts: List[bytes]) -> None:
+    header = len(parts)
+    parts.append(b"")
+
+    count = 0
+
+    for name, encoded_name in _id_fields(obj.__class__):
+        value = getattr(obj, name)
+
+        if value is None:
+            continue
+
+        count += 1
+        parts.append(encoded_name)
+
+        if isinstance(value, AbstractTask):
+            parts.append(b"r" + _netstring(value.task_id.encode("utf-8")))
+        else:
+            _encode(value, parts)
+
+    parts[header] = b"{" + str(count).encode() + b":"
+
+
+# key = class, value = names of the fields used by task_id, ordered by the names, with the names
+# encoded for the spec v2.
+_ID_FIELDS: Dict[type, List[Tuple[str, bytes]]] = {}
+
+
+def _id_fields(cls: type) -> List[Tuple[str, bytes]]:
+    names = _ID_FIELDS.get(cls)
+
+    if names is None:
+        names = [
+            (_field.name, _netstring(_field.name.encode("utf-8")))
+            for _field in sorted(fields(cls), key=lambda _field: _field.name)
+            if _field.name != "_task_spec" and _field.compare
+        ]
+        _ID_FIELDS[cls] = names
+
+    return names
+
+
+def _encode(value, parts: List[bytes]) -> None:  # noqa: C901
+    """Appends the canonical binary encoding of the value, a tag of the type and the content."""
+    # bool is checked before int, which is its base class.
+    if value is None:
+        parts.append(b"N")
+    elif value is True:
+        parts.append(b"T")
+    elif value is False:
+        parts.append(b"F")
+    elif isinstance(value, int):
+        parts.append(b"i" + str(int(value)).encode() + b";")
+    elif isinstance(value, float):
+        parts.append(b"f" + struct.pack(">d", value))
+    elif isinstance(value, str):
+        parts.append(b"s" + _netstring(value.encode("utf-8")))
+    elif isinstance(value, bytes):
+        parts.append(b"b" + _netstring(value))
+    elif isinstance(value, Output):
+        parts.append(b"o" + _netstring(value.output_id.encode("utf-8")))
+    elif isinstance(value, Serializable):
+        cls = value.__class__
+        parts.append(b"S" + _netstring(f"{cls.__module__}.{cls.__name__}".encode()))
+        _encode_fields(value, parts)
+    elif isinstance(value, (list, tuple)):
+        # Lists and tuples are not distinguished as JSON of the spec v1.
+        _encode_sequence(value, parts)
+    elif isinstance(value, dict):
+        _encode_mapping(value, parts)
+    elif isinstance(value, (set, frozenset)):
+        if _sortable_type(value) is not None:
+            parts.append(b"E")
+            _encode_sequence(sorted(value), parts)
+        else:
+            _encode_entries(b"e", [(item,) for item in value], parts)
+    elif isinstance(value, (datetime, date)):
+        parts.append(
+            (b"t" if isinstance(value, datetime) else b"a")
+            + _netstring(value.isoformat().encode())
+        )
+    elif isinstance(value, (type, types.FunctionType, types.ModuleType)):
+        parts.append(b"c" + _netstring(_serialize(value).encode("utf-8")))
+    elif isinstance(value, Decimal):
+        parts.append(b"n" + _netstring(str(value).encode()))
+    else:
+        raise TypeError(
+            f"{value.__class__.__name__} is not supported by task_id: {value!r}"
+        )
+
+
+def _encode_sequence(values, parts: List[bytes]) -> None:
+    """Encodes the items of the same primitive type at once, e.g. long lists of names or dates."""
+    header = str(len(values)).encode() + b":"
+
+    item_type = _sortable_type(values)
+
+    if item_type is str:
+        # Lengths are in code points, which split the concatenated text unambiguously.
+        parts.append(b"Ls" + header)
+        parts.append(_netstring(",".join(map(str, map(len, values))).encode()))
+        parts.append(_netstring("".join(values).encode("utf-8")))
+    elif item_type is int:
+        parts.append(b"Li" + header + _netstring(",".join(map(str, values)).encode()))
+    elif item_type is float:
+        parts.append(b"Lf" + header + struct.pack(f">{len(values)}d", *values))
+    elif item_type in (datetime, date):
+        parts.append(
+            (b"Lt" if item_type is datetime else b"La")
+            + header
+            + _netstring(",".join(item.isoformat() for item in values).encode())
+        )
+    else:
+        parts.append(b"l" + header)
+        for item in values:
+            _encode(item, parts)
+
+
+def _encode_mapping(value: dict, parts: List[bytes]) -> None:
+    if _sortable_type(value) is not None:
+        keys = sorted(value)
+        parts.append(b"D")
+        _encode_sequence(keys, parts)
+        _encode_sequence([value[key] for key in keys], parts)
+    else:
+        _encode_entries(b"d", list(value.items()), parts)
+
+
+def _encode_entries(tag: bytes, entries: List[tuple], parts: List[bytes]) -> None:
+    """Encodes the entries of a dict or set, ordered by their encodings."""
+    encoded = []
+
+    for entry in entries:
+        entry_parts: List[bytes] = []
+        for item in entry:
+            _encode(item, entry_parts)
+        encoded.append(b"".join(entry_parts))
+
+    parts.append(tag + str(len(encoded)).encode() + b":")
+    parts.extend(sorted(encoded))
+
+
+# Types of the values which do not refer to tasks.
+_ATOMIC = (str, int, float, bytes, datetime, date, type(None))
+
+# Types of the items encoded at once, which are also sortable to order the keys of dicts and sets.
+_SORTABLE_TYPES = (str, int, float, datetime, date)
+
+
+def _sortable_type(values) -> Optional[type]:
+    """Type of all the items if it is one of `_SORTABLE_TYPES`, otherwise None."""
+    item_types = set(map(type, values))
+
+    if len(item_types) != 1:
+        return None
+
+    (item_type,) = item_types
+
+    return item_type if item_type in _SORTABLE_TYPES else None
+
+
+def _netstring(data: bytes) -> bytes:
+    return str(len(data)).encode() + b":" + data
+
+
 def _serialize(x):
     if isinstance(x, (type, types.FunctionType)):
         return f"{x.__module__}:{x.__name__}"
@@ -1,4 +1,5 @@
-from typing import List, Optional, Union, Dict, TypeVar
+from typing import List, Optional, Union, Dict, TypeVar, Callable
+from functools import partial
 
 from .core import (
     Output,
@@ -17,24 +18,28 @@ T_io = TypeVar("T_io", bound=InOut)
 
 
 def assign_storage_to_output(output: T_io, storage: Storage) -> T_io:
+    return map_output(output, lambda item: item.assign_storage(storage))
+
+
+def map_output(output: T_io, func: Callable[[Output], Output]) -> T_io:
+    """Apply the function to each Output in the structure of inout, keeping the structure."""
     if isinstance(output, Output):
-        return output.assign_storage(storage)
+        return func(output)  # type: ignore
     elif isinstance(output, dict):
         return {  # type: ignore
-            key: assign_storage_to_output(value, storage)
-            for key, value in output.items()
+            key: map_output(value, func) for key, value in output.items()
         }
     elif isinstance(output, (list, tuple)):
         # Case of namedtuple
         if hasattr(output, "_fields"):
             return output.__class__(  # type: ignore
                 **{  # type: ignore
-                    key: assign_storage_to_output(value, storage)
+                    key: map_output(value, func)
                     for key, value in zip(output._fields, output)  # type: ignore
                 }
             )
         return output.__class__(  # type: ignore
-            assign_storage_to_output(value, storage) for value in output  # type: ignore
+            map_output(value, func) for value in output  # type: ignore
         )
     else:
         assert output is None, f"output value ({output}) must to be Output object"
@@ -47,13 +52,25 @@ def flatten(inout: Optional[InOut]) -> List[Output]:
     return _flatten(inout)
 
 
-def is_completed(task: AbstractTask, storage: Storage) -> bool:
+def is_completed(
+    task: AbstractTask,
+    storage: Storage,
+    exists: Optional[Callable[[Output], bool]] = None,
+) -> bool:
     """Respond the completion status of the task.
 
+    Args:
+        task: Task to check.
+        storage: Storage where the outputs are stored.
+        exists: Function to check the existence of an output, used instead of `exists_output` if given.
+
     Notes:
         If there is no outputs given, then the task will
         always executed.
     """
+    if exists is None:
+        exists = partial(exists_output, storage=storage)
+
     try:
         outputs = task.output()
 
@@ -66,19 +83,16 @@ def is_completed(task: AbstractTask, storage: Storage) -> bool:
                 assert isinstance(tasks, AbstractTask)
                 tasks = [tasks]
 
-            return all([is_completed(task, storage=storage) for task in tasks])
+            return all(
+                [is_completed(task, storage=storage, exists=exists) for task in tasks]
+            )
 
         if outputs is None:
             return False
 
         output_list: List[Output] = flatten(outputs)
 
-        return all(
-            [
-                assign_storage_to_output(output, storage).exists()
-                for output in output_list
-            ]
-        )
+        return all([exists(output) for output in output_list])
     except NotFound:
         return False
 
@@ -0,0 +1,133 @@
+"""Makespan of synthetic unbalanced DAGs by the ordering of ready tasks.
+
+By default the execution is simulated with the dependency graph of alexflow executor and a virtual
+clock, so that only the ordering affects the makespan. With --run, the workflow is executed with
+sleeping tasks instead, with durations scaled by --unit seconds.
+
+Usage:
+    python -m benchmarks.critical_path --workers 4
+    python -m benchmarks.critical_path --workers 4 --run --unit 0.05
+"""
+import argparse
+import heapq
+import random
+import tempfile
+import time
+from typing import List
+
+from alexflow import Workflow
+from alexflow.adapters.executor.alexflow import run_workflow
+from alexflow.adapters.executor._dependency_graph import DependencyGraph
+from alexflow.adapters.executor._duration_history import DurationHistory
+from alexflow.adapters.storage.local_storage import LocalStorage
+
+from benchmarks.tasks import Sleep
+
+
+def long_pole(unit: float) -> List[Sleep]:
+    """Many short independent tasks listed before a long chain."""
+    tasks = [Sleep(name=f"short-{i}", duration=unit) for i in range(40)]
+
+    task = Sleep(name="pole-0", duration=unit)
+    for i in range(1, 10):
+        task = Sleep(name=f"pole-{i}", duration=unit, parents=(task.output(),))
+
+    return tasks + [task]
+
+
+def random_dag(unit: float, seed: int = 0) -> List[Sleep]:
+    """Layered random DAG, with heavy-tailed durations and a few long chains."""
+    rng = random.Random(seed)
+
+    layers: List[List[Sleep]] = []
+    for depth in range(8):
+        layer = []
+        for i in range(rng.randint(2, 12)):
+            parents = []
+            if depth > 0:
+                candidates = [task for prev in layers for task in prev]
+                parents = rng.sample(
+                    candidates, k=min(len(candidates), rng.randint(1, 3))
+                )
+            layer.append(
+                Sleep(
+                    name=f"random-{depth}-{i}",
+                    duration=unit * rng.lognormvariate(0, 1),
+                    parents=tuple(task.output() for task in parents),
+                )
+            )
+        layers.append(layer)
+
+    tasks = [task for layer in layers for task in layer]
+
+    for c in range(3):
+        task = Sleep(name=f"chain-{c}-0", duration=unit)
+        for i in range(1, rng.randint(5, 15)):
+            task = Sleep(name=f"chain-{c}-{i}", duration=unit, parents=(task.output(),))
+        tasks.append(task)
+
+    return tasks
+
+
+DAGS = {"long_pole": long_pole, "random": random_dag}
+
+
+def simulate(tasks: List[Sleep], workers: int, ordering: str) -> float:
+    """Makespan by a virtual clock, where tasks take exactly their durations."""
+    cost = DurationHistory().estimate if ordering == "critical_path" else None
+
+    with tempfile.TemporaryDirectory() as d:
+        graph = DependencyGraph(
+            {task.task_id: task for task in tasks}, LocalStorage(d), cost=cost
+        )
+
+        clock = 0.0
+        running: list = []
+
+        while len(graph) > 0:
+            while len(running) < workers:
+                task = graph.pop_ready()
+                if task is None:
+                    break
+                heapq.heappush(running, (clock + task.duration, task.task_id))
+
+            clock, task_id = heapq.heappop(running)
+            graph.complete(task_id)
+
+    return clock
+
+
+def run(tasks: List[Sleep], workers: int, ordering: str) -> float:
+    with tempfile.TemporaryDirectory() as d:
+        workflow = Workflow(
+            storage=LocalStorage(d), tasks={task.task_id: task for task in tasks}
+        )
+        t = time.time()
+        run_workflow(workflow, n_jobs=workers, ordering=ordering, transport="queue")
+        return time.time() - t
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--run", action="store_true")
+    parser.add_argument("--unit", type=float, default=1.0)
+    args = parser.parse_args()
+
+    measure = run if args.run else simulate
+
+    for name, dag in DAGS.items():
+        tasks = dag(args.unit)
+
+        fifo = measure(tasks, args.workers, "fifo")
+        critical_path = measure(tasks, args.workers, "critical_path")
+
+        print(
+            f"{name:>10}: tasks={len(tasks)} workers={args.workers} "
+            f"fifo={fifo:.2f}s critical_path={critical_path:.2f}s "
+            f"improvement={(1 - critical_path / fifo) * 100:.1f}%"
+        )
+
+
+if __name__ == "__main__":
+    main()
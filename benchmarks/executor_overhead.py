@@ -0,0 +1,62 @@
+"""Per-task overhead of alexflow executor.
+
+Runs no-op tasks of a linear chain and a fan-out, and reports the wall time spent per task.
+
+Usage:
+    python -m benchmarks.executor_overhead --size 10000 --n-jobs 4
+"""
+import argparse
+import tempfile
+import time
+
+from alexflow import Workflow
+from alexflow.adapters.executor.alexflow import run_workflow
+from alexflow.adapters.storage.local_storage import LocalStorage
+
+from benchmarks.tasks import Source, Chain, Leaf
+
+
+def chain(size: int, storage: LocalStorage) -> Workflow:
+    task = Chain(index=size - 1)
+    return Workflow(storage=storage, tasks={task.task_id: task})
+
+
+def fanout(size: int, storage: LocalStorage) -> Workflow:
+    parent = Source().output()
+    tasks = [Leaf(parent=parent, index=i) for i in range(size - 1)]
+    return Workflow(storage=storage, tasks={task.task_id: task for task in tasks})
+
+
+SHAPES = {"chain": chain, "fanout": fanout}
+
+
+def measure(shape: str, size: int, n_jobs: int, **kwargs) -> float:
+    """Returns the seconds spent per task."""
+    with tempfile.TemporaryDirectory() as d:
+        workflow = SHAPES[shape](size, LocalStorage(base_path=d))
+
+        t = time.time()
+        run_workflow(workflow, n_jobs=n_jobs, **kwargs)
+        return (time.time() - t) / size
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--size", type=int, default=10000)
+    parser.add_argument("--n-jobs", type=int, default=4)
+    parser.add_argument(
+        "--shape", choices=list(SHAPES), nargs="*", default=list(SHAPES)
+    )
+    parser.add_argument("--transport", choices=["manager", "queue"], default="manager")
+    args = parser.parse_args()
+
+    for shape in args.shape:
+        sec = measure(shape, args.size, args.n_jobs, transport=args.transport)
+        print(
+            f"{shape:>8}: size={args.size} n_jobs={args.n_jobs} "
+            f"transport={args.transport} overhead={sec * 1000:.3f} ms/task"
+        )
+
+
+if __name__ == "__main__":
+    main()
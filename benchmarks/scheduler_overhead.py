@@ -0,0 +1,218 @@
+"""Scheduler overhead of the executors on synthetic DAGs of no-op tasks.
+
+Each case runs in a fresh process, and reports the wall time per task, the peak resident set size
+grown by the process running the scheduler, and the calls of the storage made by the process, with
+the calls by the tasks in case of sequential executor. Results are saved by --output, to compare
+them with the results of another commit by --compare.
+
+Usage:
+    python -m benchmarks.scheduler_overhead --size 1000
+    python -m benchmarks.scheduler_overhead --size 100000 --shape random --executor sequential
+    python -m benchmarks.scheduler_overhead --size 1000 --ephemeral --dynamic --output after.json \
+        --compare before.json
+"""
+import argparse
+import itertools
+import json
+import platform
+import resource
+import subprocess
+import tempfile
+import time
+from dataclasses import dataclass, asdict
+from typing import Any, Dict, List, Optional
+
+import multiprocess as mp
+
+from alexflow import Workflow
+from alexflow.adapters.executor import alexflow, luigi
+
+from benchmarks.storage import CALLS, CountingStorage
+from benchmarks.tasks import Expand, Node, sinks_of
+
+
+SHAPES = ["fanout", "chain", "diamond", "random"]
+
+EXECUTORS = ["sequential", "process", "luigi"]
+
+
+@dataclass(frozen=True)
+class Case:
+    executor: str
+    shape: str
+    size: int
+    n_jobs: int
+    ephemeral: bool = False
+    dynamic: bool = False
+
+    @property
+    def name(self) -> str:
+        flags = "".join(
+            f"+{flag}" for flag in ("ephemeral", "dynamic") if getattr(self, flag)
+        )
+        return f"{self.executor}/{self.shape}{flags}/{self.size}"
+
+
+def build(case: Case, storage: CountingStorage) -> Workflow:
+    if case.dynamic:
+        tasks: List[Any] = [
+            Expand(shape=case.shape, size=case.size, ephemeral=case.ephemeral)
+        ]
+    else:
+        tasks = [
+            Node(shape=case.shape, index=i, ephemeral=case.ephemeral)
+            for i in sinks_of(case.shape, case.size)
+        ]
+
+    return Workflow(storage=storage, tasks={task.task_id: task for task in tasks})
+
+
+def run(case: Case, transport: str) -> Dict[str, Any]:
+    """Runs the case in the current process, and returns the measurements."""
+    with tempfile.TemporaryDirectory() as d:
+        workflow = build(case, CountingStorage(base_path=d))
+
+        rss = _peak_rss()
+        CALLS.clear()
+
+        t = time.time()
+
+        if case.executor == "luigi":
+            luigi.run_workflow(workflow, n_jobs=case.n_jobs)
+        else:
+            alexflow.run_workflow(
+                workflow,
+                n_jobs=1 if case.executor == "sequential" else case.n_jobs,
+                transport=transport,
+            )
+
+        seconds = time.time() - t
+
+    # Expand and Gather run in addition to the nodes.
+    n_tasks = case.size + (2 if case.dynamic else 0)
+
+    return {
+        **asdict(case),
+        "tasks": n_tasks,
+        "seconds": seconds,
+        "overhead_ms": seconds / n_tasks * 1000,
+        "peak_rss_growth_mb": (_peak_rss() - rss) / 2 ** 20,
+        "storage_calls": dict(CALLS),
+    }
+
+
+def _run_in_child(conn, case: Case, transport: str):
+    conn.send(run(case, transport))
+    conn.close()
+
+
+def measure(case: Case, transport: str) -> Dict[str, Any]:
+    """Runs the case in a new process, so that the peak memory is not shared by the cases."""
+    context = mp.get_context("fork")
+
+    receiver, sender = context.Pipe(duplex=False)
+
+    process = context.Process(target=_run_in_child, args=(sender, case, transport))
+    process.start()
+    sender.close()
+
+    try:
+        return receiver.recv()
+    finally:
+        process.join()
+
+
+def _peak_rss() -> int:
+    """Peak resident set size of the current process in bytes, which is given in KiB on Linux."""
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    return peak if platform.system() == "Darwin" else peak * 1024
+
+
+def _commit() -> Optional[str]:
+    try:
+        return subprocess.check_output(
+            ["git", "rev-parse", "--short", "HEAD"],
+            text=True,
+            stderr=subprocess.DEVNULL,
+        ).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+
+def compare(results: List[Dict[str, Any]], path: str) -> None:
+    with open(path) as f:
+        baseline = json.load(f)
+
+    keys = list(asdict(Case("", "", 0, 0)))
+    before = {tuple(r[k] for k in keys): r for r in baseline["results"]}
+
+    print(f"\ncompared with {baseline.get('commit')} ({path})")
+
+    for result in results:
+        prev = before.get(tuple(result[k] for k in keys))
+
+        if prev is None:
+            continue
+
+        print(
+            f"{Case(**{k: result[k] for k in keys}).name:>40}: "
+            f"overhead x{result['overhead_ms'] / prev['overhead_ms']:.2f} "
+            f"({prev['overhead_ms']:.3f} -> {result['overhead_ms']:.3f} ms/task), "
+            f"peak rss {prev['peak_rss_growth_mb']:.1f} -> "
+            f"{result['peak_rss_growth_mb']:.1f} MiB"
+        )
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--size", type=int, nargs="*", default=[1000])
+    parser.add_argument("--n-jobs", type=int, default=4)
+    parser.add_argument("--shape", choices=SHAPES, nargs="*", default=SHAPES)
+    parser.add_argument("--executor", choices=EXECUTORS, nargs="*", default=EXECUTORS)
+    parser.add_argument("--transport", choices=["manager", "queue"], default="manager")
+    parser.add_argument(
+        "--ephemeral", action="store_true", help="refer the parents as ephemeral"
+    )
+    parser.add_argument(
+        "--dynamic", action="store_true", help="generate the DAG by DynamicTask"
+    )
+    parser.add_argument("--output", help="path to save the results as JSON")
+    parser.add_argument("--compare", help="path of the results to compare with")
+    args = parser.parse_args()
+
+    results = []
+
+    for executor, shape, size in itertools.product(
+        args.executor, args.shape, args.size
+    ):
+        case = Case(executor, shape, size, args.n_jobs, args.ephemeral, args.dynamic)
+
+        result = measure(case, args.transport)
+        results.append(result)
+
+        calls = " ".join(f"{k}={v}" for k, v in sorted(result["storage_calls"].items()))
+        print(
+            f"{case.name:>40}: overhead={result['overhead_ms']:.3f} ms/task "
+            f"peak_rss_growth={result['peak_rss_growth_mb']:.1f} MiB {calls}"
+        )
+
+    if args.output is not None:
+        with open(args.output, "w") as f:
+            json.dump(
+                {
+                    "commit": _commit(),
+                    "python": platform.python_version(),
+                    "n_jobs": args.n_jobs,
+                    "transport": args.transport,
+                    "results": results,
+                },
+                f,
+                indent=2,
+            )
+
+    if args.compare is not None:
+        compare(results, args.compare)
+
+
+if __name__ == "__main__":
+    main()
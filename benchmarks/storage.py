@@ -0,0 +1,29 @@
+"""Storage used by benchmarks."""
+from collections import Counter
+from dataclasses import dataclass
+
+from alexflow.adapters.storage.local_storage import LocalStorage
+
+
+# key = name of the method, value = number of the calls in the current process.
+CALLS: Counter = Counter()
+
+
+@dataclass(frozen=True)
+class CountingStorage(LocalStorage):
+    """LocalStorage counting the calls of the methods made in the current process."""
+
+    def exists(self, path: str) -> bool:
+        CALLS["exists"] += 1
+        return super().exists(path)
+
+    def remove(self, path: str) -> None:
+        CALLS["remove"] += 1
+        super().remove(path)
+
+    def path(self, path, mode="r"):
+        CALLS[f"path_{mode}"] += 1
+        return super().path(path, mode=mode)
+
+    def namespace(self, path: str) -> "CountingStorage":
+        return CountingStorage(base_path=self._namespaced_path(path))
@@ -0,0 +1,137 @@
+"""Time to calculate task_id of the tasks whose upstream task_id are not cached yet.
+
+Outputs are created without `build_output`, which calculates task_id of the task, so that the whole
+ancestry is calculated by task_id of the last task, as deserialized tasks are. Throughput of task_id
+is also measured for the tasks with large parameters, by each spec of task_id, and the fan-out
+whose shared upstream task with parameters is constructed by each downstream task, with and
+without interning.
+
+Usage:
+    python -m benchmarks.task_id --depth 10000 --width 100 --params 10000 --fanout 200000
+"""
+import argparse
+import contextlib
+import time
+from datetime import datetime, timedelta
+from typing import Tuple
+
+from alexflow import AbstractTask, BinaryOutput
+from alexflow.core import interning
+
+from benchmarks.tasks import Sleep, Features, Leaf
+
+
+def chain(depth: int) -> AbstractTask:
+    task = Sleep(name="0")
+    for i in range(1, depth):
+        task = Sleep(name=str(i), parents=(BinaryOutput(src_task=task, key="o"),))
+    return task
+
+
+def diamonds(depth: int, width: int) -> AbstractTask:
+    """Splits into the branches of the width and joins them, repeatedly."""
+    task = Sleep(name="join-0")
+    for i in range(1, depth):
+        branches = [
+            Sleep(
+                name=f"branch-{i}-{j}", parents=(BinaryOutput(src_task=task, key="o"),)
+            )
+            for j in range(width)
+        ]
+        task = Sleep(
+            name=f"join-{i}",
+            parents=tuple(BinaryOutput(src_task=b, key="o") for b in branches),
+        )
+    return task
+
+
+def measure(task: AbstractTask) -> float:
+    t = time.time()
+    task.task_id
+    return time.time() - t
+
+
+def params_throughput(size: int, spec: str, n_tasks: int = 20) -> float:
+    """task_id per second of the tasks with feature names and dates of the size."""
+    names = [f"feature_{i}" for i in range(size)]
+    dates = [datetime(2000, 1, 1) + timedelta(days=i) for i in range(size)]
+    weights = {name: float(i) for i, name in enumerate(names)}
+
+    # Tasks are created in advance, not to measure the construction.
+    tasks = [
+        Features(
+            name=str(i), names=names, dates=dates, weights=weights, _task_spec=spec,
+        )
+        for i in range(n_tasks)
+    ]
+
+    t = time.time()
+    for task in tasks:
+        task.task_id
+    return n_tasks / (time.time() - t)
+
+
+def fanout(n_tasks: int, size: int, interned: bool) -> Tuple[float, int]:
+    """Seconds to build the leaves sharing the upstream task with the parameters of the size.
+
+    The number of the distinct upstream objects held by the leaves is also returned.
+    """
+    names = tuple(f"feature_{i}" for i in range(size))
+    dates = tuple(datetime(2000, 1, 1) + timedelta(days=i) for i in range(size))
+
+    t = time.time()
+
+    with interning() if interned else contextlib.nullcontext():
+        leaves = [
+            Leaf(
+                parent=Features(name="shared", names=names, dates=dates).output(),
+                index=i,
+            )
+            for i in range(n_tasks)
+        ]
+        for leaf in leaves:
+            leaf.output()
+
+    sec = time.time() - t
+
+    return sec, len({id(leaf.parent.src_task) for leaf in leaves})
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--depth", type=int, default=10000)
+    parser.add_argument("--width", type=int, default=100)
+    parser.add_argument("--params", type=int, default=10000)
+    parser.add_argument("--fanout", type=int, default=200000)
+    args = parser.parse_args()
+
+    for spec in ["1.0.0", "2.0.0"]:
+        rate = params_throughput(args.params, spec)
+        print(f"  params: size={args.params} spec={spec} {rate:.1f} task_id/sec")
+
+    for interned in [False, True]:
+        sec, n_sources = fanout(args.fanout, 100, interned)
+        print(
+            f"  fanout: tasks={args.fanout} interning={interned} {sec:.3f} sec, "
+            f"{n_sources} upstream objects"
+        )
+
+    n_diamonds = max(args.depth // 100, 2)
+
+    for name, task, n_tasks in [
+        ("chain", chain(args.depth), args.depth),
+        (
+            "diamonds",
+            diamonds(n_diamonds, args.width),
+            n_diamonds + (n_diamonds - 1) * args.width,
+        ),
+    ]:
+        sec = measure(task)
+        print(
+            f"{name:>8}: tasks={n_tasks} {sec:.3f} sec, "
+            f"{n_tasks / sec:.0f} task_id/sec"
+        )
+
+
+if __name__ == "__main__":
+    main()
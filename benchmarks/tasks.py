@@ -0,0 +1,216 @@
+"""Synthetic tasks used by benchmarks.
+
+Upstream tasks are constructed on demand by `input()` from their index, so that
+building a very deep graph does not need to hold the whole ancestry in a single object.
+"""
+import random
+import time
+from dataclasses import dataclass, field
+from datetime import datetime
+from typing import Dict, List, Tuple
+from dataclass_serializer import no_default, NoDefaultVar
+
+from alexflow import Task, DynamicTask, BinaryOutput, Output
+
+
+@dataclass(frozen=True)
+class Source(Task):
+    name: str = "source"
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def run(self, input, output):
+        output.store(self.name)
+
+
+@dataclass(frozen=True)
+class Chain(Task):
+    """A link of linear chain, depends on the link with index - 1."""
+
+    index: NoDefaultVar[int] = no_default
+
+    def input(self):
+        if self.index == 0:
+            return None
+        return Chain(index=self.index - 1).output()
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def run(self, input, output):
+        output.store(self.index)
+
+
+@dataclass(frozen=True)
+class Leaf(Task):
+    """A leaf of fan-out, depends on a single shared parent."""
+
+    parent: NoDefaultVar[Output] = no_default
+    index: NoDefaultVar[int] = no_default
+
+    def input(self):
+        return self.parent
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def run(self, input, output):
+        output.store(self.index)
+
+
+@dataclass(frozen=True)
+class Sleep(Task):
+    """Sleeps for the duration, with the expected duration given as the cost hint."""
+
+    name: NoDefaultVar[str] = no_default
+    duration: float = 0.0
+    parents: Tuple[Output, ...] = ()
+
+    def input(self):
+        return list(self.parents)
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    @property
+    def cost_hint(self):
+        return self.duration
+
+    def run(self, input, output):
+        time.sleep(self.duration)
+        output.store(self.name)
+
+
+@dataclass(frozen=True)
+class Features(Task):
+    """Task with large list and dict parameters, e.g. feature names and date ranges."""
+
+    name: NoDefaultVar[str] = no_default
+    names: Tuple[str, ...] = ()
+    dates: Tuple[datetime, ...] = ()
+    weights: Dict[str, float] = field(default_factory=dict)
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+
+# Number of the branches of a diamond, between the split and the join.
+DIAMOND_WIDTH = 8
+
+# Max number of the parents of a node of random DAG.
+RANDOM_MAX_PARENTS = 3
+
+
+def parents_of(shape: str, index: int, seed: int = 0) -> List[int]:
+    """Indices of the parents of the node of synthetic DAG, which are always smaller than the index.
+
+    Shapes are "fanout", all depending on the node 0, "chain", each depending on the previous one,
+    "diamond", repeated splits into `DIAMOND_WIDTH` branches joined by the next split node, and
+    "random", depending on up to `RANDOM_MAX_PARENTS` random nodes before.
+    """
+    if index == 0:
+        return []
+
+    if shape == "fanout":
+        return [0]
+
+    if shape == "chain":
+        return [index - 1]
+
+    if shape == "diamond":
+        block, position = divmod(index, DIAMOND_WIDTH + 1)
+        if position > 0:
+            return [block * (DIAMOND_WIDTH + 1)]
+        return [
+            (block - 1) * (DIAMOND_WIDTH + 1) + i for i in range(1, DIAMOND_WIDTH + 1)
+        ]
+
+    if shape == "random":
+        rng = random.Random(f"{seed}-{index}")
+        k = min(index, rng.randint(1, RANDOM_MAX_PARENTS))
+        return sorted(rng.sample(range(index), k))
+
+    raise ValueError(f"unknown shape: {shape}")
+
+
+def sinks_of(shape: str, size: int, seed: int = 0) -> List[int]:
+    """Indices of the nodes nobody depends on, which are the targets of the DAG."""
+    has_dependents = set()
+
+    for index in range(size):
+        has_dependents.update(parents_of(shape, index, seed))
+
+    return [index for index in range(size) if index not in has_dependents]
+
+
+@dataclass(frozen=True)
+class Node(Task):
+    """A node of synthetic DAG, whose parents are constructed on demand by `parents_of`.
+
+    The outputs of the parents are referred as ephemeral if `ephemeral`, so that they are removed
+    once all the dependents are completed.
+    """
+
+    shape: NoDefaultVar[str] = no_default
+    index: NoDefaultVar[int] = no_default
+    seed: int = 0
+    ephemeral: bool = False
+
+    def input(self):
+        outputs = [
+            Node(
+                shape=self.shape, index=i, seed=self.seed, ephemeral=self.ephemeral
+            ).output()
+            for i in parents_of(self.shape, self.index, self.seed)
+        ]
+
+        if self.ephemeral:
+            return [output.as_ephemeral() for output in outputs]
+
+        return outputs
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def run(self, input, output):
+        output.store(self.index)
+
+
+@dataclass(frozen=True)
+class Expand(DynamicTask):
+    """Generates the sinks of synthetic DAG, to schedule the DAG found at runtime."""
+
+    shape: NoDefaultVar[str] = no_default
+    size: NoDefaultVar[int] = no_default
+    seed: int = 0
+    ephemeral: bool = False
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def generate(self, input, output):
+        sinks = [
+            Node(shape=self.shape, index=i, seed=self.seed, ephemeral=self.ephemeral)
+            for i in sinks_of(self.shape, self.size, self.seed)
+        ]
+        return Gather(
+            parents=tuple(task.output() for task in sinks), target=self.output()
+        )
+
+
+@dataclass(frozen=True)
+class Gather(Task):
+    """Writes the output of DynamicTask, once all the parents are completed."""
+
+    parents: Tuple[Output, ...] = ()
+    target: NoDefaultVar[Output] = no_default
+
+    def input(self):
+        return list(self.parents)
+
+    def output(self):
+        return self.target
+
+    def run(self, input, output):
+        output.store(len(input))
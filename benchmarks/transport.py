@@ -0,0 +1,93 @@
+"""Message throughput and latency of the transports between alexflow scheduler and workers.
+
+Workers echo back a DONE message for every RUN message, to measure the cost of the queues only.
+
+Usage:
+    python -m benchmarks.transport --messages 20000 --workers 4
+"""
+import argparse
+import time
+
+import multiprocess as mp
+
+from alexflow.adapters.executor.alexflow import QueueSet, Message, Kind
+
+from benchmarks.tasks import Leaf, Source
+
+
+def echo(q_set: QueueSet):
+    while True:
+        msg = q_set.q_in.get()
+        if msg is None:
+            return
+        q_set.q_out.put(Message(kind=Kind.DONE, content=msg.content))
+
+
+def _message(i: int) -> Message:
+    return Message(
+        kind=Kind.RUN, content={"task": Leaf(parent=Source().output(), index=i)}
+    )
+
+
+def measure(transport: str, messages: int, workers: int, round_trips: int):
+    """Returns messages per second through the queues, and seconds per round trip."""
+    context = mp.get_context()
+
+    manager = None
+    if transport == "manager":
+        manager = context.Manager()
+        q_set = QueueSet(manager)
+    else:
+        q_set = QueueSet(context)
+
+    procs = [context.Process(target=echo, args=(q_set,)) for _ in range(workers)]
+    for p in procs:
+        p.start()
+
+    try:
+        # Scheduler latency, the time until a dispatched message is acknowledged.
+        t = time.time()
+        for i in range(round_trips):
+            q_set.q_in.put(_message(i))
+            q_set.q_out.get()
+        latency = (time.time() - t) / round_trips
+
+        # Throughput, with all the workers busy.
+        t = time.time()
+        for i in range(messages):
+            q_set.q_in.put(_message(i))
+        for _ in range(messages):
+            q_set.q_out.get()
+        throughput = messages / (time.time() - t)
+    finally:
+        for _ in procs:
+            q_set.q_in.put(None)
+        for p in procs:
+            p.join()
+        if manager is not None:
+            manager.shutdown()
+        else:
+            q_set.close()
+
+    return throughput, latency
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.split("\n")[0])
+    parser.add_argument("--messages", type=int, default=20000)
+    parser.add_argument("--workers", type=int, default=4)
+    parser.add_argument("--round-trips", type=int, default=1000)
+    args = parser.parse_args()
+
+    for transport in ("manager", "queue"):
+        throughput, latency = measure(
+            transport, args.messages, args.workers, args.round_trips
+        )
+        print(
+            f"{transport:>8}: {throughput:,.0f} messages/sec, "
+            f"latency={latency * 1e6:.1f} us/round trip"
+        )
+
+
+if __name__ == "__main__":
+    main()
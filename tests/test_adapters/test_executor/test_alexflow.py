@@ -4,12 +4,29 @@ from dataclass_serializer import no_default, NoDefaultVar
 
 import pytest
 
+import os
 import time
+
+import multiprocess as mp
 from multiprocessing import get_context
 
-from alexflow import Task, BinaryOutput
+from alexflow import Task, DynamicTask, BinaryOutput, Output, ResourceSpec
 from alexflow.adapters.storage.local_storage import LocalStorage
-from alexflow.adapters.executor.alexflow import run_job
+from alexflow.adapters.executor._dependency_graph import DependencyGraph
+from alexflow.adapters.executor.alexflow import (
+    run_job,
+    BlockedTasks,
+    RecyclePolicy,
+    Metrics,
+    ResourceManager,
+    RetryPolicy,
+    TaskTimeout,
+    Termination,
+    Trace,
+    _pack_registry,
+    _share_registry,
+    _unpack_registry,
+)
 from alexflow.helper import is_completed, generate_task
 from alexflow.testing.tasks import Task1, Task2, DynamicTask1, WriteValue
 
@@ -178,6 +195,50 @@ def test_with_ephemeral_output_task(task, n_jobs, storage):
     ), "ephemeral output is already removed automatically"
 
 
+@dataclass(frozen=True)
+class CopyValue(Task):
+    parent: NoDefaultVar[Output] = no_default
+    target: NoDefaultVar[Output] = no_default
+
+    def input(self):
+        return self.parent
+
+    def output(self):
+        return self.target
+
+    def run(self, input, output):
+        output.store(input.load())
+
+
+@dataclass(frozen=True)
+class ConsumeLater(DynamicTask):
+    """Generates a consumer of the shared output after `parent`, which purges it, is done."""
+
+    parent: NoDefaultVar[Output] = no_default
+    shared: NoDefaultVar[Output] = no_default
+
+    def input(self):
+        return self.parent
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def generate(self, input, output):
+        return CopyValue(parent=self.shared, target=output)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_run_with_purged_output_consumed_by_generated_task(n_jobs, storage):
+    shared = Task1(name="shared").output().as_ephemeral()
+
+    task = ConsumeLater(parent=Task2(parent=shared).output(), shared=shared)
+
+    run_job(task, storage, n_jobs=n_jobs)
+
+    assert is_completed(task, storage)
+    assert task.output().assign_storage(storage).load() == {"name": "shared"}
+
+
 def _flush(storage: LocalStorage):
     for item in storage.list():
         storage.remove(item.path)
@@ -196,3 +257,639 @@ def test_run_with_context(method: str, storage):
 
     assert is_completed(task.input().src_task, storage)
     assert is_completed(task, storage)
+
+
+@pytest.mark.parametrize("method", ["spawn", "fork"])
+@pytest.mark.parametrize("transport", ["manager", "queue"])
+def test_run_with_transport(method: str, transport: str, storage):
+
+    task = Task2(parent=Task1().output())
+
+    run_job(task, storage, n_jobs=2, context=get_context(method), transport=transport)
+
+    assert is_completed(task.input().src_task, storage)
+    assert is_completed(task, storage)
+
+
+def test_run_deep_pipeline(storage):
+    task = Task1()
+    for i in range(100):
+        task = Task2(parent=task.output(), name=f"task{i}")
+
+    run_job(task, storage, n_jobs=2, transport="queue")
+
+    assert is_completed(task, storage)
+
+
+def test_run_deep_pipeline_with_spawn(storage):
+    task = Task1()
+    for i in range(300):
+        task = Task2(parent=task.output(), name=f"task{i}")
+
+    # Workers are started again by the recycles, with the registry pickled once.
+    run_job(
+        task,
+        storage,
+        n_jobs=2,
+        context=get_context("spawn"),
+        recycle_policy=RecyclePolicy(max_tasks=100),
+    )
+
+    assert is_completed(task, storage)
+
+
+def test_pack_registry_of_deep_chain():
+    tasks = [Task1()]
+    for i in range(3000):
+        tasks.append(Task2(parent=tasks[-1].output(), name=f"task{i}"))
+
+    registry = {task.task_id: task for task in reversed(tasks)}
+
+    unpacked = _unpack_registry(_pack_registry(registry))
+
+    assert list(unpacked) == list(registry)
+    assert unpacked[tasks[-1].task_id].parent.src_task is unpacked[tasks[-2].task_id]
+
+
+def test_share_registry():
+    registry = {Task1().task_id: Task1()}
+
+    fork = mp.get_context("fork")
+    spawn = mp.get_context("spawn")
+
+    # Forked processes inherit the registry as is.
+    assert _share_registry(registry, fork) is registry
+
+    packed = _share_registry(registry, spawn)
+    assert isinstance(packed, bytes)
+    assert _share_registry(packed, spawn) is packed
+    assert _share_registry(packed, fork) == registry
+
+
+def test_recycle_policy():
+    policy = RecyclePolicy(max_tasks=None, max_rss_growth=100, max_age=10.0)
+
+    assert policy.reason(n_tasks=1000, rss_growth=0, age=0.0) is None
+    assert policy.reason(n_tasks=0, rss_growth=100, age=0.0) == "max_rss_growth"
+    assert policy.reason(n_tasks=0, rss_growth=0, age=10.0) == "max_age"
+
+    assert RecyclePolicy().reason(n_tasks=30, rss_growth=0, age=0.0) == "max_tasks"
+
+
+def test_run_with_recycle_policy(storage):
+    task = Task2(parent=Task1().output())
+
+    metrics = Metrics()
+
+    run_job(
+        task,
+        storage,
+        n_jobs=2,
+        recycle_policy=RecyclePolicy(max_tasks=1),
+        metrics=metrics,
+    )
+
+    assert is_completed(task, storage)
+    assert metrics.get("worker_recycles", reason="max_tasks") >= 1
+
+
+def test_resource_manager_with_capacity():
+    def heavy(name):
+        return Task1(name=name, resource_spec=ResourceSpec(memory_requests="3Gi"))
+
+    def light(name):
+        return Task1(name=name, resource_spec=ResourceSpec(cpu_requests="500m"))
+
+    manager = ResourceManager({}, capacity={"cpu": 1, "memory": "4Gi"})
+
+    assert manager.is_runnable(heavy("1"))
+    manager.add(heavy("1"))
+
+    assert not manager.is_runnable(heavy("2"))
+    assert manager.is_runnable(light("1"))
+    assert manager.is_runnable(Task1(name="no-spec"))
+
+    manager.add(light("1"))
+    manager.add(light("2"))
+
+    assert not manager.is_runnable(light("3"))
+
+    manager.remove(heavy("1"))
+
+    assert manager.is_runnable(heavy("2"))
+
+    # Oversized request is admitted only when nothing else holds the capacity.
+    oversized = Task1(
+        name="oversized", resource_spec=ResourceSpec(memory_requests="8Gi")
+    )
+    assert manager.is_runnable(oversized)
+    manager.add(oversized)
+    assert not manager.is_runnable(heavy("2"))
+
+    with pytest.raises(ValueError):
+        ResourceManager({}, capacity={"disk": "1Ti"})
+
+
+def test_run_with_capacity(storage):
+    spec = ResourceSpec(cpu_requests="1", memory_requests="1G")
+
+    task = Task2(parent=Task1(resource_spec=spec).output(), resource_spec=spec)
+
+    run_job(task, storage, n_jobs=2, capacity={"cpu": "1500m", "memory": "1Gi"})
+
+    assert is_completed(task, storage)
+
+
+@dataclass(frozen=True)
+class Weighted(Task1):
+    connections: int = 1
+
+    @property
+    def tags(self):
+        return {"db_connection"}
+
+    @property
+    def resource_usage(self):
+        return {"db_connection": self.connections}
+
+
+def test_resource_manager_with_weighted_tags():
+    manager = ResourceManager({"db_connection": 8})
+
+    assert Task1().resource_usage == {}
+    assert Tagged(resources=["a", "b"], value="v").resource_usage == {"a": 1, "b": 1}
+
+    manager.add(Weighted(name="1", connections=4))
+    manager.add(Weighted(name="2", connections=3))
+
+    assert manager.is_runnable(Weighted(name="3", connections=1))
+    assert not manager.is_runnable(Weighted(name="3", connections=2))
+
+    manager.remove(Weighted(name="2", connections=3))
+
+    assert manager.is_runnable(Weighted(name="3", connections=4))
+
+    manager.remove(Weighted(name="1", connections=4))
+
+    # Oversized usage is admitted only when nothing else uses the resource.
+    assert manager.is_runnable(Weighted(name="4", connections=10))
+    manager.add(Weighted(name="4", connections=10))
+    assert not manager.is_runnable(Weighted(name="5", connections=1))
+
+
+def test_blocked_tasks_are_released_by_their_tag_in_order(storage):
+    tasks = [Tagged(resources=["a"], value=str(i)) for i in range(4)]
+    other = Tagged(resources=["b"], value="b")
+
+    graph = DependencyGraph({task.task_id: task for task in tasks + [other]}, storage)
+    manager = ResourceManager({"a": 1, "b": 1})
+    blocked = BlockedTasks(graph, manager)
+
+    order = [task for task in graph.ready_tasks() if task != other]
+
+    def dispatch():
+        admitted = []
+        while graph.has_ready():
+            task = graph.pop_ready()
+            if blocked.admit(task):
+                manager.add(task)
+                admitted.append(task)
+        return admitted
+
+    assert set(dispatch()) == {order[0], other}
+    assert len(blocked) == 3
+
+    # Tasks waiting for "a" are not released by the other tag.
+    manager.remove(other)
+    blocked.release(other)
+    assert not graph.has_ready()
+
+    for i in range(1, 4):
+        manager.remove(order[i - 1])
+        blocked.release(order[i - 1])
+
+        assert graph.ready_tasks() == [order[i]]
+        assert dispatch() == [order[i]]
+
+    assert len(blocked) == 0
+
+
+@dataclass(frozen=True)
+class Pid(Task):
+    name: NoDefaultVar[str] = no_default
+    io: bool = False
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    @property
+    def tags(self):
+        return {"io"} if self.io else set()
+
+    def run(self, input, output):
+        output.store(os.getpid())
+
+
+def test_run_with_thread_backend(storage):
+    task = Task2(parent=DynamicTask1(parent=Task1().output()).output())
+
+    run_job(task, storage, n_jobs=2, backend="thread")
+
+    assert is_completed(task, storage)
+
+    pid = Pid(name="thread")
+
+    run_job(pid, storage, n_jobs=2, backend="thread")
+
+    assert pid.output().assign_storage(storage).load() == os.getpid()
+
+
+def test_run_with_thread_tags(storage):
+    io = Pid(name="io", io=True)
+    cpu = Pid(name="cpu")
+
+    run_job([io, cpu], storage, n_jobs=2, thread_tags={"io"})
+
+    assert io.output().assign_storage(storage).load() == os.getpid()
+    assert cpu.output().assign_storage(storage).load() != os.getpid()
+
+
+def test_run_with_metrics(storage):
+    task = Task2(parent=Task1().output())
+
+    metrics = Metrics()
+
+    run_job(task, storage, n_jobs=2, metrics=metrics)
+
+    assert metrics.get("dispatch_window") >= 2
+    assert metrics.get("in_flight") == 1
+    assert metrics.get("idle_workers") == 1
+
+
+@dataclass(frozen=True)
+class Broken(Task):
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def run(self, input, output):
+        raise ValueError("broken")
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_run_with_keep_going(n_jobs, storage):
+    broken = Broken()
+    blocked = Task2(parent=broken.output())
+    healthy = Task2(parent=Task1().output())
+
+    report = run_job([blocked, healthy], storage, n_jobs=n_jobs, keep_going=True)
+
+    assert not report.succeeded
+    assert [failure.task for failure in report.failures] == [broken]
+    assert "ValueError: broken" in report.failures[0].trace
+    assert report.blocked == {broken.task_id: [blocked]}
+
+    assert is_completed(healthy, storage)
+    assert not is_completed(blocked, storage)
+
+
+@pytest.mark.parametrize("n_jobs, error", [(1, ValueError), (2, Termination)])
+def test_run_without_keep_going(n_jobs, error, storage):
+    with pytest.raises(error):
+        run_job(Task2(parent=Broken().output()), storage, n_jobs=n_jobs)
+
+
+@dataclass(frozen=True)
+class Flaky(Task):
+    """Fails until the given number of attempts, counted by marker files of the storage."""
+
+    failures: int = 1
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def run(self, input, output):
+        marker = os.path.join(output.storage.base_path, f"{self.task_id}.attempts")
+
+        attempts = 0
+        if os.path.exists(marker):
+            with open(marker) as f:
+                attempts = int(f.read())
+
+        with open(marker, "w") as f:
+            f.write(str(attempts + 1))
+
+        if attempts < self.failures:
+            raise IOError("flaky")
+
+        output.store(attempts)
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_run_with_retry_policy(n_jobs, storage):
+    task = Task2(parent=Flaky(failures=2).output())
+
+    metrics = Metrics()
+
+    run_job(
+        task,
+        storage,
+        n_jobs=n_jobs,
+        retry_policy=RetryPolicy(max_attempts=3, backoff=0.1),
+        metrics=metrics,
+    )
+
+    assert is_completed(task, storage)
+
+    key = "test_adapters.test_executor.test_alexflow.Flaky"
+    assert metrics.get("task_retries", task=key) == 2
+    assert metrics.get("task_attempts", task=key, outcome="failed") == 2
+    assert metrics.get("task_attempts", task=key, outcome="done") == 1
+
+
+def test_run_with_retry_policies(storage):
+    task = Task2(parent=Flaky(failures=2).output())
+
+    with pytest.raises(Termination):
+        run_job(
+            task,
+            storage,
+            n_jobs=2,
+            retry_policy=RetryPolicy(max_attempts=3, backoff=0.1),
+            retry_policies={Flaky: RetryPolicy(max_attempts=2, backoff=0.1)},
+        )
+
+
+@dataclass(frozen=True)
+class Hang(Task):
+    """Hangs on the first attempt, counted by a marker file of the storage."""
+
+    seconds: float = 60.0
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    @property
+    def execution_timeout(self):
+        return 1.0
+
+    def run(self, input, output):
+        marker = os.path.join(output.storage.base_path, f"{self.task_id}.started")
+
+        if not os.path.exists(marker):
+            open(marker, "w").close()
+            time.sleep(self.seconds)
+
+        output.store(self.seconds)
+
+
+def test_run_with_timeout(storage):
+    hang = Hang(seconds=30.0)
+    task = Task2(parent=hang.output())
+    healthy = Task2(parent=Task1().output())
+
+    metrics = Metrics()
+
+    t = time.time()
+
+    report = run_job(
+        [task, healthy], storage, n_jobs=2, keep_going=True, metrics=metrics,
+    )
+
+    assert time.time() - t < 15.0
+
+    assert [failure.task for failure in report.failures] == [hang]
+    assert "TaskTimeout" in report.failures[0].trace
+    assert is_completed(healthy, storage)
+    assert metrics.get("task_timeouts") == 1
+
+
+@pytest.mark.parametrize("n_jobs, backend", [(1, "process"), (2, "thread")])
+def test_run_with_timeout_not_applied(n_jobs, backend, storage, caplog):
+    hang = Hang(seconds=2.0)
+    metrics = Metrics()
+
+    report = run_job(
+        hang,
+        storage,
+        n_jobs=n_jobs,
+        backend=backend,
+        default_timeout=0.5,
+        retry_policy=RetryPolicy(max_attempts=3, backoff=0.1, retry_on=(TaskTimeout,)),
+        metrics=metrics,
+    )
+
+    # The task runs once to the end, instead of being retried while it still runs.
+    assert report.succeeded
+    assert is_completed(hang, storage)
+    assert metrics.get("task_timeouts") == 0
+    assert "execution_timeout" in caplog.text
+
+
+def test_run_with_timeout_and_retry(storage):
+    task = Task2(parent=Hang().output())
+
+    run_job(
+        task,
+        storage,
+        n_jobs=2,
+        retry_policy=RetryPolicy(max_attempts=2, backoff=0.1, retry_on=(TaskTimeout,)),
+    )
+
+    assert is_completed(task, storage)
+
+
+@dataclass(frozen=True)
+class Request(Task1):
+    # Parameter of the task itself, not the limit of its execution.
+    timeout: float = 0.0
+
+    def run(self, input, output):
+        time.sleep(0.5)
+        output.store(self.timeout)
+
+
+def test_run_with_timeout_field(storage):
+    task = Request()
+
+    assert task.execution_timeout is None
+
+    run_job(task, storage, n_jobs=2)
+
+    assert is_completed(task, storage)
+
+
+@dataclass(frozen=True)
+class Relay(Task):
+    """Appends the pid of the process to the pids of the parent."""
+
+    parent: Optional[Output] = None
+    name: str = "relay"
+
+    def input(self):
+        return self.parent
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def run(self, input, output):
+        pids = input.load() if input is not None else []
+        output.store(pids + [os.getpid()])
+
+
+def test_run_with_output_cache(storage):
+    task = Relay(name="0")
+    for i in range(1, 5):
+        task = Relay(parent=task.output(), name=str(i))
+
+    metrics = Metrics()
+
+    run_job(task, storage, n_jobs=2, metrics=metrics, output_cache_bytes=2 ** 20)
+
+    pids = task.output().assign_storage(storage).load()
+
+    # The chain is kept on the worker which holds the output of the previous task.
+    assert len(pids) == 5
+    assert len(set(pids)) == 1
+    assert metrics.get("locality_hits") == 4
+    assert metrics.get("output_cache_hits") == 4
+    assert metrics.get("output_cache_misses") == 0
+
+
+@dataclass(frozen=True)
+class FlakyRelay(Relay):
+    """Relay which fails at the first attempt."""
+
+    def run(self, input, output):
+        marker = os.path.join(output.storage.base_path, f"{self.task_id}.attempts")
+
+        if not os.path.exists(marker):
+            open(marker, "w").close()
+            raise IOError("flaky")
+
+        super().run(input, output)
+
+
+def test_run_with_fused_tasks(storage):
+    task = Relay(name="0")
+    for i in range(1, 4):
+        task = Relay(parent=task.output().as_ephemeral(), name=str(i))
+
+    metrics = Metrics()
+
+    run_job(task, storage, n_jobs=2, metrics=metrics, fuse_ephemeral=True)
+
+    pids = task.output().assign_storage(storage).load()
+
+    assert len(pids) == 4
+    assert len(set(pids)) == 1
+    assert metrics.get("fused_tasks") == 3
+
+
+def test_run_with_failure_of_fused_task(storage):
+    head = Relay(name="head")
+    flaky = FlakyRelay(parent=head.output().as_ephemeral(), name="flaky")
+    tail = Relay(parent=flaky.output().as_ephemeral(), name="tail")
+
+    metrics = Metrics()
+
+    run_job(
+        tail,
+        storage,
+        n_jobs=2,
+        metrics=metrics,
+        fuse_ephemeral=True,
+        retry_policy=RetryPolicy(max_attempts=2, backoff=0.1),
+    )
+
+    assert len(tail.output().assign_storage(storage).load()) == 3
+
+    # The output of head is materialized for the retry, and purged after that.
+    assert metrics.get("fused_tasks") == 3
+    assert not head.output().assign_storage(storage).exists()
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_run_with_trace(n_jobs, storage):
+    task = Relay(parent=Relay(name="0").output(), name="1")
+
+    trace = Trace()
+
+    run_job(task, storage, n_jobs=n_jobs, trace=trace)
+
+    slices = [event for event in trace.events() if event["ph"] == "X"]
+
+    assert [event["name"] for event in slices if event["cat"] == "run"] == [
+        "Relay",
+        "Relay",
+    ]
+    assert [event["name"] for event in slices if event["cat"] == "load"] == [
+        "load BinaryOutput"
+    ]
+    assert len([event for event in slices if event["cat"] == "store"]) == 2
+
+    if n_jobs > 1:
+        assert all(event["pid"] != os.getpid() for event in slices)
+
+
+@dataclass(frozen=True)
+class Inspect(Task):
+    """Stores the classes of the outputs given to run."""
+
+    parent: NoDefaultVar[Output] = no_default
+
+    def input(self):
+        return self.parent
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def run(self, input, output):
+        output.store(
+            [
+                type(input),
+                type(output),
+                input == self.parent,
+                isinstance(input.storage, LocalStorage),
+            ]
+        )
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+@pytest.mark.parametrize("option", ["trace", "metrics"])
+def test_run_with_observation_keeps_outputs(n_jobs, option, storage):
+    task = Inspect(parent=Task1().output())
+
+    run_job(
+        task,
+        storage,
+        n_jobs=n_jobs,
+        **{option: Trace() if option == "trace" else Metrics()},
+    )
+
+    assert task.output().assign_storage(storage).load() == [
+        BinaryOutput,
+        BinaryOutput,
+        True,
+        True,
+    ]
+
+
+@pytest.mark.parametrize("n_jobs", [1, 2])
+def test_run_with_metrics_of_tasks(n_jobs, storage):
+    task = Relay(parent=Relay(name="0").output().as_ephemeral(), name="1")
+
+    metrics = Metrics()
+
+    run_job(task, storage, n_jobs=n_jobs, metrics=metrics, metrics_port=0)
+
+    assert metrics.histogram("task_duration_seconds").count == 2
+    assert metrics.histogram("dispatch_latency_seconds").count == 2
+    assert metrics.get("output_bytes", output="BinaryOutput", operation="store") > 0
+    assert metrics.get("output_bytes", output="BinaryOutput", operation="load") > 0
+    assert metrics.get("storage_exists_calls") >= 2
+    assert metrics.get("purged_outputs", output="BinaryOutput") == 1
+    assert metrics.get("tasks_ready", tag="untagged") == 0
+    assert metrics.get("tasks_running", tag="untagged") == 0
+
+    if n_jobs > 1:
+        assert metrics.histogram("queue_latency_seconds").count == 2
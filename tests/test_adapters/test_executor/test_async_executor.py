@@ -0,0 +1,102 @@
+import asyncio
+import time
+from concurrent.futures import ProcessPoolExecutor
+from dataclasses import dataclass
+from dataclass_serializer import no_default, NoDefaultVar
+
+import pytest
+
+from alexflow import Task, BinaryOutput
+from alexflow.adapters.executor import alexflow as alexflow_executor
+from alexflow.adapters.executor.alexflow import Termination
+from alexflow.adapters.executor.async_executor import run_job, is_coroutine_task
+from alexflow.adapters.storage.local_storage import LocalStorage
+from alexflow.helper import is_completed
+from alexflow.testing.tasks import Task1, Task2, DynamicTask1
+
+
+@pytest.fixture
+def storage(tmp_path):
+    yield LocalStorage(str(tmp_path))
+
+
+@dataclass(frozen=True)
+class Fetch(Task):
+    name: NoDefaultVar[str] = no_default
+    latency: float = 0.5
+    tag: str = "fetch"
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    @property
+    def tags(self):
+        return {self.tag}
+
+    async def run(self, input, output):
+        await asyncio.sleep(self.latency)
+        output.store(self.name)
+
+
+@dataclass(frozen=True)
+class Broken(Task):
+    async def run(self, input, output):
+        raise ValueError("broken")
+
+
+def test_is_coroutine_task():
+    assert is_coroutine_task(Fetch(name="fetch"))
+    assert not is_coroutine_task(Task1())
+
+
+def test_run_coroutine_tasks_concurrently(storage):
+    tasks = [Fetch(name=str(i)) for i in range(50)]
+
+    t = time.time()
+
+    run_job(tasks, storage)
+
+    assert time.time() - t < 5.0
+    assert all(is_completed(task, storage) for task in tasks)
+
+
+def test_run_coroutine_tasks_with_resources(storage):
+    tasks = [Fetch(name=str(i), latency=0.2) for i in range(4)]
+
+    t = time.time()
+
+    run_job(tasks, storage, resources={"fetch": 1})
+
+    assert time.time() - t > 0.8
+
+
+def test_run_sync_tasks(storage):
+    task = Task2(parent=DynamicTask1(parent=Task1().output()).output())
+
+    run_job(task, storage)
+
+    assert is_completed(task, storage)
+
+
+def test_run_sync_tasks_on_processes(storage):
+    task = Task2(parent=Task1().output())
+
+    with ProcessPoolExecutor(max_workers=2) as executor:
+        run_job(task, storage, executor=executor)
+
+    assert is_completed(task, storage)
+
+
+def test_run_failing_task(storage):
+    with pytest.raises(Termination):
+        run_job([Broken(), Fetch(name="slow", latency=0.2)], storage)
+
+
+@pytest.mark.parametrize("n_jobs, error", [(1, TypeError), (2, Termination)])
+def test_run_coroutine_task_on_process_executor(n_jobs, error, storage):
+    task = Fetch(name="fetch", latency=0.0)
+
+    with pytest.raises(error, match="returned a coroutine"):
+        alexflow_executor.run_job(task, storage, n_jobs=n_jobs)
+
+    assert not is_completed(task, storage)
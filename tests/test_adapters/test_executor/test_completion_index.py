@@ -0,0 +1,32 @@
+from unittest.mock import MagicMock
+
+from alexflow.adapters.executor._completion_index import CompletionIndex
+from alexflow.testing.tasks import Task1, Task2
+
+
+def test_completion_index_checks_storage_once_per_output():
+    storage = MagicMock()
+    storage.exists.return_value = False
+
+    base = Task1()
+    task = Task2(parent=base.output())
+
+    index = CompletionIndex(storage)
+
+    assert not index.is_completed(base)
+    assert not index.exists(base.output())
+    assert not index.is_completed(base)
+
+    assert storage.exists.call_count == 1
+    assert (index.hits, index.misses) == (2, 1)
+
+    index.add(base)
+
+    assert index.exists(base.output())
+    assert not index.is_completed(task)
+    assert storage.exists.call_count == 2
+
+    index.remove(base.output())
+
+    assert not index.exists(base.output())
+    assert storage.exists.call_count == 2
@@ -0,0 +1,183 @@
+from dataclasses import dataclass
+
+import pytest
+
+from alexflow.adapters.executor._dependency_graph import DependencyGraph
+from alexflow.adapters.storage.local_storage import LocalStorage
+from alexflow.helper import run_task
+from alexflow.testing.tasks import Task1, Task2, DynamicTask1, WriteValue
+from alexflow.adapters.executor._duration_history import DurationHistory
+
+
+@pytest.fixture
+def storage(tmp_path):
+    yield LocalStorage(str(tmp_path))
+
+
+def test_dependency_graph_resolves_ready_tasks(storage):
+    base = Task1()
+    left = Task2(parent=base.output(), name="left")
+    right = Task2(parent=base.output(), name="right")
+
+    graph = DependencyGraph({task.task_id: task for task in [left, right]}, storage)
+
+    assert len(graph) == 3
+    assert graph.ready_tasks() == [base]
+
+    assert graph.pop_ready() == base
+    assert graph.ready_tasks() == []
+    assert graph.pop_ready() is None
+
+    run_task(base, storage)
+    graph.complete(base.task_id)
+
+    assert set(graph.ready_tasks()) == {left, right}
+    assert len(graph) == 2
+
+
+def test_dependency_graph_skips_completed_tasks(storage):
+    base = Task1()
+    run_task(base, storage)
+
+    task = Task2(parent=base.output())
+
+    graph = DependencyGraph({task.task_id: task}, storage)
+
+    assert len(graph) == 1
+    assert graph.ready_tasks() == [task]
+
+
+def test_dependency_graph_waits_for_generated_tasks(storage):
+    dynamic = DynamicTask1(parent=Task1().output())
+    downstream = Task2(parent=dynamic.output())
+
+    graph = DependencyGraph({downstream.task_id: downstream}, storage)
+
+    assert len(graph) == 3
+
+    assert graph.pop_ready() == dynamic.parent.src_task
+    graph.complete(dynamic.parent.src_task.task_id)
+
+    assert graph.pop_ready() == dynamic
+
+    generated = WriteValue(value_to_write="value", target=dynamic.output())
+
+    assert graph.expand(dynamic.task_id, [generated]) == [generated]
+    assert dynamic.task_id in graph
+    assert graph.pop_ready() == generated
+    graph.complete(generated.task_id)
+
+    assert dynamic.task_id not in graph
+    assert graph.ready_tasks() == [downstream]
+
+
+@dataclass(frozen=True)
+class Urgent(Task1):
+    @property
+    def priority(self):
+        return 1
+
+
+@dataclass(frozen=True)
+class Costly(Task1):
+    @property
+    def cost_hint(self):
+        return 10.0
+
+
+def test_dependency_graph_orders_ready_tasks_by_critical_path(storage):
+    short = Task1(name="short")
+    long = Task2(parent=Task2(parent=Task1(name="long").output()).output())
+    costly = Costly(name="costly")
+
+    tasks = [short, long, costly]
+
+    graph = DependencyGraph(
+        {task.task_id: task for task in tasks},
+        storage,
+        cost=DurationHistory().estimate,
+    )
+
+    assert graph.ready_tasks() == [costly, long.parent.src_task.parent.src_task, short]
+    assert graph.rank(long.task_id) == 1.0
+    assert graph.rank(long.parent.src_task.parent.src_task.task_id) == 3.0
+
+    fifo = DependencyGraph({task.task_id: task for task in tasks}, storage)
+
+    assert fifo.ready_tasks() == [short, costly, long.parent.src_task.parent.src_task]
+
+
+def test_dependency_graph_orders_ready_tasks_by_priority(storage):
+    urgent = Urgent(name="urgent")
+    costly = Costly(name="costly")
+
+    graph = DependencyGraph(
+        {task.task_id: task for task in [costly, urgent]},
+        storage,
+        cost=DurationHistory().estimate,
+    )
+
+    assert graph.ready_tasks() == [urgent, costly]
+
+
+def test_dependency_graph_keeps_order_of_tasks_put_back(storage):
+    tasks = [Task1(name=str(i)) for i in range(5)]
+
+    graph = DependencyGraph({task.task_id: task for task in tasks}, storage)
+
+    order = graph.ready_tasks()
+    popped = [graph.pop_ready() for _ in tasks]
+
+    for task in reversed(popped):
+        graph.push_ready(task)
+
+    assert graph.ready_tasks() == order
+
+    # Dispatched tasks are ordered as they become ready again, e.g. by retry.
+    graph.take_ready_time(graph.pop_ready().task_id)
+    graph.push_ready(order[0])
+
+    assert graph.ready_tasks() == order[1:] + order[:1]
+
+
+def test_duration_history(tmp_path):
+    history = DurationHistory(alpha=0.5)
+
+    assert history.estimate(Task1()) == 1.0
+    assert history.estimate(Costly()) == 10.0
+
+    history.record(Task1(), 2.0)
+    history.record(Task1(), 4.0)
+
+    assert history.estimate(Task1()) == 3.0
+    assert history.estimate(Task2(parent=Task1().output())) == 3.0
+
+    history.save(str(tmp_path / "history.json"))
+
+    assert DurationHistory.load(str(tmp_path / "history.json")).to_dict() == {
+        "alexflow.testing.tasks.Task1": 3.0
+    }
+
+
+def test_dependency_graph_blocks_dependents_of_failed_task(storage):
+    failed = Task1(name="failed")
+    other = Task1(name="other")
+    middle = Task2(parent=failed.output(), name="middle")
+    downstream = Task2(parent=middle.output(), name="downstream")
+    healthy = Task2(parent=other.output(), name="healthy")
+
+    graph = DependencyGraph(
+        {task.task_id: task for task in [downstream, healthy]}, storage
+    )
+
+    assert set(graph.ready_tasks()) == {failed, other}
+
+    graph.pop_ready()
+    graph.pop_ready()
+
+    assert graph.fail(failed.task_id) == [middle, downstream]
+    assert len(graph) == 2
+
+    graph.complete(other.task_id)
+
+    assert graph.ready_tasks() == [healthy]
@@ -0,0 +1,44 @@
+from alexflow.adapters.executor._dispatch_window import DispatchWindow
+
+
+def test_dispatch_window_prefetches_a_task_per_worker_at_first():
+    window = DispatchWindow(workers=4)
+
+    assert window.prefetch == 4
+    assert window.size == 8
+
+
+def test_dispatch_window_prefetches_short_tasks():
+    window = DispatchWindow(workers=4, max_prefetch=100)
+
+    # Tasks of 10ms, with 20ms of round trip latency.
+    for _ in range(10):
+        window.record(duration=0.01, elapsed=0.03)
+
+    assert window.prefetch == 8
+    assert window.size == 12
+
+    # The overheads including the time waiting in the queue are ignored.
+    window.record(duration=0.01, elapsed=1.0)
+
+    assert window.prefetch == 8
+
+
+def test_dispatch_window_does_not_prefetch_long_tasks():
+    window = DispatchWindow(workers=4)
+
+    window.record(duration=100.0, elapsed=100.01)
+
+    assert window.prefetch == 1
+
+    window.record(duration=100.0, elapsed=100.0)
+
+    assert window.size == 4
+
+
+def test_dispatch_window_is_bounded():
+    window = DispatchWindow(workers=4, max_prefetch=10)
+
+    window.record(duration=0.0, elapsed=1.0)
+
+    assert window.size == 14
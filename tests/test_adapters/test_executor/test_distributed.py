@@ -0,0 +1,286 @@
+from dataclasses import dataclass
+
+import socket
+import threading
+import time
+
+import pytest
+
+from multiprocess.connection import Client
+
+from alexflow import ResourceSpec, Workflow
+from alexflow.adapters.executor._retry import RetryPolicy
+from alexflow.adapters.executor.alexflow import Kind, Termination
+from alexflow.adapters.executor.distributed import (
+    AgentInfo,
+    Coordinator,
+    run_agent,
+    run_job,
+    _Agent,
+)
+from alexflow.adapters.storage.local_storage import LocalStorage
+from alexflow.helper import is_completed
+from alexflow.testing.tasks import Task1, Task2, DynamicTask1
+
+
+@pytest.fixture
+def storage(tmp_path):
+    yield LocalStorage(str(tmp_path))
+
+
+@dataclass(frozen=True)
+class Gpu(Task1):
+    @property
+    def tags(self):
+        return {"gpu"}
+
+
+@dataclass(frozen=True)
+class Db(Task1):
+    @property
+    def tags(self):
+        return {"db"}
+
+
+def test_run_job_on_local_agents(storage):
+    tasks = [
+        Task2(parent=DynamicTask1(parent=Task1().output()).output()),
+        Task2(parent=Task1(name="other").output()),
+    ]
+
+    report = run_job(tasks, storage, n_agents=2, slots=2)
+
+    assert report.succeeded
+    assert all(is_completed(task, storage) for task in tasks)
+
+
+def test_run_job_on_remote_agent(storage):
+    task = Task2(parent=Task1().output())
+
+    coordinator = Coordinator(
+        Workflow(storage=storage, tasks={task.task_id: task}), agent_timeout=30.0
+    )
+
+    agent = threading.Thread(
+        target=run_agent,
+        kwargs=dict(address=coordinator.address, authkey=coordinator.authkey, slots=1),
+    )
+    agent.start()
+
+    assert coordinator.run().succeeded
+    agent.join()
+
+    assert is_completed(task, storage)
+
+
+def test_run_job_with_silent_client(storage):
+    task = Task2(parent=Task1().output())
+
+    coordinator = Coordinator(
+        Workflow(storage=storage, tasks={task.task_id: task}),
+        agent_timeout=30.0,
+        handshake_timeout=1.0,
+    )
+
+    # Connects before the agent, and never answers the challenge.
+    with socket.create_connection(coordinator.address):
+        agent = threading.Thread(
+            target=run_agent,
+            kwargs=dict(address=coordinator.address, authkey=coordinator.authkey),
+        )
+        agent.start()
+
+        assert coordinator.run().succeeded
+        agent.join()
+
+    assert is_completed(task, storage)
+
+
+def test_coordinator_requires_authkey_on_public_address(storage):
+    workflow = Workflow(storage=storage, tasks={Task1().task_id: Task1()})
+
+    with pytest.raises(ValueError):
+        Coordinator(workflow, address=("0.0.0.0", 0))
+
+    coordinator = Coordinator(workflow, address=("0.0.0.0", 0), authkey=b"secret")
+    coordinator._listener.close()
+
+
+def test_run_job_without_agents(storage):
+    with pytest.raises(Termination):
+        run_job(Task1(), storage, agent_timeout=1.0)
+
+
+def test_agent_accepts_tasks_by_tags_and_capacity():
+    general = _Agent(None, AgentInfo(name="general", slots=1))
+    gpu = _Agent(
+        None, AgentInfo(name="gpu", slots=2, capacity={"gpu": 1}, tags={"gpu"})
+    )
+
+    assert general.accepts(Gpu())
+    assert gpu.accepts(Gpu(resource_spec=ResourceSpec(gpu=1)))
+    assert gpu.accepts(Task1())
+    assert not gpu.accepts(Db())
+
+    gpu.running.add("running")
+    gpu.resource_manager.add(Gpu(resource_spec=ResourceSpec(gpu=1)))
+
+    assert not gpu.accepts(Gpu(name="other", resource_spec=ResourceSpec(gpu=1)))
+    assert gpu.accepts(Gpu(name="other"))
+
+    general.running.add("running")
+
+    assert not general.accepts(Task1())
+
+
+@dataclass(frozen=True)
+class Broken(Task1):
+    def run(self, input, output):
+        raise ValueError("broken")
+
+
+def test_run_job_with_keep_going(storage):
+    blocked = Task2(parent=Broken().output())
+    healthy = Task2(parent=Task1().output())
+
+    report = run_job([blocked, healthy], storage, n_agents=1, keep_going=True)
+
+    assert report.blocked == {Broken().task_id: [blocked]}
+    assert is_completed(healthy, storage)
+
+
+def test_run_dynamic_task_on_agents(storage):
+    task = DynamicTask1(parent=Task1(name="dynamic").output())
+
+    assert run_job(task, storage, n_agents=2).succeeded
+
+    # Written by the generated task, which is sent to the agent with its task_id.
+    assert task.output().assign_storage(storage).load() == {"name": "dynamic"}
+
+
+@dataclass(frozen=True)
+class Interval(Db):
+    def run(self, input, output):
+        begin = time.time()
+        time.sleep(0.3)
+        output.store({"begin": begin, "end": time.time()})
+
+
+def test_run_job_limits_tags_across_agents(storage):
+    tasks = [Interval(name=f"interval-{i}") for i in range(3)]
+
+    report = run_job(tasks, storage, n_agents=2, slots=2, resources={"db": 1})
+
+    assert report.succeeded
+
+    outputs = [task.output().assign_storage(storage).load() for task in tasks]
+    intervals = sorted((output["begin"], output["end"]) for output in outputs)
+
+    for (_, end), (begin, _) in zip(intervals, intervals[1:]):
+        assert end <= begin
+
+
+def test_run_agent_rejects_unknown_capacity():
+    # Raised before connecting, so that the address is not used.
+    with pytest.raises(ValueError):
+        run_agent(("127.0.0.1", 0), authkey=b"secret", capacity={"disk": 1})
+
+
+def test_coordinator_rejects_agent_with_unknown_capacity(storage):
+    task = Task1()
+
+    coordinator = Coordinator(
+        Workflow(storage=storage, tasks={task.task_id: task}), agent_timeout=30.0
+    )
+
+    errors = []
+
+    def connect_invalid():
+        conn = Client(coordinator.address, authkey=coordinator.authkey)
+        conn.send(AgentInfo(name="invalid", capacity={"disk": 1}))
+        try:
+            conn.recv()
+        except EOFError as e:
+            errors.append(e)
+        finally:
+            conn.close()
+
+        run_agent(address=coordinator.address, authkey=coordinator.authkey)
+
+    agent = threading.Thread(target=connect_invalid)
+    agent.start()
+
+    assert coordinator.run().succeeded
+    agent.join()
+
+    assert len(errors) == 1
+    assert is_completed(task, storage)
+
+
+class _Connection:
+    def __init__(self):
+        self.sent = []
+
+    def send(self, msg):
+        self.sent.append(msg)
+
+
+def _dispatch_to_lost_agent(coordinator):
+    agent = _Agent(_Connection(), AgentInfo(name="lost", slots=1))
+    coordinator._agents.append(agent)
+    coordinator._dispatch()
+
+    assert [msg.kind for msg in agent.conn.sent] == [Kind.RUN]
+
+    coordinator._lose(agent)
+
+
+def test_retry_task_of_lost_agent(storage):
+    task = Task2(parent=Task1().output())
+
+    coordinator = Coordinator(
+        Workflow(storage=storage, tasks={task.task_id: task}),
+        agent_timeout=30.0,
+        retry_policy=RetryPolicy(max_attempts=2, backoff=0.0),
+    )
+
+    _dispatch_to_lost_agent(coordinator)
+
+    assert len(coordinator._retries) == 1
+    assert coordinator.metrics.get("agents_lost") == 1
+
+    # Run again on the agent connecting later.
+    agent = threading.Thread(
+        target=run_agent,
+        kwargs=dict(address=coordinator.address, authkey=coordinator.authkey),
+    )
+    agent.start()
+
+    assert coordinator.run().succeeded
+    agent.join()
+
+    assert is_completed(task, storage)
+
+
+def test_fail_task_of_lost_agent(storage):
+    task = Task2(parent=Task1().output())
+    workflow = Workflow(storage=storage, tasks={task.task_id: task})
+
+    coordinator = Coordinator(workflow)
+
+    with pytest.raises(Termination):
+        _dispatch_to_lost_agent(coordinator)
+
+    coordinator._listener.close()
+
+    coordinator = Coordinator(workflow, keep_going=True)
+
+    _dispatch_to_lost_agent(coordinator)
+
+    coordinator._listener.close()
+
+    report = coordinator._report
+
+    assert [failure.task for failure in report.failures] == [Task1()]
+    assert "lost agent" in report.failures[0].error
+    assert report.blocked == {Task1().task_id: [task]}
@@ -0,0 +1,62 @@
+import pytest
+
+from alexflow.adapters.storage.local_storage import LocalStorage
+from alexflow.adapters.executor._dependency_graph import DependencyGraph
+from alexflow.adapters.executor._fusion import HandOff, fusable_chain
+from alexflow.testing.tasks import Task1, Task2
+
+
+@pytest.fixture
+def storage(tmp_path):
+    yield LocalStorage(tmp_path)
+
+
+def _eligible(task):
+    return True
+
+
+def test_fusable_chain(storage):
+    head = Task1()
+    middle = Task2(parent=head.output().as_ephemeral(), name="middle")
+    tail = Task2(parent=middle.output().as_ephemeral(), name="tail")
+
+    graph = DependencyGraph({tail.task_id: tail}, storage)
+
+    assert fusable_chain(head, graph, {tail.task_id}, _eligible) == [middle, tail]
+
+    # The output of the target is kept.
+    assert fusable_chain(head, graph, {middle.task_id}, _eligible) == [middle]
+
+    assert fusable_chain(head, graph, set(), lambda task: task != tail) == [middle]
+
+
+def test_fusable_chain_materializes_shared_output(storage):
+    head = Task1()
+    ephemeral = Task2(parent=head.output().as_ephemeral(), name="ephemeral")
+    persistent = Task2(parent=head.output(), name="persistent")
+    another = Task2(parent=head.output().as_ephemeral(), name="another")
+
+    for consumers in [[persistent], [ephemeral, another]]:
+        graph = DependencyGraph({task.task_id: task for task in consumers}, storage)
+
+        assert fusable_chain(head, graph, set(), _eligible) == []
+
+
+def test_hand_off(storage):
+    hand_off = HandOff()
+
+    output = Task1().output().assign_storage(storage)
+
+    held = hand_off.hold(output)
+    held.store({"name": "task1"})
+
+    assert not output.exists()
+    assert hand_off.take(output).load() == {"name": "task1"}
+
+    # Outputs not held are given as they are.
+    other = Task1(name="other").output()
+    assert hand_off.take(other) is other
+
+    assert hand_off.materialize()
+    assert output.load() == {"name": "task1"}
+    assert output.key not in hand_off
@@ -0,0 +1,36 @@
+from alexflow.adapters.executor._locality import Locality
+from alexflow.testing.tasks import Task1, Task2
+
+
+def test_locality_prefers_worker_holding_inputs():
+    locality = Locality(workers=[1, 2])
+
+    parent = Task1()
+    child = Task2(parent=parent.output())
+
+    assert locality.choose(child, limit=1) is None
+
+    locality.assign(parent.task_id, 2)
+    locality.release(parent.task_id, worker=2)
+
+    assert locality.preferred(child) == [2]
+    assert locality.choose(child, limit=1) == 2
+
+    # The worker is busy up to the limit.
+    locality.assign(Task1(name="other").task_id, 2)
+
+    assert locality.choose(child, limit=1) is None
+    assert locality.least_loaded() == 1
+
+
+def test_locality_releases_failed_task():
+    locality = Locality(workers=[1, 2])
+
+    parent = Task1()
+    child = Task2(parent=parent.output())
+
+    locality.assign(parent.task_id, 1)
+    locality.release(parent.task_id)
+
+    assert locality.preferred(child) == []
+    assert locality.least_loaded() == 1
@@ -0,0 +1,67 @@
+from urllib.error import HTTPError
+from urllib.request import urlopen
+
+import pytest
+
+from alexflow.adapters.executor._metrics import Metrics, serve_metrics
+
+
+def test_metrics_histogram():
+    metrics = Metrics(buckets=[1.0, 0.1])
+
+    metrics.observe("duration", 0.05, task="a")
+    metrics.observe("duration", 0.5, task="a")
+    metrics.observe("duration", 5.0, task="b")
+
+    histogram = metrics.histogram("duration", task="a")
+
+    assert histogram.buckets == (0.1, 1.0)
+    assert histogram.counts == [1, 1, 0]
+    assert histogram.count == 2
+    assert histogram.sum == pytest.approx(0.55)
+
+    # Merged over the labels.
+    assert metrics.histogram("duration").counts == [1, 1, 1]
+    assert metrics.get("duration") == pytest.approx(5.55)
+
+
+def test_metrics_to_prometheus():
+    metrics = Metrics(buckets=[1.0])
+
+    metrics.inc("worker_recycles", reason="max_tasks")
+    metrics.set("tasks_ready", 3, tag='a"b')
+    metrics.observe("task_duration_seconds", 0.5, task="Task1")
+
+    lines = metrics.to_prometheus().splitlines()
+
+    assert "# TYPE alexflow_worker_recycles counter" in lines
+    assert 'alexflow_worker_recycles_total{reason="max_tasks"} 1.0' in lines
+    assert "# TYPE alexflow_tasks_ready gauge" in lines
+    assert 'alexflow_tasks_ready{tag="a\\"b"} 3.0' in lines
+    assert "# TYPE alexflow_task_duration_seconds histogram" in lines
+    assert 'alexflow_task_duration_seconds_bucket{task="Task1",le="1.0"} 1' in lines
+    assert 'alexflow_task_duration_seconds_bucket{task="Task1",le="+Inf"} 1' in lines
+    assert 'alexflow_task_duration_seconds_sum{task="Task1"} 0.5' in lines
+    assert 'alexflow_task_duration_seconds_count{task="Task1"} 1' in lines
+
+
+def test_serve_metrics():
+    metrics = Metrics()
+
+    server = serve_metrics(metrics)
+
+    try:
+        metrics.inc("purged_outputs", output="BinaryOutput")
+
+        url = f"http://127.0.0.1:{server.server_port}"
+
+        with urlopen(f"{url}/metrics") as response:
+            body = response.read().decode()
+
+        assert 'alexflow_purged_outputs_total{output="BinaryOutput"} 1.0' in body
+
+        with pytest.raises(HTTPError):
+            urlopen(f"{url}/other")
+    finally:
+        server.shutdown()
+        server.server_close()
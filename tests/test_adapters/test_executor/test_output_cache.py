@@ -0,0 +1,122 @@
+from dataclasses import dataclass
+
+import copy
+import pickle
+
+import pytest
+
+from alexflow import BinaryOutput, JSONOutput
+from alexflow.adapters.storage.local_storage import LocalStorage
+from alexflow.adapters.executor._output_cache import OutputCache
+from alexflow.testing.tasks import Task1
+
+
+@dataclass(frozen=True)
+class CustomOutput(BinaryOutput):
+    def load(self):
+        return "custom"
+
+
+@pytest.fixture
+def storage(tmp_path):
+    yield LocalStorage(tmp_path)
+
+
+def test_output_cache_evicts_least_recently_used():
+    cache = OutputCache(max_bytes=300)
+
+    cache.put("a", b"a" * 100)
+    cache.put("b", b"b" * 100)
+
+    # "a" is used more recently than "b".
+    assert cache.get("a") == b"a" * 100
+
+    cache.put("c", b"c" * 100)
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" in cache
+    assert cache.nbytes <= 300
+
+
+def test_output_cache_skips_too_large_object():
+    cache = OutputCache(max_bytes=100)
+
+    cache.put("a", b"a" * 1000)
+
+    assert len(cache) == 0
+    assert cache.nbytes == 0
+
+
+class Opaque:
+    pass
+
+
+def test_output_cache_skips_object_of_unknown_size():
+    cache = OutputCache(max_bytes=2 ** 20)
+
+    cache.put("a", {"values": [1, 2.0, "three"], "nested": {"key": b"value"}})
+    cache.put("b", Opaque())
+    cache.put("c", [Opaque()])
+
+    assert "a" in cache
+    assert "b" not in cache
+    assert "c" not in cache
+
+
+def test_output_cache_wraps_binary_output(storage):
+    cache = OutputCache(max_bytes=2 ** 20)
+
+    output = cache.wrap(Task1().output().assign_storage(storage))
+
+    assert isinstance(output, BinaryOutput)
+    assert output.key == Task1().output().key
+
+    value = {"name": "task1"}
+    output.store(value)
+
+    # The stored object is given as is, without loading from the storage.
+    assert output.load() is value
+    assert cache.hits == 1
+
+    # The object is still written to the storage.
+    assert Task1().output().assign_storage(storage).load() == value
+
+    cache = OutputCache(max_bytes=2 ** 20)
+    output = cache.wrap(Task1().output().assign_storage(storage))
+
+    assert output.load() == value
+    assert output.load() == value
+    assert (cache.hits, cache.misses) == (1, 1)
+
+
+def test_output_cache_does_not_wrap_other_outputs():
+    cache = OutputCache(max_bytes=2 ** 20)
+    task = Task1()
+
+    for output in [
+        task.build_output(output_class=JSONOutput, key="output.json"),
+        task.build_output(output_class=CustomOutput, key="output.pkl"),
+    ]:
+        assert cache.wrap(output) is output
+
+
+def test_wrapped_output_behaves_as_original(storage):
+    cache = OutputCache(max_bytes=2 ** 20)
+
+    original = Task1().output().assign_storage(storage)
+    output = cache.wrap(original)
+
+    assert type(output) is not BinaryOutput
+    assert output == original and original == output
+    assert hash(output) == hash(original)
+    assert repr(output) == repr(original)
+
+    for restored in [pickle.loads(pickle.dumps(output)), copy.deepcopy(output)]:
+        assert type(restored) is BinaryOutput
+        assert restored == original
+
+    # The copy by dataclasses.replace still goes through the cache.
+    output.as_ephemeral().store({"name": "task1"})
+    assert output.load() == {"name": "task1"}
+    assert cache.hits == 1
@@ -0,0 +1,66 @@
+import copy
+import os
+import pickle
+
+import pytest
+
+from alexflow.adapters.storage.local_storage import LocalStorage
+from alexflow.adapters.executor._output_meter import OutputMeter
+from alexflow.testing.tasks import Task1
+
+
+@pytest.fixture
+def storage(tmp_path):
+    yield LocalStorage(tmp_path)
+
+
+def test_output_meter_counts_bytes(storage):
+    meter = OutputMeter()
+
+    output = meter.wrap(Task1().output().assign_storage(storage))
+
+    output.store({"name": "task1"})
+
+    size = os.path.getsize(os.path.join(storage.base_path, output.key))
+
+    assert meter.bytes[("store", "BinaryOutput")] == size
+
+    assert output.load() == {"name": "task1"}
+    assert output.exists()
+
+    assert meter.bytes[("load", "BinaryOutput")] == size
+
+
+def test_output_meter_skips_output_without_storage():
+    output = Task1().output()
+
+    assert OutputMeter().wrap(output) is output
+
+
+def test_metered_storage_behaves_as_original(storage):
+    output = OutputMeter().wrap(Task1().output().assign_storage(storage))
+
+    assert isinstance(output.storage, LocalStorage)
+    assert output.storage == storage
+
+    for restored in [pickle.loads(pickle.dumps(output)), copy.deepcopy(output)]:
+        assert type(restored.storage) is LocalStorage
+        assert restored.storage == storage
+
+
+def test_output_meters_share_storage_class(storage):
+    meters = [OutputMeter(), OutputMeter()]
+
+    outputs = [meter.wrap(Task1().output().assign_storage(storage)) for meter in meters]
+
+    # The subclass is created once, and each copy counts on its own meter.
+    assert type(outputs[0].storage) is type(outputs[1].storage)
+
+    outputs[0].store({"name": "task1"})
+
+    assert meters[0].bytes[("store", "BinaryOutput")] > 0
+    assert meters[1].bytes == {}
+
+    # The meter is neither pickled nor compared.
+    assert "_meter" not in pickle.loads(pickle.dumps(outputs[0].storage)).__dict__
+    assert outputs[0].storage == outputs[1].storage
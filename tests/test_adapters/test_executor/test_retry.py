@@ -0,0 +1,53 @@
+from dataclasses import dataclass
+
+from alexflow.adapters.executor._retry import RetryPolicy, RetryQueue, error_types
+from alexflow.testing.tasks import Task1, Task2
+
+
+@dataclass(frozen=True)
+class Tagged(Task1):
+    @property
+    def tags(self):
+        return {"storage"}
+
+
+def test_retry_policy():
+    policy = RetryPolicy(max_attempts=3, backoff=1.0, retry_on=(IOError,))
+
+    assert policy.delay(1, error_types(IOError())) == 1.0
+    assert policy.delay(2, error_types(FileNotFoundError())) == 2.0
+    assert policy.delay(3, error_types(IOError())) is None
+    assert policy.delay(1, error_types(ValueError())) is None
+
+
+def test_retry_queue_finds_policy():
+    by_class = RetryPolicy(max_attempts=2)
+    by_tag = RetryPolicy(max_attempts=5)
+
+    retries = RetryQueue(policies={Task1: by_class, "storage": by_tag})
+
+    assert retries.policy(Task1()) == by_class
+    assert retries.policy(Tagged()) == by_class
+    assert retries.policy(Task2(parent=Task1().output())) == RetryPolicy(max_attempts=1)
+
+    retries = RetryQueue(policies={"storage": by_tag})
+
+    assert retries.policy(Tagged()) == by_tag
+
+
+def test_retry_queue_delays_tasks():
+    retries = RetryQueue(RetryPolicy(max_attempts=3, backoff=1.0))
+
+    task = Task1()
+
+    assert retries.schedule(task, error_types(ValueError()), now=0.0) == 1.0
+    assert len(retries) == 1
+    assert retries.wait_time(now=0.5) == 0.5
+    assert retries.pop_due(now=0.5) == []
+    assert retries.pop_due(now=1.0) == [task.task_id]
+
+    assert retries.schedule(task, error_types(ValueError()), now=1.0) == 2.0
+    assert retries.pop_due(now=3.0) == [task.task_id]
+
+    assert retries.schedule(task, error_types(ValueError()), now=3.0) is None
+    assert len(retries) == 0
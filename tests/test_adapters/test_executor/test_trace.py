@@ -0,0 +1,79 @@
+import json
+
+from alexflow import BinaryOutput
+from alexflow.adapters.storage.local_storage import LocalStorage
+from alexflow.adapters.executor._trace import Trace, IORecorder, _worker_trace
+from alexflow.testing.tasks import Task1
+
+
+def test_trace_records_attempt():
+    trace = Trace()
+
+    worker = _worker_trace(started=10.0, finished=12.0)
+    worker["io"] = [("store", "BinaryOutput", "key", 11.0, 11.5)]
+
+    trace.add(Task1(), "done", acked=12.5, ready=8.0, dispatched=9.0, worker=worker)
+
+    events = trace.events()
+
+    run, store = [event for event in events if event["ph"] == "X"]
+    assert (run["name"], run["ts"], run["dur"]) == ("Task1", 10e6, 2e6)
+    assert (store["name"], store["ts"], store["dur"]) == (
+        "store BinaryOutput",
+        11e6,
+        0.5e6,
+    )
+    assert run["tid"] == store["tid"]
+
+    waits = {
+        (event["cat"], event["ph"]): event["ts"]
+        for event in events
+        if event["ph"] in ("b", "e")
+    }
+    assert waits == {
+        ("ready", "b"): 8e6,
+        ("ready", "e"): 9e6,
+        ("queued", "b"): 9e6,
+        ("queued", "e"): 10e6,
+        ("ack", "b"): 12e6,
+        ("ack", "e"): 12.5e6,
+    }
+
+
+def test_trace_without_worker():
+    trace = Trace()
+
+    trace.add(Task1(), "failed", acked=12.0, ready=8.0, dispatched=9.0)
+
+    assert {event["cat"] for event in trace.events() if "cat" in event} == {
+        "ready",
+        "ack",
+    }
+
+
+def test_io_recorder(tmp_path):
+    recorder = IORecorder()
+
+    output = recorder.wrap(Task1().output().assign_storage(LocalStorage(tmp_path)))
+
+    # Only the storage of the output is replaced.
+    assert type(output) is BinaryOutput
+    assert isinstance(output.storage, LocalStorage)
+
+    output.store(1)
+
+    assert output.load() == 1
+    assert [span[:3] for span in recorder.spans] == [
+        ("store", "BinaryOutput", output.key),
+        ("load", "BinaryOutput", output.key),
+    ]
+
+
+def test_trace_dump(tmp_path):
+    trace = Trace()
+    trace.add(Task1(), "done", acked=1.0, worker=_worker_trace(0.0, 0.5))
+
+    trace.dump(str(tmp_path / "trace.json"))
+
+    with open(tmp_path / "trace.json") as f:
+        assert json.load(f)["traceEvents"] == trace.events()
@@ -0,0 +1,117 @@
+from dataclasses import dataclass
+from multiprocessing.shared_memory import SharedMemory
+
+from dataclass_serializer import no_default, NoDefaultVar
+
+import joblib
+import numpy as np
+import pandas as pd
+import pytest
+
+from alexflow import Task, BinaryOutput, Output, SharedMemoryOutput
+from alexflow.adapters.storage.local_storage import LocalStorage
+from alexflow.adapters.executor.alexflow import run_job
+
+
+@dataclass(frozen=True)
+class Features(Task):
+    rows: int = 1000
+
+    def output(self):
+        return self.build_output(output_class=SharedMemoryOutput, key="features")
+
+    def run(self, input, output):
+        output.store(
+            pd.DataFrame(
+                {"x": np.arange(self.rows, dtype=float), "y": np.ones(self.rows)}
+            )
+        )
+
+
+@dataclass(frozen=True)
+class Model(Task):
+    features: NoDefaultVar[Output] = no_default
+    column: NoDefaultVar[str] = no_default
+
+    def input(self):
+        return self.features
+
+    def output(self):
+        return self.build_output(output_class=BinaryOutput, key="output.pkl")
+
+    def run(self, input, output):
+        output.store(float(input.load()[self.column].sum()))
+
+
+@pytest.fixture
+def storage(tmp_path):
+    yield LocalStorage(tmp_path)
+
+
+@pytest.fixture
+def output(storage):
+    output = Features().output().assign_storage(storage)
+    yield output
+    output.remove()
+
+
+def test_shared_memory_output_with_ndarray(output):
+    array = np.arange(12, dtype=np.int32).reshape(3, 4)
+
+    output.store(array)
+
+    assert output.exists()
+
+    loaded = output.load()
+
+    np.testing.assert_array_equal(loaded, array)
+    assert loaded.dtype == np.int32
+    assert not loaded.flags.writeable
+
+
+def test_shared_memory_output_with_dataframe(output):
+    df = pd.DataFrame(
+        {
+            "float": np.linspace(0, 1, 5),
+            "int": np.arange(5),
+            "time": pd.date_range("2020-01-01", periods=5),
+            "str": ["a", "b", "c", "d", "e"],
+            "category": pd.Categorical(["x", "y", "x", "y", "x"]),
+        },
+        index=pd.Index([10, 11, 12, 13, 14], name="id"),
+    )
+
+    output.store({"df": df, "pair": (df["int"], None)})
+
+    loaded = output.load()
+
+    pd.testing.assert_frame_equal(loaded["df"], df)
+    pd.testing.assert_series_equal(loaded["pair"][0], df["int"])
+    assert loaded["pair"][1] is None
+
+
+def test_shared_memory_output_remove(output, storage):
+    output.store(np.zeros(10))
+
+    with output.storage.path(output.key) as path:
+        name = joblib.load(path)["segment"]
+
+    output.remove()
+
+    assert not output.exists()
+
+    with pytest.raises(FileNotFoundError):
+        SharedMemory(name=name)
+
+
+def test_run_with_shared_memory_output(storage):
+    features = Features().output().as_ephemeral()
+    models = [Model(features=features, column=column) for column in ["x", "y"]]
+
+    run_job(models, storage, n_jobs=2)
+
+    assert models[0].output().assign_storage(storage).load() == sum(range(1000))
+    assert models[1].output().assign_storage(storage).load() == 1000
+
+    # The segment is freed once all the models are completed.
+    assert not features.assign_storage(storage).exists()
@@ -1,10 +1,13 @@
-from dataclasses import dataclass, field
-from typing import Optional
+from dataclasses import dataclass, field, replace
+from datetime import date, datetime, timedelta, timezone
+from typing import Any, Dict, List, Optional
 import pytest
 
 from dataclass_serializer import deserialize
 
-from alexflow import Task, no_default, NoDefaultVar, ResourceSpec
+from alexflow import Task, BinaryOutput, Output, no_default, NoDefaultVar, ResourceSpec
+from alexflow.core import Interner, interning
+from alexflow.testing.tasks import Task1, Task2
 
 
 def test_task():
@@ -91,3 +94,137 @@ def test_task_id_migration_to_v100(task_json):
     assert (
         old_task.task_id == "test_core.MyTask.0871e69fa5e3a73f77e3ea440a8726bd66646b14"
     )
+
+
+@pytest.mark.parametrize(
+    "task_spec, task_id",
+    [
+        (
+            "1.0.0",
+            "alexflow.testing.tasks.Task2.12ee7e40b6b78ca75f9eadc6a574fc61816f2f07",
+        ),
+        (None, "alexflow.testing.tasks.Task2.2c2fab6b347bdeb12a922ee5428bb3c3cc712232"),
+    ],
+)
+def test_task_id_of_deserialized_upstream(task_spec, task_id):
+    task_json = Task2(parent=Task1(name="a").output()).serialize()
+    task_json["_task_spec"] = task_spec
+    task_json["parent"]["src_task"]["_task_spec"] = task_spec
+
+    # task_id of the deserialized tasks are not cached, and calculated from the upstream.
+    assert deserialize(task_json).task_id == task_id
+
+
+def test_task_id_of_deep_chain():
+    # Outputs are created without build_output, which calculates task_id of the task.
+    task = Task1()
+    for _ in range(5000):
+        task = Task2(parent=BinaryOutput(src_task=task, key="output.pkl"))
+
+    expected = Task1()
+    for _ in range(5000):
+        expected = Task2(parent=BinaryOutput(src_task=expected, key="output.pkl"))
+        expected.task_id
+
+    assert task.task_id == expected.task_id
+
+
+@dataclass(frozen=True)
+class TaskSpecV2(Task):
+    _task_spec: Optional[str] = field(default="2.0.0", compare=False, repr=False)
+    names: List[Any] = field(default_factory=list)
+    options: Dict[Any, Any] = field(default_factory=dict)
+    day: Optional[date] = None
+    parent: Optional[Output] = None
+
+
+def test_task_id_spec_v2():
+    task = TaskSpecV2(
+        names=["a", 1, 2.5, True, None],
+        options={"b": (1, 2), 3: {"c"}},
+        day=date(2020, 1, 2),
+        parent=Task1().output(),
+    )
+
+    assert task.task_id == (
+        "test_core.TaskSpecV2.ca4b0bdcef84ad699dcfdd200b617b7be3fa3041"
+    )
+
+    # Deserialized task keeps the spec.
+    assert deserialize(task.serialize()).task_id == task.task_id
+
+    # Order of dict, and tuple or list, do not affect as the spec v1.
+    assert (
+        TaskSpecV2(
+            names=("a", 1, 2.5, True, None),
+            options={3: {"c"}, "b": [1, 2]},
+            day=date(2020, 1, 2),
+            parent=Task1().output(),
+        ).task_id
+        == task.task_id
+    )
+
+    assert TaskSpecV2(names=[1]).task_id != TaskSpecV2(names=["1"]).task_id
+    assert TaskSpecV2(names=[1]).task_id != TaskSpecV2(names=[True]).task_id
+    assert TaskSpecV2(names=[[1], 2]).task_id != TaskSpecV2(names=[1, [2]]).task_id
+
+    # Fields of None are skipped, as the spec v1.
+    assert TaskSpecV2(day=None).task_id == TaskSpecV2().task_id
+
+    assert TaskSpecV2(_task_spec="1.0.0").task_id != TaskSpecV2().task_id
+
+
+def test_interning():
+    with interning() as interner:
+        tasks = [Task2(parent=Task1(name="a").output(), name=str(i)) for i in range(3)]
+
+        assert all(task.parent is tasks[0].parent for task in tasks)
+        assert tasks[0].output() is tasks[0].output()
+
+        # Equal objects of the different types, or fields not used by task_id, are kept apart.
+        output = Task1(name="a").output()
+        assert interner.intern(output.as_ephemeral()) is not output
+        for a, b in [
+            ([1], [1.0]),
+            ([0.0], [-0.0]),
+            (
+                [datetime(2020, 1, 1, 9, tzinfo=timezone(timedelta(hours=9)))],
+                [datetime(2020, 1, 1, tzinfo=timezone.utc)],
+            ),
+        ]:
+            assert interner.intern(TaskSpecV2(names=a)) is not interner.intern(
+                TaskSpecV2(names=b)
+            )
+
+    # Task1 and its outputs, Task2 and its output, and the six of TaskSpecV2.
+    assert len(interner) == 11
+
+    assert Task1(name="a").output() is not Task1(name="a").output()
+
+
+def test_intern_deserialized_upstream():
+    task = Task2(parent=Task1(name="a").output())
+    tasks = deserialize(
+        {"tasks": [task.serialize(), Task2(parent=task.output()).serialize()]}
+    )["tasks"]
+
+    interned = Interner().intern(tasks)
+
+    assert interned == tasks
+    assert interned[1].parent.src_task is interned[0]
+    assert interned[1].task_id == tasks[1].task_id
+
+    # Tasks which can not be hashed are kept as they are.
+    unhashable = TaskSpecV2(options={"a": bytearray(b"a")})
+    assert Interner().intern(unhashable) is unhashable
+
+
+def test_intern_deep_chain():
+    task = Task1()
+    for _ in range(5000):
+        task = Task2(parent=BinaryOutput(src_task=task, key="output.pkl"))
+
+    interner = Interner()
+
+    assert interner.intern(task) is task
+    assert interner.intern(replace(task)) is task